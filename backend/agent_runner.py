@@ -4,6 +4,8 @@ import json
 import base64
 import importlib.util
 import sys
+import time
+import asyncio
 from fastapi import FastAPI, Request
 import uvicorn
 from vertexai.generative_models import GenerativeModel, GenerationConfig
@@ -17,9 +19,6 @@ if agent_config_b64:
 else:
     agent_config = {}
 
-# Add this near the top after parsing agent_config
-print(f"Agent config: framework={framework}, custom_code keys={list(custom_code.keys() if custom_code else [])}, framework_config={framework_config}")
-
 # Extract agent parameters
 model_id = agent_config.get("modelId", "gemini-1.5-pro")
 temperature = agent_config.get("temperature", 0.2)
@@ -29,6 +28,8 @@ framework = agent_config.get("framework", "CUSTOM")
 framework_config = agent_config.get("frameworkConfig", {})  # Add this line
 custom_code = agent_config.get("customCode", {})
 
+print(f"Agent config: framework={framework}, custom_code keys={list(custom_code.keys() if custom_code else [])}, framework_config={framework_config}")
+
 # Custom code loading function
 def load_custom_code():
     """Loads custom code provided in the agent config."""
@@ -78,6 +79,63 @@ def load_custom_code():
 # Load custom code
 custom_modules = load_custom_code()
 
+# Text extraction helpers are copied next to this file in the runner image
+try:
+    from file_extraction import ChunkCache, chunk_text, extract_text, format_context, is_extractable, select_chunks
+except ImportError:
+    from app.services.file_extraction import ChunkCache, chunk_text, extract_text, format_context, is_extractable, select_chunks
+try:
+    from file_parts import build_file_parts
+except ImportError:
+    from app.services.file_parts import build_file_parts
+
+FILE_CONTEXT_TOKEN_BUDGET = int(os.environ.get("FILE_CONTEXT_TOKEN_BUDGET", "4000"))
+
+# Extracted chunks keyed by gs:// URI (uploads are content-addressed, so the URI identifies the content)
+chunk_cache = ChunkCache(
+    max_entries=int(os.environ.get("FILE_CHUNK_CACHE_SIZE", "256")),
+    cache_dir=os.environ.get("FILE_CHUNK_CACHE_DIR")
+)
+storage_client = None
+
+def get_gcs_blob(gs_uri):
+    """Returns a GCS blob handle for a gs:// URI."""
+    global storage_client
+    
+    from google.cloud import storage
+    if storage_client is None:
+        storage_client = storage.Client()
+    return storage.Blob.from_string(gs_uri, client=storage_client)
+
+def get_file_chunks(file):
+    """Streams a file from GCS and returns its text chunks, using the cache when possible."""
+    gs_uri = file.get("gs_uri")
+    content_type = file.get("content_type")
+    if not gs_uri or not gs_uri.startswith("gs://") or not is_extractable(content_type):
+        return []
+        
+    chunks = chunk_cache.get(gs_uri)
+    if chunks is None:
+        with get_gcs_blob(gs_uri).open("rb", chunk_size=1024 * 1024) as reader:
+            chunks = list(chunk_text(extract_text(reader, content_type)))
+        chunk_cache.put(gs_uri, chunks)
+        
+    return chunks
+
+def build_file_context(files, query):
+    """Builds prompt context from the file chunks most relevant to the query."""
+    candidates = []
+    for file in files:
+        try:
+            chunks = get_file_chunks(file)
+        except Exception as e:
+            print(f"Error extracting text from {file.get('filename')}: {str(e)}")
+            continue
+        for index, text in enumerate(chunks):
+            candidates.append({"filename": file.get("filename"), "index": index, "text": text})
+            
+    return format_context(select_chunks(query, candidates, FILE_CONTEXT_TOKEN_BUDGET))
+
 # Initialize the model
 model = GenerativeModel(model_id)
 generation_config = GenerationConfig(
@@ -178,8 +236,14 @@ elif framework == "LANGGRAPH":
         agent = workflow.compile()
 
 elif framework == "CREWAI":
-    # Similar implementation for CrewAI...
-    pass
+    # The crew engine is copied next to this file in the runner image
+    try:
+        from crew_engine import CrewEngine, vertex_generate
+    except ImportError:
+        from app.services.crew_engine import CrewEngine, vertex_generate
+
+    print("Processing CrewAI framework")
+    crew_engine = CrewEngine(vertex_generate(model_id, temperature, max_output_tokens))
     
 @app.post("/")
 async def process_request(request: Request):
@@ -201,35 +265,42 @@ async def process_request(request: Request):
                 context += f"{i+1}. {file.get('filename')} ({file.get('content_type')})\n"
             context += "\nYou can refer to these files in your question.\n\n"
             
+            # Add the parts of the files most relevant to the query
+            context += await asyncio.to_thread(build_file_context, files, query)
+            
         # Process with the appropriate framework
         if framework == "CUSTOM":
-            # Create messages including system instruction if available
-            messages = []
+            # Include system instruction and file context in the prompt
+            prompt = f"{context}{query}"
             if system_instruction:
-                messages.append({"role": "system", "content": system_instruction})
-            messages.append({"role": "user", "content": query})
-
-            # Add context as part of the user message if available
-            if context:
-                messages.append({"role": "user", "content": f"{context}{query}"})
-            else:
-                messages.append({"role": "user", "content": query})
+                prompt = f"{system_instruction}\n\n{prompt}"
                 
+            # Attach media files by gs:// reference rather than downloading them
+            file_parts, file_payload = await asyncio.to_thread(
+                build_file_parts,
+                files,
+                lambda file: get_gcs_blob(file["gs_uri"]).download_as_bytes()
+            )
+            
             # Generate response
+            generation_start = time.monotonic()
             response = model.generate_content(
-                messages,
+                [prompt, *file_parts] if file_parts else prompt,
                 generation_config=generation_config
             )
-            
+            if file_parts:
+                file_payload["generationMs"] = (time.monotonic() - generation_start) * 1000
+                
             return {
                 "textResponse": response.text,
                 "messages": [{"content": response.text}],
-                "files": files
+                "files": files,
+                "filePayload": file_payload if file_parts else None
             }
         
         elif framework == "LANGCHAIN":
             # Run the agent
-            result = agent_executor.invoke({"input": query})
+            result = agent_executor.invoke({"input": f"{context}{query}"})
             return {
                 "textResponse": result.get("output", ""),
                 "messages": [{"content": result.get("output", "")}]
@@ -237,7 +308,7 @@ async def process_request(request: Request):
             
         elif framework == "LANGGRAPH":
             # Run the graph
-            messages = [HumanMessage(content=query)]
+            messages = [HumanMessage(content=f"{context}{query}")]
             result = agent.invoke({"messages": messages})
             
             # Extract the response
@@ -250,8 +321,13 @@ async def process_request(request: Request):
             }
             
         elif framework == "CREWAI":
-            # Process with CrewAI
-            pass
+            # Run the crew's tasks, independent ones concurrently
+            crew = await crew_engine.run(framework_config, f"{context}{query}", system_instruction)
+            return {
+                "textResponse": crew["output"],
+                "messages": [{"content": crew["output"]}],
+                "crew": {key: value for key, value in crew.items() if key != "output"}
+            }
             
         else:
             return {"error": f"Unsupported framework: {framework}"}
@@ -1,16 +1,56 @@
 import json
+import asyncio
+import hashlib
 from typing import Dict, List, Optional, Any
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from fastapi import APIRouter, Depends, HTTPException, Query, Body
+from fastapi import APIRouter, Depends, HTTPException, Query, Body, Request, Response
+from fastapi.responses import StreamingResponse
 from datetime import datetime
 import uuid
 from app.models.agent import CreateAgentRequest, AgentResponse
 from app.services.vertex_ai import VertexAIService
+from app.services.agent_cache import agent_config_cache, agent_cache_invalidator
+from app.services.agent_transfer_service import AgentTransferService
+from app.services.tool_metrics import tool_metrics, attach_tool_calls
+from app.services.file_context_service import file_context_service
 from app.database import get_db, Agent, Deployment, AgentTest
 
 router = APIRouter()
 vertex_service = VertexAIService()
 
+# Clients may cache agent reads but must revalidate them with If-None-Match
+AGENT_CACHE_CONTROL = "private, no-cache"
+
+def _compute_etag(*parts: Any) -> str:
+    """Builds a strong ETag from the given fingerprint parts."""
+    fingerprint = "|".join("" if part is None else str(part) for part in parts)
+    return f'"{hashlib.sha1(fingerprint.encode()).hexdigest()}"'
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    """Checks whether the request's If-None-Match header matches the ETag."""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+def _set_etag(response: Response, etag: str) -> None:
+    """Attaches the ETag and revalidation headers to a response."""
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = AGENT_CACHE_CONTROL
+
+def _not_modified(etag: str) -> Response:
+    """Returns an empty 304 response for an unchanged resource."""
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": AGENT_CACHE_CONTROL})
+
+def _local_agents_etag(db: Session) -> str:
+    """Fingerprints the local agent list with a single aggregate query."""
+    count, last_updated = db.query(
+        func.count(Agent.id), func.max(Agent.updated_at)
+    ).filter(Agent.status.in_(["DRAFT", "TESTED"])).one()
+    return _compute_etag("local-agents", count, last_updated)
+
 @router.post("/agents/playground")
 async def test_agent_locally(
     request_data: Dict[str, Any],
@@ -36,10 +76,19 @@ async def test_agent_locally(
         # Get file context if provided
         session_id = request_data.get("sessionId")
         files = request_data.get("files", [])
+        top_k = request_data.get("topK", request_data.get("top_k"))
+        if top_k is not None:
+            try:
+                top_k = int(top_k)
+            except (TypeError, ValueError):
+                raise HTTPException(status_code=400, detail="topK must be an integer")
+            if top_k < 0:
+                raise HTTPException(status_code=400, detail="topK must not be negative")
         
         # Start timer for metrics
         start_time = datetime.utcnow()
         success = True
+        tool_calls = tool_metrics.capture()
         
         # Get or create agent
         if agent_id:
@@ -80,6 +129,7 @@ async def test_agent_locally(
                 max_output_tokens=max_output_tokens,
                 system_instruction=system_instruction,
                 framework_config=framework_config,
+                memory_enabled=bool(request_data.get("memoryEnabled", False)),
                 status="DRAFT",
                 created_at=datetime.utcnow(),
                 updated_at=datetime.utcnow(),
@@ -89,6 +139,42 @@ async def test_agent_locally(
             db.commit()
             db.refresh(agent)
         
+        # Add the parts of the uploaded files most relevant to the query
+        model_query = query
+        file_chunks = []
+        uploaded_files = []
+        if files or session_id:
+            try:
+                uploaded_files = file_context_service.resolve_files(db, session_id, files)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            if uploaded_files:
+                file_context = await asyncio.to_thread(
+                    file_context_service.build_context,
+                    uploaded_files,
+                    query,
+                    top_k=top_k
+                )
+                model_query = f"{file_context['context']}{query}"
+                file_chunks = file_context["chunks"]
+        
+        # Load the bounded memory of the conversation (summary plus recent turns).
+        # A checkpointed LangGraph thread already holds the history, so memory isn't stored twice.
+        conversation_id = None
+        memory = None
+        chat_history = ""
+        if agent.memory_enabled:
+            from app.services.conversation_memory_service import conversation_memory
+            
+            conversation_id = request_data.get("conversationId") or session_id or str(uuid.uuid4())
+            checkpointed = False
+            if agent.framework == "LANGGRAPH":
+                from app.services.langgraph_templates import graph_templates
+                checkpointed = graph_templates.checkpointing
+            if not checkpointed:
+                memory = conversation_memory.load(db, conversation_id)
+                chat_history = conversation_memory.format_history(memory)
+        
         # Create a local agent instance based on framework type
         try:
             framework = agent.framework
@@ -109,62 +195,80 @@ async def test_agent_locally(
                 langchain_service = LangChainService()
                 
                 # Run agent
-                response = langchain_service.run_agent_with_tools(
-                    query=query,
+                response = await langchain_service.run_agent_with_tools(
+                    query=model_query,
                     model_id=model_id,
                     temperature=temperature,
                     max_tokens=max_output_tokens,
                     system_instruction=system_instruction,
-                    tools=tools
+                    tools=tools,
+                    chat_history=chat_history,
+                    db=db
                 )
                 
             elif framework == "LANGGRAPH":
-                # Import specific LangGraph components
-                from langchain_core.messages import HumanMessage
                 from langchain_google_vertexai import ChatVertexAI
-                from langgraph.graph import END, MessageGraph
-                from langgraph.prebuilt import ToolNode
+                from app.services.custom_tool_service import CustomToolService
+                from app.services.custom_tool_wrappers import create_custom_tool
+                from app.services.langgraph_templates import graph_templates
                 
-                # Create a local LangGraph agent
                 model = ChatVertexAI(model=model_id, temperature=temperature, max_output_tokens=max_output_tokens)
-                builder = MessageGraph()
                 
-                # Add tools if specified
-                tools = framework_config.get("tools", [])
-                tool_objects = []  # Convert tool definitions to objects
+                # Custom tools are exposed as coroutine tools
+                tool_objects = []
+                for tool_def in framework_config.get("tools", []):
+                    if isinstance(tool_def, dict) and tool_def.get("type") == "CUSTOM":
+                        custom_tool = CustomToolService.get_tool(db, tool_def.get("id"))
+                        if custom_tool:
+                            tool_objects.append(create_custom_tool(custom_tool, db))
                 
-                # Add nodes to the graph
-                model_with_tools = model.bind_tools(tool_objects)
-                builder.add_node("tools", model_with_tools)
-                
-                # Add tool node and edges
-                tool_node = ToolNode(tool_objects)
-                for tool in tool_objects:
-                    tool_name = tool.__name__
-                    builder.add_node(tool_name, tool_node)
-                    builder.add_edge(tool_name, END)
-                
-                # Set entry point and build the graph
-                builder.set_entry_point("tools")
-                
-                # Define custom router based on graph type
+                # The precompiled graph for the graph type resumes the conversation's thread
+                # from its checkpoint, so memory is only added to the prompt without one.
+                # Threads are per agent and graph type, so agents sharing an upload session don't
+                # replay each other's state; ad-hoc agents get a new ID every turn, so they share
+                # one namespace. Without a conversation the turn runs on a throwaway thread that is
+                # deleted afterwards.
                 graph_type = framework_config.get("graphType", "sequential")
-                # Simple router example - would need to be customized
-                def router(state):
-                    if len(state) > 0 and hasattr(state[-1], "tool_calls") and state[-1].tool_calls:
-                        return state[-1].tool_calls[0].get("name", END)
-                    return END
-                
-                builder.add_conditional_edges("tools", router)
-                
-                # Compile and invoke the graph
-                graph = builder.compile()
-                result = graph.invoke(HumanMessage(query))
+                thread_id = None
+                if graph_templates.checkpointing:
+                    conversation_id = conversation_id or request_data.get("conversationId")
+                    if conversation_id:
+                        thread_owner = agent.id if agent_id else graph_templates.ADHOC_OWNER
+                        thread_id = graph_templates.thread_id(thread_owner, graph_type, conversation_id)
+                    graph_query = model_query
+                else:
+                    graph_query = f"{chat_history}\n\n{model_query}" if chat_history else model_query
+                response = await graph_templates.run(
+                    graph_type,
+                    graph_query,
+                    model,
+                    tool_objects,
+                    system_instruction=system_instruction,
+                    thread_id=thread_id
+                )
+            
+            elif framework == "CREWAI":
+                from app.services.crew_engine import CrewEngine, vertex_generate
                 
-                # Format the response
+                # Independent tasks run concurrently; per-task timings are returned under "crew"
+                crew_engine = CrewEngine(vertex_generate(model_id, temperature, max_output_tokens))
+                crew = await crew_engine.run(
+                    framework_config,
+                    f"{chat_history}\n\n{model_query}" if chat_history else model_query,
+                    system_instruction
+                )
                 response = {
-                    "output": result[-1].content if result else "",
-                    "messages": [{"content": msg.content} for msg in result] if result else []
+                    "output": crew["output"],
+                    "messages": [{"content": crew["output"]}],
+                    "actions": [
+                        {
+                            "name": f"Task {task['index'] + 1}: {task['agent']}",
+                            "output": task["output"] if task["status"] == "completed" else task["error"],
+                            "durationMs": task["durationMs"]
+                        }
+                        for task in crew["tasks"]
+                    ],
+                    "crew": {key: value for key, value in crew.items() if key != "output"}
                 }
             
             # Handle other frameworks similarly...
@@ -181,14 +285,22 @@ async def test_agent_locally(
                 try:
                     # Format the prompt correctly based on agent-starter-pack examples
                     # Option 1: Direct prompt approach (most reliable)
+                    prompt = f"{chat_history}\n\n{model_query}" if chat_history else model_query
                     if system_instruction:
                         # Include system instructions as part of the prompt
-                        prompt = f"{system_instruction}\n\n{query}"
-                    else:
-                        prompt = query
+                        prompt = f"{system_instruction}\n\n{prompt}"
+                        
+                    # Attach media files by gs:// reference rather than sending their bytes
+                    file_parts, file_payload = [], None
+                    if uploaded_files:
+                        file_parts, file_payload = await asyncio.to_thread(file_context_service.build_parts, uploaded_files)
                         
                     # Generate response with single prompt (most reliable method)
-                    result = model.generate_content(prompt, generation_config=generation_config)
+                    generation_start = datetime.utcnow()
+                    result = model.generate_content(
+                        [prompt, *file_parts] if file_parts else prompt,
+                        generation_config=generation_config
+                    )
                     
                     # Extract text from response
                     response_text = result.text if hasattr(result, "text") else ""
@@ -197,16 +309,37 @@ async def test_agent_locally(
                         "output": response_text,
                         "messages": [{"content": response_text}]
                     }
+                    if file_payload and file_parts:
+                        file_payload["generationMs"] = (datetime.utcnow() - generation_start).total_seconds() * 1000
+                        response["filePayload"] = file_payload
                     
                 except Exception as gen_error:
                     print(f"Generation error details: {str(gen_error)}")
                     # Re-raise to be caught by the outer exception handler
                     raise
                     
+            # Remember the exchange; the original query is stored, not the file context
+            output = response.get("output", "")
+            if memory is not None and output and not output.startswith("Error: "):
+                try:
+                    # Appending may call the summary model, so keep it off the event loop
+                    await asyncio.to_thread(conversation_memory.append, db, conversation_id, agent.id, query, output)
+                except Exception as memory_error:
+                    print(f"Error saving conversation memory: {str(memory_error)}")
+                    
             return {
-                "textResponse": response.get("output", ""),
-                "actions": response.get("actions", []),
-                "messages": response.get("messages", [])
+                "textResponse": output,
+                "actions": attach_tool_calls(response.get("actions", []), tool_calls),
+                "messages": response.get("messages", []),
+                "fileChunks": file_chunks,
+                "filePayload": response.get("filePayload"),
+                "crew": response.get("crew"),
+                "conversationId": conversation_id,
+                "memory": {
+                    "turns": len(memory["turns"]),
+                    "tokens": memory["tokens"],
+                    "summarized": bool(memory["summary"])
+                } if memory is not None else None
             }
         except Exception as test_error:
             success = False
@@ -246,19 +379,24 @@ async def test_agent_locally(
         return {
             "agent_id": agent.id,
             "textResponse": response.get("textResponse", ""),
-            "actions": response.get("actions", []),
+            "actions": attach_tool_calls(response.get("actions", []), tool_calls),
             "messages": response.get("messages", []),
+            "conversationId": conversation_id,
             "metrics": {
                 "duration_ms": duration_ms,
                 "success": success
             }
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error testing agent locally: {str(e)}")
 
 @router.get("/agents")
 async def list_agents(
+    request: Request,
+    response: Response,
     project_id: Optional[str] = Query(None),
     projectId: Optional[str] = Query(None),
     region: str = Query("us-central1"),
@@ -272,12 +410,32 @@ async def list_agents(
         # Use projectId if project_id is not provided
         effective_project_id = project_id or projectId
         
-        # Base query
-        query = db.query(Agent).filter(Agent.status != "DELETED")  # Exclude deleted agents
-        
-        # Apply filters
+        # Base filters
+        agent_filters = [Agent.status != "DELETED"]  # Exclude deleted agents
         if status:
-            query = query.filter(Agent.status == status)
+            agent_filters.append(Agent.status == status)
+
+        # Fingerprint the list (agent and deployment counts plus latest updates) in one query
+        deployment_filters = [Deployment.project_id == effective_project_id]
+        if deployment_type:
+            deployment_filters.append(Deployment.deployment_type == deployment_type)
+        deployment_count = db.query(func.count(Deployment.id)).filter(*deployment_filters).scalar_subquery()
+        deployment_updated = db.query(func.max(Deployment.updated_at)).filter(*deployment_filters).scalar_subquery()
+        fingerprint = db.query(
+            func.count(Agent.id),
+            func.max(Agent.updated_at),
+            deployment_count,
+            deployment_updated
+        ).filter(*agent_filters).one()
+        
+        etag = _compute_etag(
+            "agents", effective_project_id, deployment_type, status, include_local, *fingerprint
+        )
+        if _etag_matches(request, etag):
+            return _not_modified(etag)
+        _set_etag(response, etag)
+        
+        query = db.query(Agent).filter(*agent_filters)
 
         # Get agents from database
         db_agents = query.all()
@@ -330,10 +488,17 @@ async def list_agents(
 
 @router.get("/local-agents")
 async def list_local_agents(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db)
 ) -> List[Dict]:
     """Lists all local agents (not deployed or in DRAFT/TESTED state)."""
     try:
+        etag = _local_agents_etag(db)
+        if _etag_matches(request, etag):
+            return _not_modified(etag)
+        _set_etag(response, etag)
+        
         # Query agents that are in DRAFT or TESTED state
         agents = db.query(Agent).filter(
             Agent.status.in_(["DRAFT", "TESTED"])
@@ -356,9 +521,65 @@ async def list_local_agents(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error listing local agents: {str(e)}")
         
+@router.get("/agents/export")
+async def export_agents(
+    status: Optional[str] = Query(None),
+    batch_size: int = Query(500, ge=1, le=5000)
+) -> StreamingResponse:
+    """Streams all agents with their config, tools and custom code as JSON Lines."""
+    return StreamingResponse(
+        AgentTransferService.export_agents(status=status, batch_size=batch_size),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="agents.jsonl"'}
+    )
+
+@router.post("/agents/import")
+async def import_agents(
+    request: Request,
+    batch_size: int = Query(500, ge=1, le=5000),
+    preserve_ids: bool = Query(False, description="Keep exported agent IDs instead of assigning new ones"),
+    db: Session = Depends(get_db)
+) -> Dict:
+    """Imports agents from a JSON Lines body, inserting them in batched transactions."""
+    try:
+        results = []
+        pending = []
+        buffer = b""
+        line_number = 0
+        
+        # Parse the body as it streams in and flush a batch whenever one fills up
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                line_number += 1
+                if line.strip():
+                    pending.append((line_number, line))
+                if len(pending) >= batch_size:
+                    results.extend(AgentTransferService.import_batch(db, pending, preserve_ids))
+                    pending = []
+        
+        if buffer.strip():
+            pending.append((line_number + 1, buffer))
+        if pending:
+            results.extend(AgentTransferService.import_batch(db, pending, preserve_ids))
+        
+        created = sum(1 for result in results if result["status"] == "created")
+        
+        return {
+            "total": len(results),
+            "created": created,
+            "failed": len(results) - created,
+            "results": results
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error importing agents: {str(e)}")
+
 @router.get("/agents/{agent_id}")
 async def get_agent(
     agent_id: str,
+    request: Request,
+    response: Response,
     project_id: Optional[str] = Query(None),
     projectId: Optional[str] = Query(None),
     region: str = Query("us-central1"),
@@ -388,6 +609,21 @@ async def get_agent(
                     Deployment.region == region
                 ).order_by(Deployment.created_at.desc()).first()
             
+            # Skip serialization when the client already has this version
+            etag = _compute_etag(
+                agent.id,
+                agent.updated_at.isoformat(),
+                effective_project_id,
+                region,
+                deployment.id if deployment else None,
+                deployment.version if deployment else None,
+                deployment.status if deployment else None,
+                deployment.updated_at.isoformat() if deployment else None
+            )
+            if _etag_matches(request, etag):
+                return _not_modified(etag)
+            _set_etag(response, etag)
+            
             # Return agent data from the database
             return {
                 "id": agent.id,
@@ -727,6 +963,7 @@ async def deploy_agent(
         agent.updated_at = datetime.utcnow()
         
         db.commit()
+        agent_cache_invalidator.invalidate(agent.id)
         
         return {
             "id": agent.id,
@@ -786,6 +1023,7 @@ async def delete_agent(
             
             # Commit changes to database
             db.commit()
+            agent_cache_invalidator.invalidate(agent.id)
             
             return {
                 "id": agent.id,
@@ -838,12 +1076,49 @@ async def get_agent_tests(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting agent tests: {str(e)}")
 
+@router.delete("/conversations/{conversation_id}")
+async def delete_conversation(
+    conversation_id: str,
+    agent_id: Optional[str] = Query(None),
+    agentId: Optional[str] = Query(None),
+    db: Session = Depends(get_db)
+) -> Dict:
+    """
+    Forgets a conversation, so the next query with its ID starts with empty memory.
+    
+    LangGraph conversations are checkpointed per agent; pass agentId (or "adhoc" for unsaved
+    playground agents) to delete their threads too.
+    """
+    try:
+        from app.services.conversation_memory_service import conversation_memory
+        
+        deleted = conversation_memory.delete(db, [conversation_id])
+        effective_agent_id = agent_id or agentId
+        if effective_agent_id:
+            from app.services.langgraph_templates import graph_templates
+            
+            await graph_templates.delete_threads(effective_agent_id, conversation_id)
+        elif not deleted:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+        return {"success": True, "message": f"Conversation {conversation_id} deleted"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error deleting conversation: {str(e)}")
+
 @router.get("/local-agents")
 async def list_local_agents(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db)
 ) -> List[Dict]:
     """Lists all local agents (not deployed to Vertex AI)."""
     try:
+        etag = _local_agents_etag(db)
+        if _etag_matches(request, etag):
+            return _not_modified(etag)
+        _set_etag(response, etag)
+        
         # Query agents that are DRAFT or TESTED but not DEPLOYED
         agents = db.query(Agent).filter(
             Agent.status.in_(["DRAFT", "TESTED"])
@@ -886,10 +1161,10 @@ async def query_agent(
         # Start timer for performance metrics
         start_time = datetime.utcnow()
         
-        # Check if agent exists in database
-        agent = db.query(Agent).filter(Agent.id == agent_id).first()
+        # Look up the agent and its active deployment through the config cache
+        config = agent_config_cache.get_active(db, agent_id, effective_project_id, region)
         
-        if not agent:
+        if not config:
             # If not in database but looks like a direct Vertex AI resource path
             if agent_id.startswith("projects/"):
                 try:
@@ -905,13 +1180,8 @@ async def query_agent(
             else:
                 raise HTTPException(status_code=404, detail="Agent not found")
         
-        # Find active deployment in the specified project/region
-        deployment = db.query(Deployment).filter(
-            Deployment.agent_id == agent.id,
-            Deployment.project_id == effective_project_id,
-            Deployment.region == region,
-            Deployment.status == "ACTIVE"
-        ).first()
+        agent = config["agent"]
+        deployment = config["deployment"]
         
         if not deployment:
             raise HTTPException(
@@ -924,7 +1194,7 @@ async def query_agent(
             response = await vertex_service.query_agent(
                 effective_project_id, 
                 region, 
-                deployment.resource_name, 
+                deployment["resource_name"], 
                 query, 
                 max_response_items
             )
@@ -936,12 +1206,12 @@ async def query_agent(
             # Store test record (optional - you might want to separate query logs from tests)
             test = AgentTest(
                 id=str(uuid.uuid4()),
-                agent_id=agent.id,
+                agent_id=agent["id"],
                 query=query,
                 response=response.get("textResponse", ""),
                 metrics={
                     "duration_ms": duration_ms,
-                    "deployment_id": deployment.id,
+                    "deployment_id": deployment["id"],
                     "project_id": effective_project_id,
                     "region": region
                 },
@@ -961,12 +1231,12 @@ async def query_agent(
             
             test = AgentTest(
                 id=str(uuid.uuid4()),
-                agent_id=agent.id,
+                agent_id=agent["id"],
                 query=query,
                 response=f"Error: {str(query_error)}",
                 metrics={
                     "duration_ms": duration_ms,
-                    "deployment_id": deployment.id,
+                    "deployment_id": deployment["id"],
                     "project_id": effective_project_id,
                     "region": region,
                     "error": str(query_error)
@@ -1013,18 +1283,25 @@ async def create_custom_tool(
     name: str,
     description: str,
     code: str,
+    pure: bool = False,
     db: Session = Depends(get_db)
 ) -> Dict[str, Any]:
-    """Creates a new custom tool."""
+    """
+    Creates a new custom tool.
+    
+    Set pure=true for deterministic tools without side effects; their results are cached.
+    """
     try:
         from app.services.custom_tool_service import CustomToolService
         
-        tool = CustomToolService.create_tool(db, name, description, code)
+        tool = CustomToolService.create_tool(db, name, description, code, is_pure=pure)
         
         return {
             "id": tool.id,
             "name": tool.name,
             "description": tool.description,
+            "is_pure": tool.is_pure,
+            "signature": tool.signature,
             "created_at": tool.created_at.isoformat()
         }
     except ValueError as e:
@@ -1047,6 +1324,8 @@ async def list_custom_tools(
                 "id": tool.id,
                 "name": tool.name,
                 "description": tool.description,
+                "is_pure": tool.is_pure,
+                "signature": CustomToolService.get_signature(tool),
                 "created_at": tool.created_at.isoformat()
             }
             for tool in tools
@@ -1054,6 +1333,21 @@ async def list_custom_tools(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error listing custom tools: {str(e)}")
 
+@router.get("/tools/metrics")
+async def get_tool_metrics() -> Dict[str, Any]:
+    """Returns call counts, errors, latency histograms and output sizes of every tool called since startup."""
+    return tool_metrics.snapshot()
+
+@router.get("/custom-tools/cache-stats")
+async def get_custom_tool_cache_stats() -> Dict[str, Any]:
+    """Returns hit rates of the compiled tool cache and the pure tool result cache."""
+    from app.services.custom_tool_service import compiled_tool_cache, tool_result_cache
+    
+    return {
+        "compiled": compiled_tool_cache.stats(),
+        "results": tool_result_cache.stats()
+    }
+
 @router.post("/custom-tools/{tool_id}/execute")
 async def execute_custom_tool(
     tool_id: str,
@@ -1064,7 +1358,7 @@ async def execute_custom_tool(
     try:
         from app.services.custom_tool_service import CustomToolService
         
-        result = CustomToolService.execute_tool(db, tool_id, params)
+        result = await CustomToolService.execute_tool_async(db, tool_id, params)
         
         return {
             "result": result
@@ -1074,6 +1368,53 @@ async def execute_custom_tool(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error executing custom tool: {str(e)}")
 
+@router.post("/custom-tools/{tool_id}/execute-batch")
+async def execute_custom_tool_batch(
+    tool_id: str,
+    request_data: Dict[str, Any],
+    db: Session = Depends(get_db)
+) -> Dict[str, Any]:
+    """
+    Executes a custom tool over a list of parameter sets.
+    
+    Expects {"items": [{...}, ...], "chunkSize": 50}; results are returned in input order
+    with per-item timing and errors.
+    """
+    try:
+        from app.services.custom_tool_service import CustomToolService, TOOL_BATCH_MAX_ITEMS
+        
+        items = request_data.get("items")
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            raise HTTPException(status_code=400, detail="items must be a list of parameter objects")
+        if len(items) > TOOL_BATCH_MAX_ITEMS:
+            raise HTTPException(status_code=400, detail=f"At most {TOOL_BATCH_MAX_ITEMS} items are allowed per batch")
+            
+        chunk_size = request_data.get("chunkSize")
+        if chunk_size is not None:
+            try:
+                chunk_size = int(chunk_size)
+            except (TypeError, ValueError):
+                raise HTTPException(status_code=400, detail="chunkSize must be an integer")
+            if chunk_size < 1:
+                raise HTTPException(status_code=400, detail="chunkSize must be positive")
+                
+        start_time = datetime.utcnow()
+        results = await asyncio.to_thread(CustomToolService.execute_batch, db, tool_id, items, chunk_size)
+        failed = sum(1 for result in results if result["error"] is not None)
+        
+        return {
+            "results": results,
+            "succeeded": len(results) - failed,
+            "failed": failed,
+            "durationMs": (datetime.utcnow() - start_time).total_seconds() * 1000
+        }
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error executing custom tool batch: {str(e)}")
+
 @router.put("/agents/{agent_id}")
 async def update_agent(
     agent_id: str,
@@ -1158,6 +1499,7 @@ async def update_agent(
 
         db.commit()
         db.refresh(agent)
+        agent_cache_invalidator.invalidate(agent.id)
         
         # Check if agent is already deployed to Vertex AI
         deployment = db.query(Deployment).filter(
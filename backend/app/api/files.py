@@ -1,17 +1,86 @@
 import os
+import re
+import mmap
 import uuid
-from typing import Dict, List, Optional, Any
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from fastapi.responses import JSONResponse
+import asyncio
+import mimetypes
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Any, Iterator, Tuple
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, UploadFile, File, Form, Request, Query, Response
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 
-from app.database import get_db, UploadedFile
-from app.services.storage_service import StorageService
+from app.database import get_db, SessionLocal, UploadedFile, UploadIntent
+from app.services.storage_service import UploadRejected, storage_service
+from app.services.content_store import ContentStore
+from app.services.file_context_service import file_context_service
+from app.services.session_gc_service import SessionGCService
 
 router = APIRouter()
 
-# Initialize GCS storage service
-storage_service = StorageService()
+# Uploads are deduplicated into shared, reference-counted content-addressed blobs
+content_store = ContentStore(storage_service, file_context_service)
+
+# Deletes sessions on request and, when scheduled, sessions idle past SESSION_TTL_HOURS
+session_gc_service = SessionGCService(storage_service, content_store, file_context_service)
+
+# Maximum number of files uploaded and signed at the same time per request
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "8"))
+
+# How long browsers have to finish a direct upload once the intent is created
+UPLOAD_INTENT_TTL_MINUTES = int(os.getenv("UPLOAD_INTENT_TTL_MINUTES", "60"))
+
+# Bytes per chunk when streaming a byte range of a local blob
+RANGE_CHUNK_SIZE = 1024 * 1024
+
+_RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+async def _upload_one(file: UploadFile, semaphore: asyncio.Semaphore) -> Dict:
+    """
+    Validates, stores and signs a single file, reporting its own status.
+    
+    Runs concurrently with the other files of the request, so it uses its own session.
+    """
+    file_metadata = None
+    db = SessionLocal()
+    try:
+        storage_service.limits.check_type(file.content_type)
+        storage_service.limits.check_size(file.size)
+        
+        async with semaphore:
+            # Hashing and storage calls run off the event loop; identical content is not re-uploaded
+            file_metadata = await content_store.store_file(
+                db,
+                file_obj=file.file,
+                filename=file.filename,
+                content_type=file.content_type
+            )
+            signed_url = await asyncio.to_thread(storage_service.get_signed_url, file_metadata["blob_name"])
+        
+        return {
+            "status": "uploaded",
+            "file_id": file_metadata["file_id"],
+            "filename": file.filename,
+            "content_type": file.content_type,
+            "size": file_metadata["size"],
+            "url": signed_url["url"],
+            "url_expires_at": signed_url["expires_at"],
+            "gs_uri": file_metadata["gs_uri"],
+            "deduplicated": file_metadata["deduplicated"],
+            "blob_name": file_metadata["blob_name"],
+            "bucket_name": file_metadata["bucket_name"],
+            "content_hash": file_metadata["sha256"]
+        }
+    except UploadRejected as e:
+        return {"status": "rejected", "filename": file.filename, "error": e.detail, "status_code": e.status_code}
+    except Exception as e:
+        # Drop the reference taken for this file if it was stored before failing
+        if file_metadata:
+            await content_store.discard(db, [file_metadata["sha256"]])
+        return {"status": "error", "filename": file.filename, "error": str(e), "status_code": 500}
+    finally:
+        db.close()
 
 @router.post("/files/upload")
 async def upload_file(
@@ -19,64 +88,347 @@ async def upload_file(
     session_id: Optional[str] = Form(None),
     db: Session = Depends(get_db)
 ) -> Dict:
-    """Uploads one or more files to Google Cloud Storage and returns metadata."""
+    """Uploads one or more files to Google Cloud Storage concurrently and returns per-file metadata."""
+    stored_hashes = []
     try:
         if not session_id:
             session_id = str(uuid.uuid4())
-            
-        uploaded_files = []
         
-        for file in files:
-            # Upload file to GCS
-            file_metadata = storage_service.upload_file(
-                file_obj=file.file,
-                filename=file.filename,
-                content_type=file.content_type,
-                session_id=session_id
-            )
-            
-            # Store file metadata in database
-            file_record = UploadedFile(
-                id=file_metadata["file_id"],
-                session_id=session_id,
-                original_filename=file.filename,
-                stored_filename=file_metadata["blob_name"],
-                file_path=file_metadata["gs_uri"],
-                file_type=file.content_type,
-                file_size=file_metadata["size"]
-            )
-            
-            db.add(file_record)
-            
-            # Generate temporary signed URL for accessing the file
-            signed_url = storage_service.generate_signed_url(file_metadata["blob_name"])
-            
-            uploaded_files.append({
-                "file_id": file_metadata["file_id"],
-                "filename": file.filename,
-                "content_type": file.content_type,
-                "size": file_metadata["size"],
-                "url": signed_url,
-                "gs_uri": file_metadata["gs_uri"]
-            })
-            
+        # Upload and sign all files concurrently, bounded by UPLOAD_CONCURRENCY
+        semaphore = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+        results = await asyncio.gather(*[_upload_one(file, semaphore) for file in files])
+        
+        uploaded = [result for result in results if result["status"] == "uploaded"]
+        failed = [result for result in results if result["status"] != "uploaded"]
+        stored_hashes = [result["content_hash"] for result in uploaded]
+        
+        if not uploaded:
+            raise HTTPException(status_code=failed[0]["status_code"], detail=failed[0]["error"])
+        
+        # Store metadata for every uploaded file in one batched insert
+        now = datetime.utcnow()
+        db.execute(insert(UploadedFile), [
+            {
+                "id": result["file_id"],
+                "session_id": session_id,
+                "original_filename": result["filename"],
+                "stored_filename": result["blob_name"],
+                "file_path": result["gs_uri"],
+                "file_type": result["content_type"],
+                "file_size": result["size"],
+                "bucket_name": result["bucket_name"],
+                "content_hash": result["content_hash"],
+                "created_at": now
+            }
+            for result in uploaded
+        ])
+        db.commit()
+        
+        return {
+            "session_id": session_id,
+            "files": [
+                {key: value for key, value in result.items() if key not in ("blob_name", "bucket_name", "content_hash")}
+                for result in uploaded
+            ],
+            "failed": [
+                {key: value for key, value in result.items() if key != "status_code"}
+                for result in failed
+            ]
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        
+        # Release only the references this request took; shared blobs stay if still in use
+        if stored_hashes:
+            try:
+                await content_store.discard(db, stored_hashes)
+            except Exception as cleanup_error:
+                print(f"Error cleaning up uploaded files: {str(cleanup_error)}")
+                
+        raise HTTPException(status_code=500, detail=f"File upload failed: {str(e)}")
+        
+@router.post("/files/upload/stream")
+async def upload_file_stream(
+    request: Request,
+    filename: str = Query(...),
+    session_id: Optional[str] = Query(None),
+    db: Session = Depends(get_db)
+) -> Dict:
+    """Streams a single raw request body straight into storage, enforcing limits as bytes arrive."""
+    file_metadata = None
+    recorded = False
+    try:
+        if not session_id:
+            session_id = str(uuid.uuid4())
+        
+        # The body is the file itself, so its type comes from the Content-Type header
+        content_type = request.headers.get("content-type") or mimetypes.guess_type(filename)[0]
+        content_length = request.headers.get("content-length")
+        
+        file_metadata = await content_store.store_stream(
+            db,
+            request.stream(),
+            filename=filename,
+            content_type=content_type,
+            declared_size=int(content_length) if content_length else None
+        )
+        
+        # Store file metadata in database
+        file_record = UploadedFile(
+            id=file_metadata["file_id"],
+            session_id=session_id,
+            original_filename=filename,
+            stored_filename=file_metadata["blob_name"],
+            file_path=file_metadata["gs_uri"],
+            file_type=content_type,
+            file_size=file_metadata["size"],
+            bucket_name=file_metadata["bucket_name"],
+            content_hash=file_metadata["sha256"]
+        )
+        
+        db.add(file_record)
         db.commit()
+        recorded = True
+        
+        signed_url = await asyncio.to_thread(storage_service.get_signed_url, file_metadata["blob_name"])
         
         return {
             "session_id": session_id,
-            "files": uploaded_files
+            "files": [{
+                "file_id": file_metadata["file_id"],
+                "filename": filename,
+                "content_type": content_type,
+                "size": file_metadata["size"],
+                "url": signed_url["url"],
+                "url_expires_at": signed_url["expires_at"],
+                "gs_uri": file_metadata["gs_uri"],
+                "deduplicated": file_metadata["deduplicated"]
+            }]
         }
         
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except Exception as e:
-        # Clean up any partial uploads in case of error
-        if 'session_id' in locals():
+        db.rollback()
+        
+        # Drop the reference taken for the stored content unless the file was recorded
+        if file_metadata and not recorded:
             try:
-                storage_service.delete_session_files(session_id)
+                await content_store.discard(db, [file_metadata["sha256"]])
             except Exception as cleanup_error:
-                print(f"Error cleaning up session files: {str(cleanup_error)}")
+                print(f"Error cleaning up uploaded file: {str(cleanup_error)}")
                 
         raise HTTPException(status_code=500, detail=f"File upload failed: {str(e)}")
+
+@router.post("/files/upload/intents")
+async def create_upload_intents(
+    request_data: Dict[str, Any],
+    request: Request,
+    db: Session = Depends(get_db)
+) -> Dict:
+    """
+    Creates upload URLs so the browser can send file bytes straight to storage.
+    
+    Expects {"session_id": optional, "files": [{"filename", "content_type", "size"}]}.
+    Call /files/upload/complete with the returned intent IDs once the uploads finish.
+    """
+    try:
+        files = request_data.get("files")
+        if not files or not isinstance(files, list):
+            raise HTTPException(status_code=400, detail="files is required")
+        for index, file in enumerate(files):
+            size = file.get("size") if isinstance(file, dict) else None
+            # The size is signed into the upload URL, so it must be exact; a missing size is rejected per file
+            if size is not None and (not isinstance(size, int) or isinstance(size, bool) or size < 0):
+                raise HTTPException(status_code=400, detail=f"files[{index}].size must be a non-negative integer")
+            
+        session_id = request_data.get("session_id") or str(uuid.uuid4())
+        origin = request.headers.get("origin")
+        semaphore = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+        
+        async def create_one(index: int, file: Any) -> Dict:
+            filename = file.get("filename") if isinstance(file, dict) else None
+            if not filename:
+                return {"status": "rejected", "index": index, "filename": filename, "error": "filename is required"}
+                
+            content_type = file.get("content_type") or mimetypes.guess_type(filename)[0]
+            try:
+                async with semaphore:
+                    # Creating a GCS resumable session is a blocking HTTP call
+                    intent = await asyncio.to_thread(
+                        storage_service.create_upload_intent,
+                        filename=filename,
+                        content_type=content_type,
+                        size=file.get("size"),
+                        session_id=session_id,
+                        expiration_minutes=UPLOAD_INTENT_TTL_MINUTES,
+                        origin=origin
+                    )
+            except UploadRejected as e:
+                return {"status": "rejected", "index": index, "filename": filename, "error": e.detail}
+            except Exception as e:
+                return {"status": "error", "index": index, "filename": filename, "error": str(e)}
+                
+            return {"status": "created", "index": index, "filename": filename, "content_type": content_type,
+                    "size": file["size"], **intent}
+            
+        results = await asyncio.gather(*[create_one(index, file) for index, file in enumerate(files)])
+        created = [result for result in results if result["status"] == "created"]
+        failed = [result for result in results if result["status"] != "created"]
         
+        now = datetime.utcnow()
+        expires_at = now + timedelta(minutes=UPLOAD_INTENT_TTL_MINUTES)
+        if created:
+            db.execute(insert(UploadIntent), [
+                {
+                    "id": result["file_id"],
+                    "session_id": session_id,
+                    "original_filename": result["filename"],
+                    "blob_name": result["blob_name"],
+                    "content_type": result["content_type"],
+                    "expected_size": result["size"],
+                    "status": "PENDING",
+                    "created_at": now,
+                    "expires_at": expires_at
+                }
+                for result in created
+            ])
+            db.commit()
+            
+        return {
+            "session_id": session_id,
+            "expires_at": expires_at.isoformat() + "Z",
+            "intents": [
+                {
+                    "intent_id": result["file_id"],
+                    "index": result["index"],
+                    "filename": result["filename"],
+                    "upload_url": result["upload_url"],
+                    "method": result["method"],
+                    "headers": result["headers"]
+                }
+                for result in created
+            ],
+            "failed": failed
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Error creating upload intents: {str(e)}")
+
+@router.post("/files/upload/complete")
+async def complete_uploads(
+    request_data: Dict[str, Any],
+    db: Session = Depends(get_db)
+) -> Dict:
+    """
+    Records direct uploads as session files after checking each object exists with the announced size.
+    
+    Expects {"intent_ids": [...]}. Objects with the wrong size are deleted; missing
+    objects leave the intent pending so the upload can be retried.
+    """
+    try:
+        intent_ids = request_data.get("intent_ids")
+        if not intent_ids or not isinstance(intent_ids, list):
+            raise HTTPException(status_code=400, detail="intent_ids is required")
+            
+        # Locked so two completes of the same intent can't both record it
+        now = datetime.utcnow()
+        intents = db.query(UploadIntent).filter(
+            UploadIntent.id.in_(intent_ids),
+            UploadIntent.status == "PENDING",
+            UploadIntent.expires_at >= now
+        ).with_for_update().all()
+        found = {intent.id for intent in intents}
+        failed = [
+            {"intent_id": intent_id, "error": "Unknown, expired or already completed upload"}
+            for intent_id in intent_ids if intent_id not in found
+        ]
+        
+        # Only object metadata is fetched; the bytes never pass through the API
+        semaphore = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+        
+        async def stat(intent: UploadIntent) -> Optional[int]:
+            async with semaphore:
+                return await asyncio.to_thread(storage_service.get_blob_size, intent.blob_name)
+                
+        sizes = await asyncio.gather(*[stat(intent) for intent in intents])
+        
+        completed = []
+        rejected_blobs = []
+        for intent, size in zip(intents, sizes):
+            if size is None:
+                failed.append({
+                    "intent_id": intent.id,
+                    "filename": intent.original_filename,
+                    "error": "Object not found; upload it before completing"
+                })
+            elif size != intent.expected_size:
+                failed.append({
+                    "intent_id": intent.id,
+                    "filename": intent.original_filename,
+                    "error": f"Size mismatch: expected {intent.expected_size} bytes, got {size}"
+                })
+                intent.status = "FAILED"
+                rejected_blobs.append(intent.blob_name)
+            else:
+                intent.status = "COMPLETED"
+                completed.append(intent)
+                
+        if rejected_blobs:
+            await asyncio.to_thread(storage_service.delete_blobs, rejected_blobs)
+            
+        # Store metadata for every verified upload in one batched insert
+        if completed:
+            db.execute(insert(UploadedFile), [
+                {
+                    "id": intent.id,
+                    "session_id": intent.session_id,
+                    "original_filename": intent.original_filename,
+                    "stored_filename": intent.blob_name,
+                    "file_path": storage_service.file_uri(intent.blob_name),
+                    "file_type": intent.content_type,
+                    "file_size": intent.expected_size,
+                    "bucket_name": storage_service.bucket_name,
+                    "created_at": now
+                }
+                for intent in completed
+            ])
+        db.commit()
+        
+        signed_urls = await asyncio.to_thread(
+            storage_service.get_signed_urls, [intent.blob_name for intent in completed]
+        )
+        
+        return {
+            "session_id": completed[0].session_id if completed else request_data.get("session_id"),
+            "files": [
+                {
+                    "file_id": intent.id,
+                    "filename": intent.original_filename,
+                    "content_type": intent.content_type,
+                    "size": intent.expected_size,
+                    "url": signed_urls[intent.blob_name]["url"],
+                    "url_expires_at": signed_urls[intent.blob_name]["expires_at"],
+                    "gs_uri": storage_service.file_uri(intent.blob_name),
+                    "deduplicated": False
+                }
+                for intent in completed
+            ],
+            "failed": failed
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Error completing uploads: {str(e)}")
+
 @router.get("/files/sessions/{session_id}")
 async def get_session_files(
     session_id: str,
@@ -88,18 +440,24 @@ async def get_session_files(
         
         if not files:
             return {"session_id": session_id, "files": []}
+        file_context_service.touch_session(db, session_id)
             
+        # Sign the whole listing at once, reusing cached URLs that are still valid
+        signed_urls = await asyncio.to_thread(
+            storage_service.get_signed_urls, [file.stored_filename for file in files]
+        )
+        
         result_files = []
         for file in files:
-            # Generate fresh signed URLs for each file
-            signed_url = storage_service.generate_signed_url(file.stored_filename)
+            signed_url = signed_urls[file.stored_filename]
             
             result_files.append({
                 "file_id": file.id,
                 "filename": file.original_filename,
                 "content_type": file.file_type,
                 "size": file.file_size,
-                "url": signed_url,
+                "url": signed_url["url"],
+                "url_expires_at": signed_url["expires_at"],
                 "gs_uri": file.file_path
             })
             
@@ -111,32 +469,200 @@ async def get_session_files(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving session files: {str(e)}")
 
+def _delete_session(db: Session, session_id: str) -> Dict:
+    """Deletes a session's blobs and rows with batched storage deletes and one bulk DELETE."""
+    deleted = session_gc_service.delete_sessions(db, [session_id])
+    
+    if not deleted["files"]:
+        return {"success": True, "message": "No files found for session"}
+        
+    return {
+        "success": True,
+        "message": f"Deleted {deleted['files']} files from session",
+        "deleted_blobs": deleted["blobs"],
+        "reclaimed_bytes": deleted["bytes"]
+    }
+
+def _delete_session_in_background(session_id: str) -> None:
+    """Runs a session delete after the response was sent, with its own database session."""
+    db = SessionLocal()
+    try:
+        result = _delete_session(db, session_id)
+        print(f"Background delete of session {session_id}: {result['message']}")
+    except Exception as e:
+        print(f"Error deleting session {session_id} in background: {str(e)}")
+    finally:
+        db.close()
+
 @router.delete("/files/sessions/{session_id}")
 async def delete_session(
     session_id: str,
+    background_tasks: BackgroundTasks,
+    background: bool = Query(False, description="Return immediately and delete in the background"),
     db: Session = Depends(get_db)
 ) -> Dict:
     """Deletes all files associated with a session."""
     try:
-        # Get all files for the session
-        files = db.query(UploadedFile).filter(UploadedFile.session_id == session_id).all()
+        if background:
+            background_tasks.add_task(_delete_session_in_background, session_id)
+            return {"success": True, "message": "Session deletion scheduled", "scheduled": True}
+            
+        # Blob deletes are blocking, so run them off the event loop
+        return await asyncio.to_thread(_delete_session, db, session_id)
         
-        if not files:
-            return {"success": True, "message": "No files found for session"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error deleting session: {str(e)}")
+
+def _parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parses a single-range Range header into inclusive (start, end) offsets.
+    
+    Returns None for headers that should be ignored (e.g. multiple ranges) and
+    raises ValueError for ranges that can't be satisfied.
+    """
+    match = _RANGE_PATTERN.match(range_header.strip())
+    if not match or not any(match.groups()):
+        return None
+        
+    start, end = match.groups()
+    if not start:
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(size - length, 0), size - 1
+        
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError("Range not satisfiable")
+    return start, end
+    
+def _iter_file_range(path: str, start: int, end: int) -> Iterator[bytes]:
+    """Yields a byte range of a file from a read-only memory map."""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        position = start
+        while position <= end:
+            next_position = min(position + RANGE_CHUNK_SIZE, end + 1)
+            yield mapped[position:next_position]
+            position = next_position
             
-        # Delete files from GCS
-        deleted_blobs = storage_service.delete_session_files(session_id)
+@router.get("/files/blobs/{blob_name:path}")
+async def download_blob(
+    blob_name: str,
+    request: Request,
+    expires: int = Query(...),
+    signature: str = Query(...),
+    db: Session = Depends(get_db)
+):
+    """Serves a blob from local storage to holders of a signed URL, with Range support."""
+    try:
+        if not storage_service.is_local:
+            raise HTTPException(status_code=404, detail="Not found")
             
-        # Delete records from database
-        for file in files:
-            db.delete(file)
+        if not storage_service.backend.verify_signature(blob_name, expires, signature):
+            raise HTTPException(status_code=403, detail="Invalid or expired signature")
             
-        db.commit()
+        path = storage_service.backend.path(blob_name)
+        if not os.path.isfile(path):
+            raise HTTPException(status_code=404, detail="File not found")
+            
+        file = db.query(UploadedFile.file_type).filter(
+            UploadedFile.stored_filename == blob_name,
+            UploadedFile.file_type.isnot(None)
+        ).first()
+        media_type = (file.file_type if file else None) or mimetypes.guess_type(blob_name)[0] or "application/octet-stream"
+        
+        size = os.path.getsize(path)
+        headers = {"Accept-Ranges": "bytes"}
+        
+        range_header = request.headers.get("range")
+        byte_range = None
+        if range_header:
+            try:
+                byte_range = _parse_range(range_header, size)
+            except ValueError:
+                return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+                
+        if byte_range:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Length"] = str(end - start + 1)
+            return StreamingResponse(
+                _iter_file_range(path, start, end),
+                status_code=206,
+                media_type=media_type,
+                headers=headers
+            )
+            
+        # Whole files go through FileResponse, which uses sendfile when the server supports it
+        return FileResponse(path, media_type=media_type, headers=headers)
         
-        return {"success": True, "message": f"Deleted {len(deleted_blobs)} files from session"}
+    except HTTPException:
+        raise
+    except ValueError:
+        raise HTTPException(status_code=404, detail="File not found")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error serving file: {str(e)}")
+
+@router.put("/files/blobs/{blob_name:path}")
+async def upload_blob(
+    blob_name: str,
+    request: Request,
+    expires: int = Query(...),
+    signature: str = Query(...)
+) -> Dict:
+    """
+    Receives a direct upload into local storage from holders of a signed upload URL.
+    
+    The URL only works while its upload intent is pending, so it can't be replayed to
+    overwrite a file once /files/upload/complete has verified and recorded it.
+    """
+    try:
+        if not storage_service.is_local:
+            raise HTTPException(status_code=404, detail="Not found")
+            
+        if not storage_service.backend.verify_signature(blob_name, expires, signature, method="PUT"):
+            raise HTTPException(status_code=403, detail="Invalid or expired signature")
+            
+        # A short-lived session, so no connection is held while the body streams in
+        with SessionLocal() as db:
+            expected_size = db.query(UploadIntent.expected_size).filter(
+                UploadIntent.blob_name == blob_name,
+                UploadIntent.status == "PENDING",
+                UploadIntent.expires_at >= datetime.utcnow()
+            ).scalar()
+        if expected_size is None:
+            raise HTTPException(status_code=409, detail="No pending upload for this URL")
+            
+        content_length = request.headers.get("content-length")
+        if content_length and int(content_length) != expected_size:
+            raise HTTPException(status_code=400, detail=f"Expected {expected_size} bytes, got Content-Length {content_length}")
+        storage_service.limits.check_size(expected_size)
+        
+        stream = await storage_service.backend.open_upload_stream(blob_name)
+        received = 0
+        try:
+            async for chunk in request.stream():
+                received += len(chunk)
+                if received > expected_size:
+                    raise HTTPException(status_code=400, detail=f"Upload is larger than the announced {expected_size} bytes")
+                await stream.write(chunk)
+            size = await stream.close()
+        except BaseException:
+            await stream.abort()
+            raise
+            
+        return {"blob_name": blob_name, "size": size}
         
+    except HTTPException:
+        raise
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Not found")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error deleting session: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error storing file: {str(e)}")
 
 @router.get("/files/{file_id}/url")
 async def get_file_url(
@@ -150,14 +676,15 @@ async def get_file_url(
         if not file:
             raise HTTPException(status_code=404, detail="File not found")
             
-        # Generate a fresh signed URL
-        signed_url = storage_service.generate_signed_url(file.stored_filename)
+        # Reuse a cached signed URL while it is still comfortably valid
+        signed_url = storage_service.get_signed_url(file.stored_filename)
         
         return {
             "file_id": file.id,
             "filename": file.original_filename,
-            "url": signed_url,
-            "expires_in": "15 minutes"
+            "url": signed_url["url"],
+            "expires_at": signed_url["expires_at"],
+            "expires_in": signed_url["expires_in"]
         }
         
     except HTTPException:
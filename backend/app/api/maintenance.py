@@ -0,0 +1,91 @@
+import asyncio
+import os
+from typing import Dict, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from app.database import get_db
+from app.services.compaction_service import CompactionService
+from app.api.files import session_gc_service
+from app.services.conversation_memory_service import conversation_memory
+
+router = APIRouter()
+
+compaction_service = CompactionService()
+
+# How often the background compaction job runs (0 disables it)
+COMPACTION_INTERVAL_MINUTES = int(os.getenv("COMPACTION_INTERVAL_MINUTES", "0"))
+
+# How often idle upload sessions are garbage collected (0 disables it)
+SESSION_GC_INTERVAL_MINUTES = int(os.getenv("SESSION_GC_INTERVAL_MINUTES", "0"))
+
+# How often conversation memory idle past MEMORY_TTL_HOURS is deleted (0 disables it)
+MEMORY_GC_INTERVAL_MINUTES = int(os.getenv("MEMORY_GC_INTERVAL_MINUTES", "0"))
+
+@router.post("/maintenance/compact")
+async def compact_tombstones(
+    grace_period_days: Optional[int] = Query(None, ge=0),
+    max_batches: int = Query(1000, ge=1),
+    db: Session = Depends(get_db)
+) -> Dict:
+    """Archives or purges soft-deleted agents and deployments past the grace period."""
+    try:
+        # Archive writes and batched deletes are blocking, so run them off the event loop
+        return await asyncio.to_thread(
+            compaction_service.compact, db, grace_period_days=grace_period_days, max_batches=max_batches
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error compacting tombstones: {str(e)}")
+
+@router.post("/maintenance/session-gc")
+async def collect_idle_sessions(
+    ttl_hours: Optional[float] = Query(None, ge=0),
+    max_batches: int = Query(100, ge=1),
+    db: Session = Depends(get_db)
+) -> Dict:
+    """Deletes upload sessions idle past the TTL and reports the reclaimed storage."""
+    try:
+        # Storage deletes are blocking, so run them off the event loop
+        return await asyncio.to_thread(
+            session_gc_service.collect, db, ttl_hours=ttl_hours, max_batches=max_batches
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error collecting idle sessions: {str(e)}")
+
+@router.post("/maintenance/memory-gc")
+async def collect_idle_conversations(
+    ttl_hours: Optional[float] = Query(None, ge=0),
+    db: Session = Depends(get_db)
+) -> Dict:
+    """Deletes the memory of conversations idle past the TTL."""
+    try:
+        return await asyncio.to_thread(conversation_memory.collect, db, ttl_hours=ttl_hours)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error collecting idle conversations: {str(e)}")
+
+async def run_compaction_schedule():
+    """Runs compaction periodically in a worker thread until cancelled."""
+    while True:
+        await asyncio.sleep(COMPACTION_INTERVAL_MINUTES * 60)
+        try:
+            await asyncio.to_thread(compaction_service.run_scheduled)
+        except Exception as e:
+            print(f"Error running scheduled compaction: {str(e)}")
+
+async def run_session_gc_schedule():
+    """Runs session garbage collection periodically in a worker thread until cancelled."""
+    while True:
+        await asyncio.sleep(SESSION_GC_INTERVAL_MINUTES * 60)
+        try:
+            await asyncio.to_thread(session_gc_service.run_scheduled)
+        except Exception as e:
+            print(f"Error running scheduled session GC: {str(e)}")
+
+async def run_memory_gc_schedule():
+    """Runs conversation memory garbage collection periodically in a worker thread until cancelled."""
+    while True:
+        await asyncio.sleep(MEMORY_GC_INTERVAL_MINUTES * 60)
+        try:
+            await asyncio.to_thread(conversation_memory.run_scheduled)
+        except Exception as e:
+            print(f"Error running scheduled memory GC: {str(e)}")
@@ -1,7 +1,8 @@
 # backend/app/database.py
-from sqlalchemy import create_engine, Column, String, Float, Integer, Text, JSON, DateTime, Boolean, ForeignKey
+from sqlalchemy import create_engine, inspect, text, Column, String, Float, Integer, Text, JSON, DateTime, Boolean, ForeignKey, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.sql.expression import false
 import uuid, os
 from datetime import datetime
 
@@ -81,6 +82,9 @@ class CustomTool(Base):
     name = Column(String, nullable=False)
     description = Column(Text, nullable=True)
     code = Column(Text, nullable=False)
+    signature = Column(JSON, nullable=True)  # Entry point and parameters, extracted from the AST on save
+    bytecode = Column(LargeBinary, nullable=True)  # Marshalled code object, prefixed with the Python magic number
+    is_pure = Column(Boolean, nullable=False, default=False, server_default=false())  # Same inputs always give the same result; results are memoized
     user_id = Column(String, nullable=True)  # If you have user authentication
     created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
     updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -98,10 +102,103 @@ class UploadedFile(Base):
     file_size = Column(Integer, nullable=True)
     created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
     bucket_name = Column(String, nullable=True)       # GCS bucket name
+    content_hash = Column(String, nullable=True, index=True)  # SHA-256 of the content (shared blob)
+    last_used_at = Column(DateTime, nullable=True)    # Last time the session's files were read (session GC)
     
     # Add relationship to agent tests if needed
     # test_id = Column(String, ForeignKey("agent_tests.id"), nullable=True)
     # test = relationship("AgentTest", back_populates="files")
 
+# Content-addressed blobs shared by uploaded files with identical content
+class StoredBlob(Base):
+    __tablename__ = "stored_blobs"
+    
+    content_hash = Column(String, primary_key=True)  # SHA-256 of the content
+    blob_name = Column(String, nullable=False)       # Blob name in GCS (cas/<sha256>)
+    file_size = Column(Integer, nullable=True)
+    content_type = Column(String, nullable=True)
+    ref_count = Column(Integer, nullable=False, default=0)  # Number of UploadedFile rows using the blob
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+# Direct-to-bucket uploads announced by the browser, recorded as files once the object is verified
+class UploadIntent(Base):
+    __tablename__ = "upload_intents"
+    
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))  # Becomes the UploadedFile ID
+    session_id = Column(String, nullable=False, index=True)
+    original_filename = Column(String, nullable=False)
+    blob_name = Column(String, nullable=False)        # Blob the browser uploads to
+    content_type = Column(String, nullable=True)
+    expected_size = Column(Integer, nullable=False)   # Size announced when the intent was created
+    status = Column(String, nullable=False, default="PENDING")  # PENDING, COMPLETED or FAILED
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+# Archive for compacted tombstones (soft-deleted agents, deployments and their tests)
+class ArchivedRecord(Base):
+    __tablename__ = "archived_records"
+    
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    table_name = Column(String, nullable=False, index=True)  # Source table of the record
+    record_id = Column(String, nullable=False, index=True)   # Primary key in the source table
+    data = Column(JSON, nullable=False)                      # Column values at compaction time
+    archived_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+# Conversation memory of memory_enabled agents, keyed by a client-supplied conversation ID
+class Conversation(Base):
+    __tablename__ = "conversations"
+    
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    agent_id = Column(String, nullable=True, index=True)  # Agent that last used the conversation
+    summary = Column(Text, nullable=True)                 # Rolling summary of turns that fell out of the window
+    summarized_turns = Column(Integer, nullable=False, default=0)  # Number of turns folded into the summary
+    turn_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+# Recent turns of a conversation; older ones are deleted once folded into the summary
+class ConversationTurn(Base):
+    __tablename__ = "conversation_turns"
+    
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    conversation_id = Column(String, ForeignKey("conversations.id"), nullable=False, index=True)
+    seq = Column(Integer, nullable=False)         # Position in the conversation, starting at 1
+    role = Column(String, nullable=False)         # user or assistant
+    content = Column(Text, nullable=False)
+    tokens = Column(Integer, nullable=False, default=0)  # Estimated token count of the content
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+# Columns added to tables that already existed; create_all never alters an existing table
+ADDED_COLUMNS = [
+    UploadedFile.__table__.c.content_hash,
+    UploadedFile.__table__.c.last_used_at,
+    CustomTool.__table__.c.signature,
+    CustomTool.__table__.c.bytecode,
+    CustomTool.__table__.c.is_pure,
+]
+
+def upgrade_schema(bind) -> None:
+    """Adds ADDED_COLUMNS missing from existing tables, with their indexes."""
+    inspector = inspect(bind)
+    with bind.begin() as connection:
+        for column in ADDED_COLUMNS:
+            table = column.table
+            if column.name in {existing["name"] for existing in inspector.get_columns(table.name)}:
+                continue
+                
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=bind.dialect)}"
+            if column.server_default is not None:
+                default = column.server_default.arg
+                ddl += f" DEFAULT {default.compile(dialect=bind.dialect) if hasattr(default, 'compile') else repr(default)}"
+            if not column.nullable:
+                ddl += " NOT NULL"
+            connection.execute(text(ddl))
+            
+            for index in table.indexes:
+                if column.name in index.columns:
+                    index.create(connection)
+            print(f"Added column {table.name}.{column.name}")
+
 # Create all tables
 Base.metadata.create_all(bind=engine)
+upgrade_schema(engine)
@@ -1,10 +1,13 @@
 import os
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
 
-from app.api import agents, files
+from app.api import agents, files, maintenance
+from app.services.agent_cache import agent_cache_invalidator
+from app.services.custom_tool_service import sandbox_enabled, tool_sandbox_pool
+from app.services.langgraph_templates import graph_templates
 
 # Load environment variables
 load_dotenv()
@@ -28,12 +31,53 @@ app.add_middleware(
 # Include routers
 app.include_router(agents.router, prefix="/api", tags=["agents"])
 app.include_router(files.router, prefix="/api", tags=["files"])
+app.include_router(maintenance.router, prefix="/api", tags=["maintenance"])
 
-# Mount static files directory for uploaded files (if needed)
+# Local upload directory; blobs in it are served through signed URLs by the files router
 UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
 if not os.path.exists(UPLOAD_DIR):
     os.makedirs(UPLOAD_DIR)
-app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
+
+# Keep agent config caches in sync across workers (no-op unless AGENT_CACHE_NOTIFY=true)
+@app.on_event("startup")
+async def start_agent_cache_listener():
+    agent_cache_invalidator.start()
+
+@app.on_event("shutdown")
+async def stop_agent_cache_listener():
+    agent_cache_invalidator.stop()
+
+# Pre-start custom tool sandbox workers so the first tool call doesn't pay for it
+@app.on_event("startup")
+async def start_tool_sandbox():
+    if sandbox_enabled():
+        await asyncio.to_thread(tool_sandbox_pool.start)
+
+@app.on_event("shutdown")
+async def stop_tool_sandbox():
+    tool_sandbox_pool.stop()
+
+# Close the LangGraph checkpointer's database connection (sqlite checkpointer only)
+@app.on_event("shutdown")
+async def close_graph_checkpointer():
+    await graph_templates.close()
+
+# Scheduled maintenance jobs
+background_tasks = []
+
+@app.on_event("startup")
+async def start_maintenance_jobs():
+    if maintenance.COMPACTION_INTERVAL_MINUTES > 0:
+        background_tasks.append(asyncio.create_task(maintenance.run_compaction_schedule()))
+    if maintenance.SESSION_GC_INTERVAL_MINUTES > 0:
+        background_tasks.append(asyncio.create_task(maintenance.run_session_gc_schedule()))
+    if maintenance.MEMORY_GC_INTERVAL_MINUTES > 0:
+        background_tasks.append(asyncio.create_task(maintenance.run_memory_gc_schedule()))
+
+@app.on_event("shutdown")
+async def stop_maintenance_jobs():
+    for task in background_tasks:
+        task.cancel()
 
 # Health check endpoint
 @app.get("/api/health", tags=["health"])
@@ -32,6 +32,7 @@ class CrewAITaskConfig(BaseModel):
     description: str
     expected_output: str
     assigned_agent_index: int
+    context: List[int] = []  # Indices of tasks whose output this task needs
 
 class CrewAIConfig(BaseModel):
     processType: str
@@ -0,0 +1,189 @@
+# backend/app/services/agent_cache.py
+import os
+import select
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.database import engine, Agent, Deployment
+
+CacheKey = Tuple[str, str, str]
+
+
+def _row_to_dict(row) -> Dict[str, Any]:
+    """Copies the column values of an ORM row into a plain dict."""
+    return {column.name: getattr(row, column.name) for column in row.__table__.columns}
+
+
+class AgentConfigCache:
+    """Bounded, TTL-evicting read-through cache of agents and their active deployments."""
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = 60.0):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[CacheKey, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_active(self, db: Session, agent_id: str, project_id: str, region: str) -> Optional[Dict[str, Any]]:
+        """
+        Gets an agent and its active deployment, loading them from the database on a miss.
+
+        Args:
+            db: Database session used on a cache miss
+            agent_id: ID of the agent
+            project_id: Project of the deployment
+            region: Region of the deployment
+
+        Returns:
+            Dict with "agent" and "deployment" snapshots, or None if the agent does not exist.
+            "deployment" is None when the agent has no active deployment; such entries are not cached.
+        """
+        key = (agent_id, project_id, region)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry:
+                del self._entries[key]
+            self.misses += 1
+
+        agent = db.query(Agent).filter(Agent.id == agent_id).first()
+        if not agent:
+            return None
+
+        deployment = db.query(Deployment).filter(
+            Deployment.agent_id == agent.id,
+            Deployment.project_id == project_id,
+            Deployment.region == region,
+            Deployment.status == "ACTIVE"
+        ).first()
+
+        config = {
+            "agent": _row_to_dict(agent),
+            "deployment": _row_to_dict(deployment) if deployment else None
+        }
+
+        # Only cache complete configs so a new deployment is picked up immediately
+        if deployment:
+            with self._lock:
+                self._entries[key] = (now + self.ttl_seconds, config)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+
+        return config
+
+    def invalidate(self, agent_id: str) -> int:
+        """Drops every cached entry for an agent and returns how many were removed."""
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == agent_id]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        """Drops all cached entries."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns cache size and hit/miss counters."""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+class AgentCacheInvalidator:
+    """Keeps agent caches in sync across workers with Postgres LISTEN/NOTIFY."""
+
+    def __init__(self, cache: AgentConfigCache, channel: str = "agent_cache_invalidate"):
+        self.cache = cache
+        self.channel = channel
+        self.enabled = (
+            os.getenv("AGENT_CACHE_NOTIFY", "false").lower() == "true"
+            and engine.dialect.name == "postgresql"
+        )
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def invalidate(self, agent_id: str) -> None:
+        """Invalidates an agent locally and notifies the other workers."""
+        self.cache.invalidate(agent_id)
+
+        if not self.enabled:
+            return
+
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": self.channel, "payload": agent_id})
+                conn.commit()
+        except Exception as e:
+            print(f"Error publishing agent cache invalidation: {str(e)}")
+
+    def start(self) -> None:
+        """Starts the background listener thread if cross-worker invalidation is enabled."""
+        if not self.enabled or self._thread:
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._listen, name="agent-cache-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops the background listener thread."""
+        self._stop.set()
+        self._thread = None
+
+    def _listen(self) -> None:
+        """Listens for invalidation notifications until stopped, reconnecting on errors."""
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = engine.raw_connection()
+                dbapi_conn = conn.driver_connection
+                dbapi_conn.autocommit = True
+                cursor = dbapi_conn.cursor()
+                cursor.execute(f'LISTEN "{self.channel}"')
+
+                # Anything cached before we started listening may be stale
+                self.cache.clear()
+
+                while not self._stop.is_set():
+                    if select.select([dbapi_conn], [], [], 5.0) == ([], [], []):
+                        continue
+                    dbapi_conn.poll()
+                    while dbapi_conn.notifies:
+                        notification = dbapi_conn.notifies.pop(0)
+                        self.cache.invalidate(notification.payload)
+            except Exception as e:
+                print(f"Agent cache listener error: {str(e)}")
+                self.cache.clear()
+                self._stop.wait(5.0)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+
+agent_config_cache = AgentConfigCache(
+    max_size=int(os.getenv("AGENT_CACHE_MAX_SIZE", "1024")),
+    ttl_seconds=float(os.getenv("AGENT_CACHE_TTL_SECONDS", "60"))
+)
+agent_cache_invalidator = AgentCacheInvalidator(agent_config_cache)
@@ -0,0 +1,190 @@
+# backend/app/services/agent_transfer_service.py
+import json
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal, Agent
+
+class AgentTransferService:
+    """Service for bulk exporting and importing agents as JSON Lines."""
+
+    @staticmethod
+    def agent_to_record(agent: Agent) -> Dict[str, Any]:
+        """Converts an agent row into a portable export record."""
+        return {
+            "id": agent.id,
+            "displayName": agent.display_name,
+            "description": agent.description,
+            "framework": agent.framework,
+            "modelId": agent.model_id,
+            "temperature": agent.temperature,
+            "maxOutputTokens": agent.max_output_tokens,
+            "systemInstruction": agent.system_instruction or "",
+            "frameworkConfig": agent.framework_config,
+            "tools": agent.tools,
+            "memoryEnabled": agent.memory_enabled,
+            "promptTemplate": agent.prompt_template,
+            "customCode": agent.custom_code,
+            "status": agent.status,
+            "createTime": agent.created_at.isoformat(),
+            "updateTime": agent.updated_at.isoformat()
+        }
+
+    @staticmethod
+    def record_to_row(record: Any, preserve_ids: bool = False) -> Dict[str, Any]:
+        """
+        Validates an import record and converts it into agent column values.
+
+        Args:
+            record: Parsed JSON record
+            preserve_ids: Keep the record's "id" instead of assigning a new one
+
+        Returns:
+            Dict of Agent column values
+
+        Raises:
+            ValueError: If the record is invalid
+        """
+        if not isinstance(record, dict):
+            raise ValueError("Record must be a JSON object")
+
+        display_name = record.get("displayName")
+        if not display_name or not isinstance(display_name, str):
+            raise ValueError("displayName is required")
+
+        # Accept both plain-text and parts-style system instructions
+        system_instruction = record.get("systemInstruction") or ""
+        if isinstance(system_instruction, dict):
+            parts = system_instruction.get("parts") or []
+            system_instruction = parts[0].get("text", "") if parts and isinstance(parts[0], dict) else ""
+        elif not isinstance(system_instruction, str):
+            raise ValueError("systemInstruction must be a string or a parts object")
+
+        framework_config = record.get("frameworkConfig") or {}
+        if not isinstance(framework_config, dict):
+            raise ValueError("frameworkConfig must be an object")
+
+        tools = record.get("tools") or []
+        if not isinstance(tools, list):
+            raise ValueError("tools must be a list")
+
+        custom_code = record.get("customCode") or {}
+        if not isinstance(custom_code, dict):
+            raise ValueError("customCode must be an object")
+
+        try:
+            temperature = float(record.get("temperature", 0.2))
+            max_output_tokens = int(record.get("maxOutputTokens", 1024))
+        except (TypeError, ValueError):
+            raise ValueError("temperature and maxOutputTokens must be numeric")
+
+        agent_id = record.get("id") if preserve_ids else None
+        if agent_id is not None and not isinstance(agent_id, str):
+            raise ValueError("id must be a string")
+
+        now = datetime.utcnow()
+        return {
+            "id": agent_id or str(uuid.uuid4()),
+            "display_name": display_name,
+            "description": record.get("description") or "",
+            "framework": record.get("framework") or "CUSTOM",
+            "model_id": record.get("modelId") or "gemini-1.5-pro",
+            "temperature": temperature,
+            "max_output_tokens": max_output_tokens,
+            "system_instruction": system_instruction,
+            "framework_config": framework_config,
+            "tools": tools,
+            "memory_enabled": bool(record.get("memoryEnabled", False)),
+            "prompt_template": record.get("promptTemplate") or "",
+            "custom_code": custom_code,
+            # Deployments are environment specific, so imported agents start as drafts
+            "status": "DRAFT",
+            "created_at": now,
+            "updated_at": now
+        }
+
+    @staticmethod
+    def export_agents(status: Optional[str] = None, batch_size: int = 500) -> Iterator[str]:
+        """
+        Streams agents as JSON Lines.
+
+        Uses its own session so the stream outlives the request's session.
+
+        Args:
+            status: Optional status filter
+            batch_size: Number of rows fetched per round-trip
+
+        Yields:
+            One JSON-encoded agent per line
+        """
+        db = SessionLocal()
+        try:
+            query = db.query(Agent).filter(Agent.status != "DELETED")
+            if status:
+                query = query.filter(Agent.status == status)
+
+            for agent in query.order_by(Agent.created_at).yield_per(batch_size):
+                yield json.dumps(AgentTransferService.agent_to_record(agent)) + "\n"
+        finally:
+            db.close()
+
+    @staticmethod
+    def import_batch(db: Session, lines: List[Tuple[int, bytes]], preserve_ids: bool = False) -> List[Dict[str, Any]]:
+        """
+        Validates and inserts a batch of JSON Lines records in a single transaction.
+
+        If the batch insert fails, rows are retried one at a time so each
+        record gets its own outcome.
+
+        Args:
+            db: Database session
+            lines: (line number, raw line) pairs
+            preserve_ids: Keep record IDs instead of assigning new ones
+
+        Returns:
+            Per-record outcomes in input order
+        """
+        outcomes: List[Dict[str, Any]] = []
+        rows: List[Dict[str, Any]] = []
+        row_outcomes: List[Dict[str, Any]] = []
+
+        for line_number, line in lines:
+            try:
+                row = AgentTransferService.record_to_row(json.loads(line), preserve_ids)
+            except json.JSONDecodeError as e:
+                outcomes.append({"line": line_number, "status": "error", "error": f"Invalid JSON: {str(e)}"})
+                continue
+            except ValueError as e:
+                outcomes.append({"line": line_number, "status": "error", "error": str(e)})
+                continue
+
+            outcome = {"line": line_number, "status": "created", "id": row["id"]}
+            rows.append(row)
+            row_outcomes.append(outcome)
+            outcomes.append(outcome)
+
+        if not rows:
+            return outcomes
+
+        try:
+            db.execute(insert(Agent), rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+
+            # Fall back to row-by-row inserts to isolate the failing records
+            for row, outcome in zip(rows, row_outcomes):
+                try:
+                    db.execute(insert(Agent), [row])
+                    db.commit()
+                except Exception as e:
+                    db.rollback()
+                    outcome.pop("id", None)
+                    outcome["status"] = "error"
+                    outcome["error"] = str(e).splitlines()[0]
+
+        return outcomes
@@ -0,0 +1,147 @@
+# backend/app/services/compaction_service.py
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import delete, insert
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal, Agent, Deployment, AgentTest, ArchivedRecord
+
+class CompactionService:
+    """Service for compacting soft-deleted agents and deployments."""
+
+    def __init__(self):
+        self.grace_period_days = int(os.getenv("COMPACTION_GRACE_PERIOD_DAYS", "7"))
+        self.batch_size = int(os.getenv("COMPACTION_BATCH_SIZE", "100"))
+        self.archive = os.getenv("COMPACTION_MODE", "archive").lower() != "purge"
+
+    @staticmethod
+    def _archive_rows(db: Session, table_name: str, rows: List[Any]) -> None:
+        """Copies rows into the archive table."""
+        if not rows:
+            return
+
+        now = datetime.utcnow()
+        db.execute(insert(ArchivedRecord), [
+            {
+                "id": str(uuid.uuid4()),
+                "table_name": table_name,
+                "record_id": row.id,
+                "data": {
+                    column.name: (value.isoformat() if isinstance(value, datetime) else value)
+                    for column in row.__table__.columns
+                    for value in [getattr(row, column.name)]
+                },
+                "archived_at": now
+            }
+            for row in rows
+        ])
+
+    def _compact_agent_batch(self, db: Session, cutoff: datetime) -> Dict[str, int]:
+        """Removes one batch of deleted agents along with their deployments and tests."""
+        agent_ids = [
+            agent_id for (agent_id,) in db.query(Agent.id).filter(
+                Agent.status == "DELETED",
+                Agent.updated_at < cutoff
+            ).limit(self.batch_size).all()
+        ]
+        if not agent_ids:
+            return {"agents": 0, "deployments": 0, "tests": 0}
+
+        if self.archive:
+            self._archive_rows(db, "agent_tests", db.query(AgentTest).filter(AgentTest.agent_id.in_(agent_ids)).all())
+            self._archive_rows(db, "deployments", db.query(Deployment).filter(Deployment.agent_id.in_(agent_ids)).all())
+            self._archive_rows(db, "agents", db.query(Agent).filter(Agent.id.in_(agent_ids)).all())
+
+        tests = db.execute(delete(AgentTest).where(AgentTest.agent_id.in_(agent_ids))).rowcount
+        deployments = db.execute(delete(Deployment).where(Deployment.agent_id.in_(agent_ids))).rowcount
+        agents = db.execute(delete(Agent).where(Agent.id.in_(agent_ids))).rowcount
+        db.commit()
+
+        return {"agents": agents, "deployments": deployments, "tests": tests}
+
+    def _compact_deployment_batch(self, db: Session, cutoff: datetime) -> int:
+        """Removes one batch of deleted deployments that belong to live agents."""
+        deployments = db.query(Deployment).filter(
+            Deployment.status == "DELETED",
+            Deployment.updated_at < cutoff
+        ).limit(self.batch_size).all()
+        if not deployments:
+            return 0
+
+        if self.archive:
+            self._archive_rows(db, "deployments", deployments)
+
+        deleted = db.execute(
+            delete(Deployment).where(Deployment.id.in_([deployment.id for deployment in deployments]))
+        ).rowcount
+        db.commit()
+
+        return deleted
+
+    def compact(self, db: Session, grace_period_days: Optional[int] = None, max_batches: int = 1000, pause_seconds: float = 0.0) -> Dict[str, Any]:
+        """
+        Archives or purges tombstoned agents and deployments older than the grace period.
+
+        Works in small batches, each in its own short transaction, to avoid long locks.
+
+        Args:
+            db: Database session
+            grace_period_days: Override for the configured grace period
+            max_batches: Upper bound on batches processed in this run
+            pause_seconds: Sleep between batches to yield to foreground traffic
+
+        Returns:
+            Report of reclaimed rows
+        """
+        grace_period_days = self.grace_period_days if grace_period_days is None else grace_period_days
+        cutoff = datetime.utcnow() - timedelta(days=grace_period_days)
+        started = time.monotonic()
+
+        report = {
+            "mode": "archive" if self.archive else "purge",
+            "cutoff": cutoff.isoformat(),
+            "agents": 0,
+            "deployments": 0,
+            "tests": 0,
+            "batches": 0
+        }
+
+        try:
+            while report["batches"] < max_batches:
+                reclaimed = self._compact_agent_batch(db, cutoff)
+                if not reclaimed["agents"]:
+                    break
+                for key, count in reclaimed.items():
+                    report[key] += count
+                report["batches"] += 1
+                if pause_seconds:
+                    time.sleep(pause_seconds)
+
+            while report["batches"] < max_batches:
+                deleted = self._compact_deployment_batch(db, cutoff)
+                if not deleted:
+                    break
+                report["deployments"] += deleted
+                report["batches"] += 1
+                if pause_seconds:
+                    time.sleep(pause_seconds)
+        except Exception:
+            db.rollback()
+            raise
+
+        report["duration_ms"] = (time.monotonic() - started) * 1000
+        return report
+
+    def run_scheduled(self) -> Dict[str, Any]:
+        """Runs a compaction pass with its own session, for use by the scheduler."""
+        db = SessionLocal()
+        try:
+            report = self.compact(db, pause_seconds=0.05)
+            print(f"Compaction reclaimed {report['agents']} agents, {report['deployments']} deployments, {report['tests']} tests")
+            return report
+        finally:
+            db.close()
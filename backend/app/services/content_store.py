@@ -0,0 +1,191 @@
+# backend/app/services/content_store.py
+import asyncio
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional, BinaryIO
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.database import StoredBlob
+from app.services.file_context_service import FileContextService
+from app.services.storage_service import StorageService
+
+class ContentStore:
+    """Content-addressed, reference-counted file storage on top of StorageService."""
+
+    def __init__(self, storage_service: StorageService, file_context_service: Optional[FileContextService] = None):
+        self.storage = storage_service
+        # Drops the cached chunks of blobs it deletes
+        self.file_context = file_context_service
+
+    @staticmethod
+    def add_reference(db: Session, content_hash: str) -> bool:
+        """Adds a reference to existing content; returns False if the content isn't stored yet."""
+        updated = db.query(StoredBlob).filter(
+            StoredBlob.content_hash == content_hash
+        ).update({StoredBlob.ref_count: StoredBlob.ref_count + 1}, synchronize_session=False)
+        db.commit()
+        return updated == 1
+
+    @staticmethod
+    def register(db: Session, content_hash: str, blob_name: str, size: int, content_type: Optional[str]) -> None:
+        """Records newly written content with a single reference."""
+        try:
+            db.add(StoredBlob(
+                content_hash=content_hash,
+                blob_name=blob_name,
+                file_size=size,
+                content_type=content_type,
+                ref_count=1
+            ))
+            db.commit()
+        except IntegrityError:
+            # Another upload of the same content registered it first
+            db.rollback()
+            ContentStore.add_reference(db, content_hash)
+
+    @staticmethod
+    def release(db: Session, content_hashes: List[Optional[str]]) -> List[str]:
+        """
+        Drops one reference per entry and returns the blobs that are no longer referenced.
+
+        The orphaned rows are deleted and stay locked until the caller commits, so the
+        caller should delete the returned blobs before committing.
+
+        Args:
+            db: Database session
+            content_hashes: Content hash of every released file (None entries are ignored)
+
+        Returns:
+            Names of blobs whose last reference is gone
+        """
+        counts = Counter(content_hash for content_hash in content_hashes if content_hash)
+        if not counts:
+            return []
+
+        for content_hash, count in counts.items():
+            db.query(StoredBlob).filter(
+                StoredBlob.content_hash == content_hash
+            ).update({StoredBlob.ref_count: StoredBlob.ref_count - count}, synchronize_session=False)
+
+        orphans = db.query(StoredBlob).filter(
+            StoredBlob.content_hash.in_(list(counts)),
+            StoredBlob.ref_count <= 0
+        ).with_for_update().all()
+        if not orphans:
+            return []
+
+        db.query(StoredBlob).filter(
+            StoredBlob.content_hash.in_([orphan.content_hash for orphan in orphans])
+        ).delete(synchronize_session=False)
+
+        return [orphan.blob_name for orphan in orphans]
+
+    def _forget(self, content_hashes: List[str]) -> None:
+        if self.file_context and content_hashes:
+            self.file_context.forget_content(content_hashes)
+
+    async def discard(self, db: Session, content_hashes: List[Optional[str]]) -> List[str]:
+        """
+        Releases references and deletes any blobs left unreferenced.
+
+        The whole transaction runs in one worker thread, so its locks are never held
+        across an await and no other coroutine can use the session meanwhile.
+        """
+        return await asyncio.to_thread(self._discard, db, content_hashes)
+
+    def _discard(self, db: Session, content_hashes: List[Optional[str]]) -> List[str]:
+        try:
+            orphaned_blobs = self.release(db, content_hashes)
+            if orphaned_blobs:
+                self.storage.delete_blobs(orphaned_blobs)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        orphaned = set(orphaned_blobs)
+        self._forget([
+            content_hash for content_hash in set(filter(None, content_hashes))
+            if self.storage.content_blob_name(content_hash) in orphaned
+        ])
+        return orphaned_blobs
+
+    def _metadata(self, content_hash: str, size: int, filename: str, content_type: Optional[str], deduplicated: bool) -> Dict[str, Any]:
+        """Builds upload metadata for a file stored under its content-addressed name."""
+        blob_name = self.storage.content_blob_name(content_hash)
+        return {
+            "file_id": str(uuid.uuid4()),
+            "bucket_name": self.storage.bucket_name,
+            "blob_name": blob_name,
+            "filename": filename,
+            "content_type": content_type,
+            "size": size,
+            "gs_uri": self.storage.file_uri(blob_name),
+            "sha256": content_hash,
+            "deduplicated": deduplicated
+        }
+
+    async def store_file(self, db: Session, file_obj: BinaryIO, filename: str, content_type: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Stores a seekable file, skipping the upload if identical content already exists.
+
+        Args:
+            db: Database session
+            file_obj: Seekable file-like object
+            filename: Original filename
+            content_type: MIME type of the file
+
+        Returns:
+            Dict with file metadata; "deduplicated" is True if the upload was skipped
+        """
+        hashed = await asyncio.to_thread(self.storage.hash_file, file_obj)
+        content_hash = hashed["sha256"]
+
+        deduplicated = self.add_reference(db, content_hash)
+        if not deduplicated:
+            await asyncio.to_thread(
+                self.storage.upload_file,
+                file_obj=file_obj,
+                filename=filename,
+                content_type=content_type,
+                blob_name=self.storage.content_blob_name(content_hash)
+            )
+            self.register(db, content_hash, self.storage.content_blob_name(content_hash), hashed["size"], content_type)
+
+        return self._metadata(content_hash, hashed["size"], filename, content_type, deduplicated)
+
+    async def store_stream(self, db: Session, chunks, filename: str, content_type: Optional[str] = None,
+                           declared_size: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Streams a file into a staging blob while hashing it, then keeps it only if the content is new.
+
+        Args:
+            db: Database session
+            chunks: Async iterator of byte chunks
+            filename: Original filename
+            content_type: MIME type of the file
+            declared_size: Size announced by the client
+
+        Returns:
+            Dict with file metadata; "deduplicated" is True if existing content was reused
+        """
+        staging_blob = f"incoming/{uuid.uuid4()}"
+        uploaded = await self.storage.upload_stream(
+            chunks,
+            filename=filename,
+            content_type=content_type,
+            declared_size=declared_size,
+            blob_name=staging_blob
+        )
+        content_hash = uploaded["sha256"]
+
+        deduplicated = self.add_reference(db, content_hash)
+        if deduplicated:
+            await asyncio.to_thread(self.storage.delete_blobs, [staging_blob])
+        else:
+            blob_name = self.storage.content_blob_name(content_hash)
+            await asyncio.to_thread(self.storage.rename_blob, staging_blob, blob_name)
+            self.register(db, content_hash, blob_name, uploaded["size"], content_type)
+
+        return self._metadata(content_hash, uploaded["size"], filename, content_type, deduplicated)
@@ -0,0 +1,252 @@
+# backend/app/services/conversation_memory_service.py
+import os
+import re
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.database import Conversation, ConversationTurn, SessionLocal
+from app.services.file_extraction import estimate_tokens
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+class ConversationMemoryService:
+    """
+    Session-scoped conversation memory for agents with memory_enabled.
+    
+    Only a window of recent turns is kept verbatim, bounded by MEMORY_TOKEN_BUDGET
+    and MEMORY_MAX_TURNS. Turns that fall out of the window are folded into a rolling
+    summary of at most MEMORY_SUMMARY_TOKENS and deleted, so both the stored rows and
+    the prompt added to each query stay the same size however long the conversation runs.
+    """
+    
+    def __init__(self):
+        self.token_budget = int(os.getenv("MEMORY_TOKEN_BUDGET", "2000"))
+        self.summary_tokens = int(os.getenv("MEMORY_SUMMARY_TOKENS", "400"))
+        self.max_turns = int(os.getenv("MEMORY_MAX_TURNS", "20"))
+        self.summarizer = os.getenv("MEMORY_SUMMARIZER", "extractive").lower()
+        self.summary_model = os.getenv("MEMORY_SUMMARY_MODEL", "gemini-1.5-flash")
+        self.ttl_hours = float(os.getenv("MEMORY_TTL_HOURS", "168"))
+        
+    @property
+    def window_tokens(self) -> int:
+        """Token budget left for verbatim turns once the summary has its share."""
+        return max(0, self.token_budget - self.summary_tokens)
+        
+    def load(self, db: Session, conversation_id: str) -> Dict[str, Any]:
+        """
+        Loads the memory of a conversation: its summary and the recent turns that fit the budget.
+        
+        Turns are read newest first with a LIMIT, so the cost does not grow with the
+        length of the conversation.
+        
+        Args:
+            db: Database session
+            conversation_id: Conversation ID
+            
+        Returns:
+            Summary, turns (oldest first) and their estimated token count
+        """
+        summary = db.query(Conversation.summary).filter(Conversation.id == conversation_id).scalar()
+        rows = db.query(
+            ConversationTurn.role, ConversationTurn.content, ConversationTurn.tokens
+        ).filter(
+            ConversationTurn.conversation_id == conversation_id
+        ).order_by(ConversationTurn.seq.desc()).limit(self.max_turns).all()
+        
+        turns, tokens = [], 0
+        for row in rows:
+            if tokens + row.tokens > self.window_tokens:
+                break
+            turns.append({"role": row.role, "content": row.content})
+            tokens += row.tokens
+        turns.reverse()
+        
+        return {
+            "conversation_id": conversation_id,
+            "summary": summary or "",
+            "turns": turns,
+            "tokens": tokens + (estimate_tokens(summary) if summary else 0)
+        }
+        
+    @staticmethod
+    def format_history(memory: Dict[str, Any]) -> str:
+        """Formats loaded memory as prompt text; empty if there is nothing to remember."""
+        parts = []
+        if memory.get("summary"):
+            parts.append(f"Summary of the earlier conversation:\n{memory['summary']}")
+        if memory.get("turns"):
+            parts.append("\n".join(
+                f"{'User' if turn['role'] == 'user' else 'Assistant'}: {turn['content']}"
+                for turn in memory["turns"]
+            ))
+        return "\n\n".join(parts)
+        
+    def append(self, db: Session, conversation_id: str, agent_id: Optional[str], query: str, response: str) -> Dict[str, int]:
+        """
+        Stores one exchange and compacts the conversation back within its budget.
+        
+        The conversation row is only locked while the turns are added. Turns that no longer
+        fit are summarized after that commit, since a model summary can take seconds, and
+        the summary is then applied only if no other append folded turns in the meantime;
+        otherwise the next append folds them.
+        
+        Args:
+            db: Database session
+            conversation_id: Conversation ID
+            agent_id: Agent that answered
+            query: The user's query, without any file context added to it
+            response: The agent's response
+            
+        Returns:
+            Counts of turns kept verbatim and turns folded into the summary
+        """
+        try:
+            conversation = db.query(Conversation).filter(Conversation.id == conversation_id).with_for_update().first()
+            if not conversation:
+                conversation = Conversation(id=conversation_id, turn_count=0, summarized_turns=0)
+                db.add(conversation)
+            conversation.agent_id = agent_id
+            conversation.updated_at = datetime.utcnow()
+            
+            for role, content in (("user", query), ("assistant", response)):
+                conversation.turn_count += 1
+                db.add(ConversationTurn(
+                    conversation_id=conversation_id,
+                    seq=conversation.turn_count,
+                    role=role,
+                    content=content,
+                    tokens=estimate_tokens(content)
+                ))
+            db.flush()
+            
+            # Compaction keeps this at most MEMORY_MAX_TURNS + 2 rows
+            turns = db.query(
+                ConversationTurn.id, ConversationTurn.role, ConversationTurn.content, ConversationTurn.tokens
+            ).filter(
+                ConversationTurn.conversation_id == conversation_id
+            ).order_by(ConversationTurn.seq).all()
+            summary = conversation.summary
+            summarized_turns = conversation.summarized_turns
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+            
+        total = sum(turn.tokens for turn in turns)
+        folded = []
+        while turns and (total > self.window_tokens or len(turns) > self.max_turns):
+            turn = turns.pop(0)
+            total -= turn.tokens
+            folded.append(turn)
+        if not folded:
+            return {"turns": len(turns), "summarized": 0}
+            
+        new_summary = self.summarize(summary, folded)
+        try:
+            applied = db.query(Conversation).filter(
+                Conversation.id == conversation_id,
+                Conversation.summarized_turns == summarized_turns
+            ).update({
+                Conversation.summary: new_summary,
+                Conversation.summarized_turns: summarized_turns + len(folded)
+            }, synchronize_session=False)
+            if applied:
+                db.query(ConversationTurn).filter(
+                    ConversationTurn.id.in_([turn.id for turn in folded])
+                ).delete(synchronize_session=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+            
+        if not applied:
+            return {"turns": len(turns) + len(folded), "summarized": 0}
+        return {"turns": len(turns), "summarized": len(folded)}
+        
+    def summarize(self, summary: Optional[str], turns: List[Any]) -> str:
+        """Folds turns into the rolling summary, keeping it within MEMORY_SUMMARY_TOKENS."""
+        if self.summarizer == "vertex":
+            try:
+                return self._summarize_with_model(summary, turns)
+            except Exception as e:
+                print(f"Error summarizing conversation, falling back to extractive summary: {str(e)}")
+        return self._summarize_extractive(summary, turns)
+        
+    def _summarize_extractive(self, summary: Optional[str], turns: List[Any]) -> str:
+        """Keeps the first sentence of each turn, dropping the oldest lines once over budget."""
+        lines = summary.splitlines() if summary else []
+        for turn in turns:
+            text = " ".join(turn.content.split())
+            sentence = _SENTENCE_END.split(text, maxsplit=1)[0][:300]
+            lines.append(f"- {'User' if turn.role == 'user' else 'Assistant'}: {sentence}")
+            
+        while len(lines) > 1 and estimate_tokens("\n".join(lines)) > self.summary_tokens:
+            lines.pop(0)
+        return "\n".join(lines)[:self.summary_tokens * 4]
+        
+    def _summarize_with_model(self, summary: Optional[str], turns: List[Any]) -> str:
+        """Asks a Gemini model to merge the turns into the summary."""
+        from vertexai.generative_models import GenerativeModel, GenerationConfig
+        
+        transcript = "\n".join(
+            f"{'User' if turn.role == 'user' else 'Assistant'}: {turn.content}" for turn in turns
+        )
+        prompt = (
+            "Update the summary of a conversation with the new messages below. Keep facts, names, "
+            "decisions and open questions; drop small talk. Reply with the summary only.\n\n"
+            f"Current summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"
+        )
+        result = GenerativeModel(self.summary_model).generate_content(
+            prompt,
+            generation_config=GenerationConfig(temperature=0.0, max_output_tokens=self.summary_tokens)
+        )
+        text = result.text.strip() if hasattr(result, "text") else ""
+        if not text:
+            raise ValueError("Empty summary")
+        return text[:self.summary_tokens * 4]
+        
+    def delete(self, db: Session, conversation_ids: List[str]) -> int:
+        """Deletes conversations and their turns; returns the number of conversations deleted."""
+        try:
+            db.query(ConversationTurn).filter(
+                ConversationTurn.conversation_id.in_(conversation_ids)
+            ).delete(synchronize_session=False)
+            deleted = db.query(Conversation).filter(
+                Conversation.id.in_(conversation_ids)
+            ).delete(synchronize_session=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        return deleted
+        
+    def collect(self, db: Session, ttl_hours: Optional[float] = None, batch_size: int = 500) -> Dict[str, Any]:
+        """Deletes conversations idle for longer than MEMORY_TTL_HOURS, in batches."""
+        ttl_hours = self.ttl_hours if ttl_hours is None else ttl_hours
+        cutoff = datetime.utcnow() - timedelta(hours=ttl_hours)
+        
+        report = {"cutoff": cutoff.isoformat(), "conversations": 0}
+        while True:
+            conversation_ids = [
+                conversation_id for (conversation_id,) in db.query(Conversation.id).filter(
+                    Conversation.updated_at < cutoff
+                ).limit(batch_size).all()
+            ]
+            if not conversation_ids:
+                break
+            report["conversations"] += self.delete(db, conversation_ids)
+        return report
+        
+    def run_scheduled(self) -> Dict[str, Any]:
+        """Runs a memory GC pass with its own session, for use by the scheduler."""
+        db = SessionLocal()
+        try:
+            report = self.collect(db)
+            print(f"Memory GC removed {report['conversations']} conversations")
+            return report
+        finally:
+            db.close()
+
+conversation_memory = ConversationMemoryService()
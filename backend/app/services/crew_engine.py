@@ -0,0 +1,271 @@
+# backend/app/services/crew_engine.py
+# Self-contained (vertexai imported lazily) so agent_runner.py can ship it alongside itself.
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# Tasks of a crew that may call the model at the same time
+MAX_CONCURRENCY = int(os.getenv("CREW_MAX_CONCURRENCY", "4"))
+
+# Upper bound on a single task's model call
+TASK_TIMEOUT_SECONDS = float(os.getenv("CREW_TASK_TIMEOUT_SECONDS", "120"))
+
+# Process types and how their tasks are ordered:
+#   sequential   - each task waits for the previous one and sees its output (CrewAI semantics)
+#   parallel     - tasks wait only for earlier tasks of the same agent and for their explicit context
+#   hierarchical - as parallel, then a manager turns the task outputs into the final answer
+PROCESS_TYPES = ("sequential", "parallel", "hierarchical")
+
+def plan_tasks(config: Dict[str, Any]) -> List[List[int]]:
+    """
+    Builds the dependency graph of a crew's tasks.
+    
+    Args:
+        config: CrewAIConfig dict with "processType", "agents" and "tasks"; a task may list
+            the indices of the tasks it needs in "context"
+            
+    Returns:
+        For each task, the indices of the tasks it depends on
+        
+    Raises:
+        ValueError: If the config is invalid or its dependencies form a cycle
+    """
+    process_type = config.get("processType", "sequential")
+    if process_type not in PROCESS_TYPES:
+        raise ValueError(f"Unknown processType: {process_type} (expected one of {', '.join(PROCESS_TYPES)})")
+        
+    agents = config.get("agents") or []
+    tasks = config.get("tasks") or []
+    if not tasks:
+        raise ValueError("The crew has no tasks")
+        
+    dependencies = []
+    last_task_of_agent: Dict[int, int] = {}
+    for index, task in enumerate(tasks):
+        agent_index = task.get("assigned_agent_index", 0)
+        if not isinstance(agent_index, int) or not 0 <= agent_index < len(agents):
+            raise ValueError(f"Task {index + 1} is assigned to unknown agent {agent_index}")
+            
+        depends_on = set()
+        for context_index in task.get("context") or []:
+            if not isinstance(context_index, int) or not 0 <= context_index < len(tasks) or context_index == index:
+                raise ValueError(f"Task {index + 1} has invalid context task {context_index}")
+            depends_on.add(context_index)
+            
+        if process_type == "sequential":
+            if index > 0:
+                depends_on.add(index - 1)
+        elif agent_index in last_task_of_agent:
+            # An agent works on one task at a time, in the order they were declared
+            depends_on.add(last_task_of_agent[agent_index])
+        last_task_of_agent[agent_index] = index
+        dependencies.append(sorted(depends_on))
+        
+    # Kahn's algorithm; anything left unvisited is on a cycle
+    remaining = [len(depends_on) for depends_on in dependencies]
+    dependents: List[List[int]] = [[] for _ in tasks]
+    for index, depends_on in enumerate(dependencies):
+        for dependency in depends_on:
+            dependents[dependency].append(index)
+    ready = [index for index, count in enumerate(remaining) if count == 0]
+    visited = 0
+    while ready:
+        index = ready.pop()
+        visited += 1
+        for dependent in dependents[index]:
+            remaining[dependent] -= 1
+            if remaining[dependent] == 0:
+                ready.append(dependent)
+    if visited < len(tasks):
+        cycle = [str(index + 1) for index, count in enumerate(remaining) if count > 0]
+        raise ValueError(f"Task context forms a cycle between tasks {', '.join(cycle)}")
+        
+    return dependencies
+
+def build_task_prompt(query: str, agent: Dict[str, Any], task: Dict[str, Any],
+                      context: List[Dict[str, Any]], system_instruction: Optional[str] = None) -> str:
+    """Builds the prompt for one task from its agent's persona, the outputs it depends on and the query."""
+    parts = []
+    if system_instruction:
+        parts.append(system_instruction)
+    parts.append(
+        f"You are {agent.get('role', 'an assistant')}.\n"
+        f"Your goal: {agent.get('goal', '')}\n"
+        f"Background: {agent.get('backstory', '')}"
+    )
+    parts.append(f"The user's request:\n{query}")
+    if context:
+        parts.append("Results of earlier tasks:\n" + "\n\n".join(
+            f"[Task {item['index'] + 1} - {item['agent']}]\n{item['output']}" for item in context
+        ))
+    parts.append(f"Your task:\n{task.get('description', '')}\n\nExpected output:\n{task.get('expected_output', '')}")
+    return "\n\n".join(parts)
+
+def critical_path_ms(dependencies: List[List[int]], durations: List[float]) -> float:
+    """Length of the longest chain of dependent tasks, using their measured durations."""
+    finish: Dict[int, float] = {}
+    
+    def finish_time(index: int) -> float:
+        # Dependencies may point forward through explicit context; plan_tasks rules out cycles
+        if index not in finish:
+            finish[index] = durations[index] + max(
+                (finish_time(dependency) for dependency in dependencies[index]), default=0.0
+            )
+        return finish[index]
+        
+    return max((finish_time(index) for index in range(len(dependencies))), default=0.0)
+
+class CrewEngine:
+    """
+    Runs a crew's tasks as a dependency graph, with independent tasks in parallel.
+    
+    Each task is one model call made with the assigned agent's persona and the outputs
+    of the tasks it depends on. At most max_concurrency calls are in flight, so a crew
+    finishes in about its critical-path time rather than the sum of its task times.
+    """
+    
+    def __init__(self, generate: Callable[[str], Awaitable[str]], max_concurrency: Optional[int] = None,
+                 task_timeout: Optional[float] = None):
+        self.generate = generate
+        self.max_concurrency = max(1, max_concurrency or MAX_CONCURRENCY)
+        self.task_timeout = task_timeout or TASK_TIMEOUT_SECONDS
+        
+    async def run(self, config: Dict[str, Any], query: str, system_instruction: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Runs a crew on a query.
+        
+        A failed task fails the tasks that depend on it; the others still run.
+        
+        Args:
+            config: CrewAIConfig dict
+            query: The user's request
+            system_instruction: Prepended to every task prompt
+            
+        Returns:
+            Final output, per-task results and timings, and the crew's wall-clock,
+            critical-path and summed task times. If the manager of a hierarchical crew
+            fails, the output falls back to the final task outputs and managerError is set.
+        """
+        dependencies = plan_tasks(config)
+        agents = config.get("agents") or []
+        tasks = config.get("tasks") or []
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        started = time.perf_counter()
+        
+        results: List[Dict[str, Any]] = [
+            {
+                "index": index,
+                "description": task.get("description", ""),
+                "agent": agents[task.get("assigned_agent_index", 0)].get("role", ""),
+                "dependsOn": dependencies[index],
+                "status": "pending",
+                "output": None,
+                "error": None,
+                "startedMs": None,
+                "durationMs": 0.0
+            }
+            for index, task in enumerate(tasks)
+        ]
+        done = [asyncio.Event() for _ in tasks]
+        
+        async def run_task(index: int) -> None:
+            result = results[index]
+            try:
+                for dependency in dependencies[index]:
+                    await done[dependency].wait()
+                failed = [dependency + 1 for dependency in dependencies[index] if results[dependency]["status"] != "completed"]
+                if failed:
+                    result["status"] = "skipped"
+                    result["error"] = f"Depends on failed task {', '.join(map(str, failed))}"
+                    return
+                    
+                prompt = build_task_prompt(
+                    query,
+                    agents[tasks[index].get("assigned_agent_index", 0)],
+                    tasks[index],
+                    [results[dependency] for dependency in dependencies[index]],
+                    system_instruction
+                )
+                async with semaphore:
+                    task_started = time.perf_counter()
+                    result["startedMs"] = (task_started - started) * 1000
+                    try:
+                        result["output"] = await asyncio.wait_for(self.generate(prompt), self.task_timeout)
+                        result["status"] = "completed"
+                    except asyncio.TimeoutError:
+                        result["status"] = "failed"
+                        result["error"] = f"Task timed out after {self.task_timeout:g} seconds"
+                    except Exception as e:
+                        result["status"] = "failed"
+                        result["error"] = str(e)
+                    result["durationMs"] = (time.perf_counter() - task_started) * 1000
+            finally:
+                done[index].set()
+                
+        await asyncio.gather(*(run_task(index) for index in range(len(tasks))))
+        
+        # The final answer comes from the tasks nothing else depends on
+        depended_on = {dependency for depends_on in dependencies for dependency in depends_on}
+        final_tasks = [result for result in results if result["index"] not in depended_on and result["status"] == "completed"]
+        if not final_tasks:
+            # The tasks the answer would come from failed; fall back to the last one that completed
+            final_tasks = [result for result in results if result["status"] == "completed"][-1:]
+        output = None
+        manager_ms = 0.0
+        manager_error = None
+        if config.get("processType") == "hierarchical" and any(result["status"] == "completed" for result in results):
+            manager_started = time.perf_counter()
+            try:
+                output = await asyncio.wait_for(self.generate(self._manager_prompt(query, results, system_instruction)), self.task_timeout)
+            except asyncio.TimeoutError:
+                manager_error = f"Manager timed out after {self.task_timeout:g} seconds"
+            except Exception as e:
+                manager_error = str(e)
+            manager_ms = (time.perf_counter() - manager_started) * 1000
+            
+        # Without a manager answer, the completed task outputs are the answer
+        if manager_error is not None or output is None:
+            if len(final_tasks) == 1:
+                output = final_tasks[0]["output"]
+            else:
+                output = "\n\n".join(f"## {result['agent']}\n{result['output']}" for result in final_tasks)
+            
+        return {
+            "output": output or "",
+            "processType": config.get("processType", "sequential"),
+            "tasks": results,
+            "managerMs": manager_ms,
+            "managerError": manager_error,
+            "durationMs": (time.perf_counter() - started) * 1000,
+            "criticalPathMs": critical_path_ms(dependencies, [result["durationMs"] for result in results]) + manager_ms,
+            "sumTaskMs": sum(result["durationMs"] for result in results) + manager_ms,
+            "maxConcurrency": self.max_concurrency
+        }
+        
+    @staticmethod
+    def _manager_prompt(query: str, results: List[Dict[str, Any]], system_instruction: Optional[str]) -> str:
+        reports = "\n\n".join(
+            f"[Task {result['index'] + 1} - {result['agent']}] {result['description']}\n"
+            f"{result['output'] if result['status'] == 'completed' else 'Not completed: ' + str(result['error'])}"
+            for result in results
+        )
+        return "\n\n".join(part for part in (
+            system_instruction,
+            "You are the manager of a team. Review your team's work and write the final answer to the user's request.",
+            f"The user's request:\n{query}",
+            f"Your team's results:\n{reports}"
+        ) if part)
+
+def vertex_generate(model_id: str, temperature: float, max_output_tokens: int) -> Callable[[str], Awaitable[str]]:
+    """Creates a generate function for CrewEngine that calls a Gemini model asynchronously."""
+    from vertexai.generative_models import GenerativeModel, GenerationConfig
+    
+    model = GenerativeModel(model_id)
+    generation_config = GenerationConfig(temperature=temperature, max_output_tokens=max_output_tokens)
+    
+    async def generate(prompt: str) -> str:
+        response = await model.generate_content_async(prompt, generation_config=generation_config)
+        return response.text if hasattr(response, "text") else ""
+        
+    return generate
@@ -1,28 +1,191 @@
 # backend/app/services/custom_tool_service.py
-import importlib.util
-import sys
+import asyncio
+import json
+import os
+import time
 import uuid
-import inspect
-from typing import Dict, Any, List, Callable, Optional
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
 from sqlalchemy.orm import Session
 
 from app.database import CustomTool
+from app.services.tool_metrics import tool_metrics
+from app.services.tool_sandbox import (
+    CompiledTool, ToolLimits, ToolSandboxError, ToolSandboxPool, analyze_tool_code,
+    build_bytecode, compile_tool_code, run_async_calls, run_blocking
+)
+
+class CompiledToolCache:
+    """Bounded LRU cache of compiled custom tools keyed by tool ID and last update time."""
+    
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[datetime, CompiledTool]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        
+    def get(self, tool_id: str, updated_at: datetime) -> Optional[CompiledTool]:
+        """Returns the compiled tool if it was compiled from the current version of the code."""
+        with self._lock:
+            entry = self._entries.get(tool_id)
+            if entry and entry[0] == updated_at:
+                self._entries.move_to_end(tool_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+            
+    def put(self, tool_id: str, updated_at: datetime, compiled: CompiledTool) -> None:
+        """Caches a compiled tool, replacing older versions and evicting the least recently used."""
+        with self._lock:
+            self._entries[tool_id] = (updated_at, compiled)
+            self._entries.move_to_end(tool_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                
+    def invalidate(self, tool_id: str) -> None:
+        """Drops a tool from the cache."""
+        with self._lock:
+            self._entries.pop(tool_id, None)
+            
+    def clear(self) -> None:
+        """Drops all cached tools."""
+        with self._lock:
+            self._entries.clear()
+            
+    def stats(self) -> Dict[str, Any]:
+        """Returns cache size and hit/miss counters."""
+        with self._lock:
+            return {"size": len(self._entries), "maxSize": self.max_size, "hits": self.hits, "misses": self.misses}
+
+class ToolResultCache:
+    """Bounded, TTL-evicting cache of pure tool results keyed by tool version and canonical parameters."""
+    
+    def __init__(self, max_size: int = 4096, ttl_seconds: float = 300.0):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, str, str], Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters: Dict[str, List[int]] = {}
+        
+    @staticmethod
+    def make_key(tool_id: str, version: Any, params: Dict[str, Any]) -> Optional[Tuple[str, str, str]]:
+        """Builds a cache key, or returns None if the parameters aren't JSON-serializable."""
+        try:
+            canonical = json.dumps(params, sort_keys=True, separators=(",", ":"), allow_nan=False)
+        except (TypeError, ValueError):
+            return None
+        return (tool_id, str(version), canonical)
+        
+    def get(self, key: Tuple[str, str, str]) -> Optional[str]:
+        """Returns a cached result that hasn't expired."""
+        now = time.monotonic()
+        with self._lock:
+            counters = self._counters.setdefault(key[0], [0, 0])
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                counters[0] += 1
+                return entry[1]
+            if entry:
+                del self._entries[key]
+            counters[1] += 1
+            return None
+            
+    def put(self, key: Tuple[str, str, str], result: str) -> None:
+        """Caches a result, evicting the least recently used entries over max_size."""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                
+    def invalidate(self, tool_id: str) -> int:
+        """Drops every cached result of a tool and returns how many were removed."""
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == tool_id]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+        
+    def clear(self) -> None:
+        """Drops all cached results and counters."""
+        with self._lock:
+            self._entries.clear()
+            self._counters.clear()
+            
+    def stats(self) -> Dict[str, Any]:
+        """Returns cache size and hit rates, overall and per tool."""
+        def rate(hits: int, misses: int) -> float:
+            return hits / (hits + misses) if hits + misses else 0.0
+            
+        with self._lock:
+            hits = sum(counters[0] for counters in self._counters.values())
+            misses = sum(counters[1] for counters in self._counters.values())
+            return {
+                "size": len(self._entries),
+                "maxSize": self.max_size,
+                "ttlSeconds": self.ttl_seconds,
+                "hits": hits,
+                "misses": misses,
+                "hitRate": rate(hits, misses),
+                "tools": {
+                    tool_id: {"hits": tool_hits, "misses": tool_misses, "hitRate": rate(tool_hits, tool_misses)}
+                    for tool_id, (tool_hits, tool_misses) in self._counters.items()
+                }
+            }
+
+compiled_tool_cache = CompiledToolCache(max_size=int(os.getenv("CUSTOM_TOOL_CACHE_SIZE", "256")))
+
+tool_result_cache = ToolResultCache(
+    max_size=int(os.getenv("TOOL_RESULT_CACHE_SIZE", "4096")),
+    ttl_seconds=float(os.getenv("TOOL_RESULT_CACHE_TTL_SECONDS", "300"))
+)
+
+# Custom tools run in worker processes ("process") unless TOOL_SANDBOX=inline or rlimits are unavailable
+TOOL_SANDBOX = os.getenv("TOOL_SANDBOX", "process").lower()
+tool_sandbox_pool = ToolSandboxPool(
+    workers=int(os.getenv("TOOL_SANDBOX_WORKERS", "4")),
+    limits=ToolLimits.from_env(),
+    cache_size=compiled_tool_cache.max_size
+)
+
+# Batch execution: parameter sets sent to a worker at a time, and the most accepted per request
+TOOL_BATCH_CHUNK_SIZE = int(os.getenv("TOOL_BATCH_CHUNK_SIZE", "50"))
+TOOL_BATCH_MAX_ITEMS = int(os.getenv("TOOL_BATCH_MAX_ITEMS", "10000"))
+
+def sandbox_enabled() -> bool:
+    """Returns True if custom tools are executed in the process pool."""
+    return TOOL_SANDBOX == "process" and ToolSandboxPool.supported()
 
 class CustomToolService:
     """Service for managing and executing custom tools."""
     
     @staticmethod
-    def create_tool(db: Session, name: str, description: str, code: str, user_id: Optional[str] = None) -> CustomTool:
-        """Creates a new custom tool."""
-        # Validate the tool code (check that it's a valid Python function)
-        CustomToolService._validate_tool_code(code)
+    def create_tool(db: Session, name: str, description: str, code: str, user_id: Optional[str] = None,
+                    is_pure: bool = False) -> CustomTool:
+        """
+        Creates a new custom tool.
+        
+        Tools created with is_pure=True have their results memoized, so they must
+        return the same result for the same parameters and have no side effects.
+        """
+        # Validate the tool code statically and store what execution needs
+        tool_id = str(uuid.uuid4())
+        signature = CustomToolService._validate_tool_code(code)
         
         # Create the tool
         tool = CustomTool(
-            id=str(uuid.uuid4()),
+            id=tool_id,
             name=name,
             description=description,
             code=code,
+            signature=signature,
+            bytecode=build_bytecode(tool_id, code),
+            is_pure=is_pure,
             user_id=user_id
         )
         
@@ -31,7 +194,7 @@ class CustomToolService:
         db.refresh(tool)
         
         return tool
-    
+        
     @staticmethod
     def list_tools(db: Session, user_id: Optional[str] = None) -> List[CustomTool]:
         """Lists all custom tools for a user."""
@@ -41,106 +204,281 @@ class CustomToolService:
             query = query.filter(CustomTool.user_id == user_id)
             
         return query.all()
-    
+        
     @staticmethod
     def get_tool(db: Session, tool_id: str) -> Optional[CustomTool]:
         """Gets a custom tool by ID."""
         return db.query(CustomTool).filter(CustomTool.id == tool_id).first()
-    
+        
     @staticmethod
-    def execute_tool(db: Session, tool_id: str, params: Dict[str, Any]) -> str:
-        """Executes a custom tool with parameters."""
-        tool = CustomToolService.get_tool(db, tool_id)
-        if not tool:
-            raise ValueError(f"Tool with ID {tool_id} not found")
+    def compile_tool(tool_id: str, code: str, signature: Optional[Dict[str, Any]] = None,
+                     bytecode: Optional[bytes] = None) -> CompiledTool:
+        """
+        Loads a tool's entry function without registering a module.
+        
+        Args:
+            tool_id: ID of the tool, used in tracebacks
+            code: Tool source code
+            signature: Signature stored with the tool; analyzed from the code if missing
+            bytecode: Bytecode stored with the tool; compiled from the code if missing or stale
             
-        # Create a module for the tool code
-        module_name = f"custom_tool_{tool_id}"
-        spec = importlib.util.spec_from_loader(module_name, loader=None)
-        module = importlib.util.module_from_spec(spec)
-        sys.modules[module_name] = module
-        
-        # Execute the tool code in a sandbox
-        restricted_globals = {
-            "__builtins__": {
-                # Allow only safe builtins
-                "abs": abs,
-                "all": all,
-                "any": any,
-                "bool": bool,
-                "dict": dict,
-                "enumerate": enumerate,
-                "filter": filter,
-                "float": float,
-                "int": int,
-                "isinstance": isinstance,
-                "len": len,
-                "list": list,
-                "map": map,
-                "max": max,
-                "min": min,
-                "range": range,
-                "round": round,
-                "set": set,
-                "sorted": sorted,
-                "str": str,
-                "sum": sum,
-                "tuple": tuple,
-                "zip": zip
-            }
-        }
+        Returns:
+            CompiledTool with the code object, entry function and its signature
+        """
+        return compile_tool_code(tool_id, code, signature, bytecode)
         
+    @staticmethod
+    def get_signature(tool: CustomTool) -> Dict[str, Any]:
+        """Returns a tool's stored signature, analyzing the code of tools saved without one."""
+        if tool.signature:
+            return tool.signature
         try:
-            # Execute the tool code to define the function
-            exec(tool.code, restricted_globals)
-            
-            # Find the function in the globals
-            function_name = None
-            for name, obj in restricted_globals.items():
-                if callable(obj) and name != "__builtins__":
-                    function_name = name
-                    break
-            
-            if not function_name:
-                raise ValueError("No function found in tool code")
-                
-            # Call the function with the parameters
-            function = restricted_globals[function_name]
-            signature = inspect.signature(function)
+            return analyze_tool_code(tool.code)
+        except ValueError:
+            return {"entry_point": None, "is_async": False, "parameters": [], "functions": []}
             
-            # Map parameters by name
-            valid_params = {}
-            for param_name in signature.parameters:
-                if param_name in params:
-                    valid_params[param_name] = params[param_name]
+    @staticmethod
+    def _load_artifact(db: Session, tool_id: str) -> Dict[str, Any]:
+        row = db.query(CustomTool.code, CustomTool.signature, CustomTool.bytecode).filter(CustomTool.id == tool_id).first()
+        return {"code": row.code, "signature": row.signature, "bytecode": row.bytecode}
+        
+    @staticmethod
+    def get_compiled_tool(db: Session, tool_id: str) -> Optional[CompiledTool]:
+        """Gets a tool's compiled entry function, compiling only when the tool is new or changed."""
+        # Only the version is fetched on the hot path; the code is loaded on a cache miss
+        row = db.query(CustomTool.updated_at).filter(CustomTool.id == tool_id).first()
+        if not row:
+            return None
+            
+        return CustomToolService._get_compiled(db, tool_id, row.updated_at)
+        
+    @staticmethod
+    def _get_compiled(db: Session, tool_id: str, updated_at: datetime) -> CompiledTool:
+        compiled = compiled_tool_cache.get(tool_id, updated_at)
+        if compiled is None:
+            tool = CustomToolService.get_tool(db, tool_id)
+            compiled = CustomToolService.compile_tool(tool_id, tool.code, tool.signature, tool.bytecode)
+            compiled_tool_cache.put(tool_id, tool.updated_at, compiled)
             
-            # Execute the function
-            result = function(**valid_params)
+        return compiled
+        
+    @staticmethod
+    def _get_version(db: Session, tool_id: str) -> Any:
+        row = db.query(CustomTool.updated_at, CustomTool.is_pure, CustomTool.name).filter(CustomTool.id == tool_id).first()
+        if not row:
+            raise ValueError(f"Tool with ID {tool_id} not found")
+        return row
+        
+    @staticmethod
+    def _record(tool_id: str, row: Any, duration_ms: float, ok: bool, value: str, cached: bool = False) -> None:
+        tool_metrics.record(
+            "custom", tool_id, row.name, duration_ms,
+            error=None if ok else value, output=value if ok else None, cached=cached
+        )
+        
+    @staticmethod
+    def _run_calls(db: Session, tool_id: str, updated_at: datetime, params_list: List[Dict[str, Any]],
+                   chunk_size: int = 1) -> List[Tuple[bool, str, float]]:
+        """Runs a tool once per parameter set, in the sandbox pool if enabled, returning (ok, value, duration_ms)."""
+        if sandbox_enabled():
+            # The code is only loaded when the chosen worker hasn't compiled this version yet
+            def load_artifact() -> Dict[str, Any]:
+                return CustomToolService._load_artifact(db, tool_id)
+                
+            if len(params_list) == 1:
+                started = time.perf_counter()
+                try:
+                    result = tool_sandbox_pool.run(tool_id, str(updated_at), load_artifact, params_list[0])
+                    return [(True, result, (time.perf_counter() - started) * 1000)]
+                except ToolSandboxError as e:
+                    return [(False, str(e), (time.perf_counter() - started) * 1000)]
+                    
+            return tool_sandbox_pool.run_batch(tool_id, str(updated_at), load_artifact, params_list, chunk_size)
             
-            return str(result)
+        try:
+            compiled = CustomToolService._get_compiled(db, tool_id, updated_at)
         except Exception as e:
-            return f"Error executing tool: {str(e)}"
-    
+            return [(False, str(e), 0.0)] * len(params_list)
+            
+        limits = tool_sandbox_pool.limits
+        if compiled.is_async:
+            # Called from sync code; run the calls concurrently on a private event loop
+            replies = run_blocking(run_async_calls(compiled, params_list, limits.timeout_seconds, limits.cpu_seconds, limits.memory_mb))
+            return [(status == "ok", value, duration_ms) for status, value, duration_ms in replies]
+            
+        outcomes = []
+        for params in params_list:
+            started = time.perf_counter()
+            try:
+                # Execute the function with the parameters it accepts
+                outcomes.append((True, str(compiled.call(params)), (time.perf_counter() - started) * 1000))
+            except Exception as e:
+                outcomes.append((False, str(e), (time.perf_counter() - started) * 1000))
+        return outcomes
+        
+    @staticmethod
+    def execute_tool(db: Session, tool_id: str, params: Dict[str, Any]) -> str:
+        """
+        Executes a custom tool with parameters.
+        
+        Runs in the sandbox process pool when it is enabled, so a tool that loops or
+        allocates without bound is stopped by its limits instead of taking the API down.
+        Results of pure tools are served from the result cache when possible.
+        This call blocks; use asyncio.to_thread from async code.
+        """
+        started = time.perf_counter()
+        row = CustomToolService._get_version(db, tool_id)
+        
+        cache_key = ToolResultCache.make_key(tool_id, row.updated_at, params) if row.is_pure else None
+        if cache_key:
+            cached = tool_result_cache.get(cache_key)
+            if cached is not None:
+                CustomToolService._record(tool_id, row, (time.perf_counter() - started) * 1000, True, cached, cached=True)
+                return cached
+                
+        ok, value, _ = CustomToolService._run_calls(db, tool_id, row.updated_at, [params])[0]
+        CustomToolService._record(tool_id, row, (time.perf_counter() - started) * 1000, ok, value)
+        if not ok:
+            return f"Error executing tool: {value}"
+            
+        if cache_key:
+            tool_result_cache.put(cache_key, value)
+        return value
+        
     @staticmethod
-    def _validate_tool_code(code: str) -> bool:
-        """Validates that the tool code defines a valid Python function."""
+    async def execute_tool_async(db: Session, tool_id: str, params: Dict[str, Any]) -> str:
+        """
+        Executes a custom tool without blocking the event loop.
+        
+        Inline, async tools are awaited on the running loop with TOOL_TIMEOUT_SECONDS and
+        sync tools run in a thread; in the sandbox the call is awaited from a thread.
+        Several calls can be awaited concurrently, e.g. with asyncio.gather.
+        """
+        started = time.perf_counter()
+        row = CustomToolService._get_version(db, tool_id)
+        
+        cache_key = ToolResultCache.make_key(tool_id, row.updated_at, params) if row.is_pure else None
+        if cache_key:
+            cached = tool_result_cache.get(cache_key)
+            if cached is not None:
+                CustomToolService._record(tool_id, row, (time.perf_counter() - started) * 1000, True, cached, cached=True)
+                return cached
+                
+        timeout_seconds = tool_sandbox_pool.limits.timeout_seconds
         try:
-            # Compile the code to check syntax
-            compile(code, "<string>", "exec")
+            if sandbox_enabled():
+                # Load the code here: the session must not be used from the pool's threads concurrently
+                artifact = CustomToolService._load_artifact(db, tool_id)
+                value = await tool_sandbox_pool.run_async(tool_id, str(row.updated_at), lambda: artifact, params)
+            else:
+                compiled = CustomToolService._get_compiled(db, tool_id, row.updated_at)
+                value = str(await compiled.call_async(params, timeout_seconds))
+            ok = True
+        except asyncio.TimeoutError:
+            ok, value = False, f"Timed out after {timeout_seconds}s"
+        except Exception as e:
+            ok, value = False, str(e)
             
-            # Check that the code defines a function
-            restricted_globals = {}
-            exec(code, restricted_globals)
+        CustomToolService._record(tool_id, row, (time.perf_counter() - started) * 1000, ok, value)
+        if not ok:
+            return f"Error executing tool: {value}"
             
-            has_function = False
-            for name, obj in restricted_globals.items():
-                if callable(obj) and name != "__builtins__":
-                    has_function = True
-                    break
+        if cache_key:
+            tool_result_cache.put(cache_key, value)
+        return value
+        
+    @staticmethod
+    def execute_batch(db: Session, tool_id: str, params_list: List[Dict[str, Any]],
+                      chunk_size: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Executes a custom tool once per parameter set, loading the tool only once.
+        
+        In the sandbox, chunks of chunk_size calls run in parallel across the pool's workers.
+        For pure tools, cached and repeated parameter sets are only computed once.
+        
+        Args:
+            db: Database session
+            tool_id: ID of the tool
+            params_list: Parameter sets, one per call
+            chunk_size: Override for TOOL_BATCH_CHUNK_SIZE
+            
+        Returns:
+            One {"index", "result", "error", "durationMs", "cached"} dict per parameter set, in order
+        """
+        row = CustomToolService._get_version(db, tool_id)
+        outcomes: List[Optional[Tuple[bool, str, float]]] = [None] * len(params_list)
+        cached = [False] * len(params_list)
+        
+        # Group the parameter sets that still need to run by cache key
+        pending: "OrderedDict[Any, List[int]]" = OrderedDict()
+        for index, params in enumerate(params_list):
+            cache_key = ToolResultCache.make_key(tool_id, row.updated_at, params) if row.is_pure else None
+            if cache_key:
+                result = tool_result_cache.get(cache_key)
+                if result is not None:
+                    outcomes[index] = (True, result, 0.0)
+                    cached[index] = True
+                    continue
+            pending.setdefault(cache_key or index, []).append(index)
             
-            if not has_function:
-                raise ValueError("Tool code must define at least one function")
+        if pending:
+            indices = list(pending.values())
+            results = CustomToolService._run_calls(
+                db, tool_id, row.updated_at, [params_list[group[0]] for group in indices],
+                chunk_size or TOOL_BATCH_CHUNK_SIZE
+            )
+            for cache_key, group, outcome in zip(pending, indices, results):
+                if outcome[0] and isinstance(cache_key, tuple):
+                    tool_result_cache.put(cache_key, outcome[1])
+                for position, index in enumerate(group):
+                    outcomes[index] = outcome
+                    cached[index] = position > 0
+                    
+        for index, (ok, value, duration_ms) in enumerate(outcomes):
+            CustomToolService._record(tool_id, row, duration_ms, ok, value, cached=cached[index])
+            
+        return [
+            {
+                "index": index,
+                "result": value if ok else None,
+                "error": None if ok else value,
+                "durationMs": duration_ms,
+                "cached": cached[index]
+            }
+            for index, (ok, value, duration_ms) in enumerate(outcomes)
+        ]
+        
+    @staticmethod
+    def input_params(parameters: Tuple[str, ...], args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Maps the input of an agent tool call to tool parameters.
+        
+        Agents pass a single string; a JSON object string is used as the parameters,
+        anything else becomes the value of the tool's first parameter.
+        """
+        params = dict(kwargs)
+        if not args:
+            return params
+            
+        value = args[0]
+        if isinstance(value, str):
+            try:
+                decoded = json.loads(value)
+            except ValueError:
+                decoded = None
+            if isinstance(decoded, dict):
+                value = decoded
                 
-            return True
-        except Exception as e:
+        if isinstance(value, dict):
+            params.update(value)
+        elif parameters:
+            params.setdefault(parameters[0], value)
+        return params
+        
+    @staticmethod
+    def _validate_tool_code(code: str) -> Dict[str, Any]:
+        """Validates the tool code without running it and returns its entry point's signature."""
+        try:
+            return analyze_tool_code(code)
+        except ValueError as e:
             raise ValueError(f"Invalid tool code: {str(e)}")
@@ -0,0 +1,29 @@
+# backend/app/services/custom_tool_wrappers.py
+from langchain_core.tools import Tool
+from sqlalchemy.orm import Session
+
+from app.database import CustomTool
+from app.services.custom_tool_service import CustomToolService
+
+def create_custom_tool(custom_tool: CustomTool, db: Session) -> Tool:
+    """
+    Wraps a custom tool as a LangChain tool with sync and async entry points.
+    
+    Agents run with ainvoke use the coroutine, so several tool calls in one step
+    (e.g. in a LangGraph ToolNode) run concurrently; pure tools are served from the result cache.
+    """
+    tool_id = custom_tool.id
+    parameters = tuple(parameter["name"] for parameter in CustomToolService.get_signature(custom_tool)["parameters"])
+    
+    def custom_tool_func(*args, **kwargs):
+        return CustomToolService.execute_tool(db, tool_id, CustomToolService.input_params(parameters, args, kwargs))
+        
+    async def custom_tool_coroutine(*args, **kwargs):
+        return await CustomToolService.execute_tool_async(db, tool_id, CustomToolService.input_params(parameters, args, kwargs))
+        
+    return Tool(
+        name=custom_tool.name,
+        description=custom_tool.description,
+        func=custom_tool_func,
+        coroutine=custom_tool_coroutine
+    )
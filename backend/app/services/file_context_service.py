@@ -0,0 +1,246 @@
+# backend/app/services/file_context_service.py
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.database import UploadedFile
+from app.services.storage_service import StorageService, storage_service
+from app.services.file_extraction import (
+    ChunkCache, chunk_text, estimate_tokens, extract_text, format_context, is_extractable, select_chunks
+)
+from app.services.file_parts import build_file_parts
+from app.services.vector_index import SessionVectorIndex, get_embedder
+
+class FileContextService:
+    """Service for turning uploaded files into prompt context for agent queries."""
+    
+    def __init__(self, storage_service: StorageService):
+        self.storage = storage_service
+        self.token_budget = int(os.getenv("FILE_CONTEXT_TOKEN_BUDGET", "4000"))
+        cache_dir = os.getenv("FILE_CHUNK_CACHE_DIR", os.path.join(os.getenv("UPLOAD_DIR", "uploads"), ".cache", "chunks"))
+        self.cache = ChunkCache(
+            max_entries=int(os.getenv("FILE_CHUNK_CACHE_SIZE", "256")),
+            cache_dir=cache_dir,
+            max_disk_entries=int(os.getenv("FILE_CHUNK_DISK_CACHE_SIZE", "4096"))
+        )
+        
+        # Retrieval index over chunk embeddings; TOP_K=0 falls back to lexical ranking
+        self.top_k = int(os.getenv("FILE_RETRIEVAL_TOP_K", "8"))
+        index_dir = os.getenv("VECTOR_INDEX_DIR", os.path.join(os.getenv("UPLOAD_DIR", "uploads"), ".index"))
+        self.index = SessionVectorIndex(get_embedder(), index_dir)
+        
+    @staticmethod
+    def resolve_files(db: Session, session_id: Optional[str], files: Optional[List[Dict[str, Any]]] = None) -> List[UploadedFile]:
+        """
+        Looks up the uploaded files referenced by a request, which must belong to its session.
+        
+        Args:
+            db: Database session
+            session_id: Upload session ID
+            files: File entries from the request (as returned by /files/upload); all session files if empty
+            
+        Returns:
+            Matching UploadedFile rows
+            
+        Raises:
+            ValueError: If files are referenced without a session or aren't in the session
+        """
+        file_ids = [file.get("file_id") for file in files or [] if isinstance(file, dict) and file.get("file_id")]
+        if not session_id:
+            if file_ids:
+                raise ValueError("sessionId is required to use uploaded files")
+            return []
+            
+        query = db.query(UploadedFile).filter(UploadedFile.session_id == session_id)
+        if file_ids:
+            query = query.filter(UploadedFile.id.in_(file_ids))
+            
+        uploaded_files = query.order_by(UploadedFile.created_at).all()
+        missing = set(file_ids) - {file.id for file in uploaded_files}
+        if missing:
+            raise ValueError(f"Files not found in session {session_id}: {', '.join(sorted(missing))}")
+        if uploaded_files:
+            FileContextService.touch_session(db, session_id)
+        return uploaded_files
+        
+    @staticmethod
+    def touch_session(db: Session, session_id: str) -> None:
+        """Records that a session's files are in use, so session GC counts its idle time from now."""
+        now = datetime.utcnow()
+        # Written at most once a minute per session to keep reads cheap
+        db.query(UploadedFile).filter(
+            UploadedFile.session_id == session_id,
+            or_(UploadedFile.last_used_at.is_(None), UploadedFile.last_used_at < now - timedelta(minutes=1))
+        ).update({UploadedFile.last_used_at: now}, synchronize_session=False)
+        db.commit()
+        
+    def get_chunks(self, file: UploadedFile) -> List[str]:
+        """
+        Gets the text chunks of a file, extracting them only on a cache miss.
+        
+        The blob is streamed from storage and extracted incrementally, so the
+        file is never fully loaded into memory.
+        """
+        cache_key = file.content_hash or file.file_path
+        chunks = self.cache.get(cache_key)
+        if chunks is not None:
+            return chunks
+            
+        if not is_extractable(file.file_type):
+            chunks = []
+        else:
+            with self.storage.open_blob(file.stored_filename) as blob_reader:
+                chunks = list(chunk_text(extract_text(blob_reader, file.file_type)))
+                
+        self.cache.put(cache_key, chunks)
+        return chunks
+        
+    def _collect_chunks(self, files: List[UploadedFile]) -> List[Dict[str, Any]]:
+        """Gets the chunks of every file, skipping files that can't be extracted."""
+        candidates = []
+        for file in files:
+            try:
+                chunks = self.get_chunks(file)
+            except Exception as e:
+                print(f"Error extracting text from {file.original_filename}: {str(e)}")
+                continue
+                
+            for index, text in enumerate(chunks):
+                candidates.append({
+                    "file_id": file.id,
+                    "filename": file.original_filename,
+                    "index": index,
+                    "text": text
+                })
+                
+        return candidates
+        
+    def retrieve(self, files: List[UploadedFile], query: str, top_k: int) -> List[Dict[str, Any]]:
+        """
+        Finds the chunks most similar to the query using each session's vector index.
+        
+        Args:
+            files: Uploaded files to search
+            query: User query
+            top_k: Maximum number of chunks to return
+            
+        Returns:
+            Chunk dicts with a similarity "score", best match first
+        """
+        files_by_session: Dict[str, List[UploadedFile]] = {}
+        for file in files:
+            files_by_session.setdefault(file.session_id, []).append(file)
+            
+        by_id = {file.id: file for file in files}
+        matches = []
+        for session_id, session_files in files_by_session.items():
+            index = self.index.build(session_id, [
+                {
+                    "file_id": file.id,
+                    "key": file.content_hash or file.file_path,
+                    "chunks": lambda file=file: self.get_chunks(file)
+                }
+                for file in session_files
+            ])
+            matches.extend(self.index.search(index, [query], top_k, [file.id for file in session_files])[0])
+            
+        matches.sort(key=lambda match: -match["score"])
+        
+        results = []
+        for match in matches[:top_k]:
+            file = by_id[match["file_id"]]
+            chunks = self.get_chunks(file)
+            if match["index"] >= len(chunks):
+                continue
+            results.append({
+                "file_id": file.id,
+                "filename": file.original_filename,
+                "index": match["index"],
+                "score": match["score"],
+                "text": chunks[match["index"]]
+            })
+            
+        return results
+        
+    def build_context(self, files: List[UploadedFile], query: str, token_budget: Optional[int] = None,
+                      top_k: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Builds a prompt context from the chunks most relevant to the query.
+        
+        Args:
+            files: Uploaded files to draw from
+            query: User query used to rank chunks
+            token_budget: Maximum estimated tokens of file content to include
+            top_k: Number of chunks to retrieve from the vector index (0 ranks chunks lexically)
+            
+        Returns:
+            Dict with the formatted "context" and the selected "chunks" metadata
+        """
+        token_budget = token_budget or self.token_budget
+        top_k = self.top_k if top_k is None else top_k
+        
+        if top_k > 0:
+            try:
+                ranked = self.retrieve(files, query, top_k)
+            except Exception as e:
+                print(f"Error searching vector index: {str(e)}")
+                ranked = None
+        else:
+            ranked = None
+            
+        if ranked is None:
+            selected = select_chunks(query, self._collect_chunks(files), token_budget)
+        else:
+            # Keep the best matches that fit the budget, then restore document order
+            selected = []
+            used = 0
+            for chunk in ranked:
+                tokens = estimate_tokens(chunk["text"])
+                if used + tokens > token_budget:
+                    continue
+                selected.append(chunk)
+                used += tokens
+            file_order = {file.id: position for position, file in enumerate(files)}
+            selected.sort(key=lambda chunk: (file_order[chunk["file_id"]], chunk["index"]))
+            
+        return {
+            "context": format_context(selected),
+            "chunks": [
+                {key: chunk[key] for key in ("file_id", "filename", "index", "score") if key in chunk}
+                for chunk in selected
+            ]
+        }
+        
+    def build_parts(self, files: List[UploadedFile]) -> Tuple[List[Any], Dict[str, Any]]:
+        """
+        Builds model parts for media files, referencing them by URI where possible.
+        
+        Returns:
+            (parts, stats) as returned by build_file_parts
+        """
+        def read_bytes(file: Dict[str, Any]) -> bytes:
+            with self.storage.open_blob(file["blob_name"]) as blob_reader:
+                return blob_reader.read()
+                
+        return build_file_parts([
+            {
+                "gs_uri": file.file_path,
+                "blob_name": file.stored_filename,
+                "content_type": file.file_type,
+                "size": file.file_size
+            }
+            for file in files
+        ], read_bytes)
+        
+    def drop_session(self, session_id: str) -> None:
+        """Removes the vector index of a deleted session."""
+        self.index.drop(session_id)
+        
+    def forget_content(self, cache_keys: List[str]) -> None:
+        """Drops the cached chunks of deleted blobs (keyed by content hash, or file URI for unhashed files)."""
+        self.cache.discard(cache_keys)
+
+# Extracted text chunks of uploaded files, cached by content hash
+file_context_service = FileContextService(storage_service)
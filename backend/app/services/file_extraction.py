@@ -0,0 +1,252 @@
+# backend/app/services/file_extraction.py
+# Self-contained (standard library only, pypdf optional) so agent_runner.py can ship it alongside itself.
+import codecs
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional
+
+# Chunking defaults, in characters
+CHUNK_CHARS = int(os.getenv("FILE_CHUNK_CHARS", "2000"))
+CHUNK_OVERLAP = int(os.getenv("FILE_CHUNK_OVERLAP", "200"))
+
+# Bytes read from storage per iteration
+READ_SIZE = 64 * 1024
+
+TEXT_TYPES = ("text/", "application/json", "application/xml", "application/x-yaml", "application/javascript")
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+def is_extractable(content_type: Optional[str]) -> bool:
+    """Returns True if text can be extracted from the given MIME type."""
+    mime_type = (content_type or "").split(";")[0].strip().lower()
+    return mime_type.startswith(TEXT_TYPES) or mime_type.endswith("+json") or mime_type == "application/pdf"
+
+def extract_text(file_obj: BinaryIO, content_type: Optional[str]) -> Iterator[str]:
+    """
+    Incrementally extracts text from a file-like object.
+
+    Text and JSON are decoded as they are read; PDFs are extracted page by page.
+
+    Args:
+        file_obj: Readable (and, for PDFs, seekable) file-like object
+        content_type: MIME type of the file
+
+    Yields:
+        Successive pieces of text
+    """
+    mime_type = (content_type or "").split(";")[0].strip().lower()
+
+    if mime_type == "application/pdf":
+        try:
+            from pypdf import PdfReader
+        except ImportError:
+            raise RuntimeError("PDF extraction requires the 'pypdf' package")
+
+        reader = PdfReader(file_obj)
+        for page in reader.pages:
+            text = page.extract_text() or ""
+            if text:
+                yield text + "\n"
+        return
+
+    if not is_extractable(mime_type):
+        return
+
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    for data in iter(lambda: file_obj.read(READ_SIZE), b""):
+        text = decoder.decode(data)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+def chunk_text(pieces: Iterable[str], chunk_chars: int = CHUNK_CHARS, overlap: int = CHUNK_OVERLAP) -> Iterator[str]:
+    """
+    Splits streamed text into overlapping chunks, preferring whitespace boundaries.
+
+    Only about one chunk of text is held in memory at a time.
+
+    Args:
+        pieces: Iterable of text pieces (e.g. from extract_text)
+        chunk_chars: Target chunk size in characters
+        overlap: Characters repeated at the start of the next chunk
+
+    Yields:
+        Text chunks
+    """
+    # Keep the overlap small enough that every chunk advances through the text
+    overlap = min(overlap, chunk_chars // 4)
+    buffer = ""
+    for piece in pieces:
+        buffer += piece
+        while len(buffer) >= chunk_chars:
+            cut = buffer.rfind(" ", chunk_chars // 2, chunk_chars)
+            if cut == -1:
+                cut = chunk_chars
+            chunk = buffer[:cut].strip()
+            if chunk:
+                yield chunk
+            buffer = buffer[max(cut - overlap, 0):]
+    if buffer.strip():
+        yield buffer.strip()
+
+def estimate_tokens(text: str) -> int:
+    """Roughly estimates the token count of a text (about four characters per token)."""
+    return max(1, len(text) // 4)
+
+def _terms(text: str) -> List[str]:
+    return _WORD_PATTERN.findall(text.lower())
+
+def select_chunks(query: str, chunks: List[Dict[str, Any]], token_budget: int) -> List[Dict[str, Any]]:
+    """
+    Picks the chunks most relevant to a query that fit within a token budget.
+
+    Relevance is the number of query-term occurrences in the chunk; ties keep document order.
+
+    Args:
+        query: User query
+        chunks: Dicts with at least a "text" key
+        token_budget: Maximum estimated tokens across the selected chunks
+
+    Returns:
+        Selected chunks, in their original order
+    """
+    query_terms = set(_terms(query))
+
+    scored = []
+    for position, chunk in enumerate(chunks):
+        counts = Counter(_terms(chunk["text"]))
+        score = sum(counts[term] for term in query_terms)
+        scored.append((-score, position, chunk))
+    scored.sort(key=lambda item: (item[0], item[1]))
+
+    selected = []
+    used = 0
+    for _, position, chunk in scored:
+        tokens = estimate_tokens(chunk["text"])
+        if used + tokens > token_budget:
+            continue
+        selected.append((position, chunk))
+        used += tokens
+
+    return [chunk for _, chunk in sorted(selected, key=lambda item: item[0])]
+
+def format_context(chunks: List[Dict[str, Any]]) -> str:
+    """Formats selected chunks into a context block for the model prompt."""
+    if not chunks:
+        return ""
+
+    sections = [
+        f"[{chunk.get('filename', 'file')} - part {chunk.get('index', 0) + 1}]\n{chunk['text']}"
+        for chunk in chunks
+    ]
+    return "Relevant content from the uploaded files:\n\n" + "\n\n".join(sections) + "\n\n"
+
+class ChunkCache:
+    """
+    LRU cache of extracted chunks keyed by content hash, optionally persisted to disk.
+
+    The disk copy holds at most max_disk_entries files; the least recently used ones
+    are pruned every tenth of that many writes.
+    """
+
+    def __init__(self, max_entries: int = 256, cache_dir: Optional[str] = None, max_disk_entries: int = 4096):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.max_disk_entries = max_disk_entries
+        self._entries: "OrderedDict[str, List[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_prune = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._prune_disk()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha256(key.encode()).hexdigest() + ".json")
+
+    def get(self, key: str) -> Optional[List[str]]:
+        """Returns cached chunks for a key, loading them from disk if needed."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        if not self.cache_dir or not os.path.exists(self._path(key)):
+            return None
+
+        try:
+            with open(self._path(key)) as f:
+                chunks = json.load(f)
+            # The modification time orders the disk entries for pruning
+            os.utime(self._path(key))
+        except Exception as e:
+            print(f"Error reading chunk cache for {key}: {str(e)}")
+            return None
+
+        self._remember(key, chunks)
+        return chunks
+
+    def put(self, key: str, chunks: List[str]) -> None:
+        """Caches chunks for a key in memory and, if configured, on disk."""
+        self._remember(key, chunks)
+
+        if self.cache_dir:
+            partial_path = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.part"
+            with open(partial_path, "w") as f:
+                json.dump(chunks, f)
+            os.replace(partial_path, self._path(key))
+
+            with self._lock:
+                self._writes_since_prune += 1
+                prune = self._writes_since_prune >= max(1, self.max_disk_entries // 10)
+                if prune:
+                    self._writes_since_prune = 0
+            if prune:
+                self._prune_disk()
+
+    def discard(self, keys: Iterable[str]) -> None:
+        """Removes entries from memory and disk, e.g. once the blob they were extracted from is deleted."""
+        for key in keys:
+            with self._lock:
+                self._entries.pop(key, None)
+            if self.cache_dir:
+                try:
+                    os.remove(self._path(key))
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f"Error removing chunk cache for {key}: {str(e)}")
+
+    def _prune_disk(self) -> None:
+        """Deletes the least recently used disk entries beyond max_disk_entries."""
+        try:
+            entries = []
+            with os.scandir(self.cache_dir) as scan:
+                for entry in scan:
+                    if entry.name.endswith(".json"):
+                        try:
+                            entries.append((entry.stat().st_mtime, entry.path))
+                        except FileNotFoundError:
+                            continue
+            if len(entries) <= self.max_disk_entries:
+                return
+            entries.sort()
+            for _, path in entries[:len(entries) - self.max_disk_entries]:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        except OSError as e:
+            print(f"Error pruning chunk cache: {str(e)}")
+
+    def _remember(self, key: str, chunks: List[str]) -> None:
+        with self._lock:
+            self._entries[key] = chunks
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -0,0 +1,73 @@
+# backend/app/services/file_parts.py
+# Self-contained (vertexai imported lazily) so agent_runner.py can ship it alongside itself.
+import json
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Files at or below this size are inlined instead of referenced by URI (0 disables inlining)
+INLINE_MAX_BYTES = int(os.getenv("FILE_INLINE_MAX_BYTES", "0"))
+
+# Gemini rejects requests with more inline data than this
+INLINE_REQUEST_LIMIT = 20 * 1024 * 1024
+
+# Types the model reads natively and that aren't already turned into text context
+PART_TYPES = ("image/", "audio/", "video/")
+
+def is_part_type(content_type: Optional[str]) -> bool:
+    """Returns True if a file of this MIME type should be attached as a model part."""
+    mime_type = (content_type or "").split(";")[0].strip().lower()
+    return mime_type.startswith(PART_TYPES)
+
+def _inline_size(size: int) -> int:
+    """Size of a file once base64-encoded into a request."""
+    return 4 * ((size + 2) // 3)
+
+def build_file_parts(files: List[Dict[str, Any]], read_bytes: Callable[[Dict[str, Any]], bytes],
+                     inline_max_bytes: Optional[int] = None) -> Tuple[List[Any], Dict[str, Any]]:
+    """
+    Builds model parts for uploaded files, referencing gs:// objects by URI.
+
+    Files stored in GCS are passed with Part.from_uri so their bytes never go through
+    this process; files at or below inline_max_bytes, and files that only exist locally,
+    are inlined with Part.from_data.
+
+    Args:
+        files: Dicts with "gs_uri", "content_type" and "size"
+        read_bytes: Reads a file's content, used only for inlined files
+        inline_max_bytes: Override for FILE_INLINE_MAX_BYTES
+
+    Returns:
+        (parts, stats) where stats compares the request payload with fully inlined files
+    """
+    from vertexai.generative_models import Part
+
+    inline_max_bytes = INLINE_MAX_BYTES if inline_max_bytes is None else inline_max_bytes
+    parts = []
+    stats = {"uriParts": 0, "inlineParts": 0, "skipped": 0, "payloadBytes": 0, "inlinePayloadBytes": 0}
+    inlined = 0
+
+    for file in files:
+        content_type = file.get("content_type")
+        uri = file.get("gs_uri") or ""
+        if not is_part_type(content_type) or not uri:
+            continue
+
+        size = int(file.get("size") or 0)
+        stats["inlinePayloadBytes"] += _inline_size(size)
+
+        if uri.startswith("gs://") and size > inline_max_bytes:
+            part = Part.from_uri(uri, mime_type=content_type)
+            stats["uriParts"] += 1
+        elif inlined + size <= INLINE_REQUEST_LIMIT:
+            part = Part.from_data(read_bytes(file), mime_type=content_type)
+            inlined += size
+            stats["inlineParts"] += 1
+        else:
+            print(f"Skipping {uri}: too large to inline")
+            stats["skipped"] += 1
+            continue
+
+        parts.append(part)
+        stats["payloadBytes"] += len(json.dumps(part.to_dict()))
+
+    return parts, stats
@@ -2,10 +2,11 @@ from typing import Dict, List, Any, Optional
 from langchain_google_vertexai import ChatVertexAI
 from langchain_core.tools import Tool
 from langchain.agents import AgentExecutor, create_react_agent
-from langchain.memory import ConversationBufferMemory
 from langchain_core.prompts import PromptTemplate
-from app.services.tool_registry import ToolRegistry
+from sqlalchemy.orm import Session
 from app.services.custom_tool_service import CustomToolService
+from app.services.custom_tool_wrappers import create_custom_tool
+from app.services.tool_metrics import tool_metrics
 
 class LangChainService:
     def __init__(self):
@@ -19,60 +20,80 @@ class LangChainService:
             max_tokens=max_tokens
         )
     
-    def create_tools(self, tool_definitions: List[Dict[str, Any]]) -> List[Tool]:
-        """Creates LangChain tools from definitions."""
+    def create_tools(self, tool_definitions: List[Dict[str, Any]], db: Optional[Session] = None) -> List[Tool]:
+        """
+        Creates LangChain tools from definitions.
+        
+        CUSTOM tools run their saved code through CustomToolService, which compiles them
+        once and records their metrics; other tools get a mock response for now.
+        """
         tools = []
         for tool_def in tool_definitions:
+            if tool_def.get("type") == "CUSTOM" and db is not None:
+                custom_tool = CustomToolService.get_tool(db, tool_def.get("id"))
+                if custom_tool:
+                    tools.append(create_custom_tool(custom_tool, db))
+                continue
+                
             # Simple tool creation for now - will expand in later phases
             tool = Tool(
                 name=tool_def.get("name", ""),
                 description=tool_def.get("description", ""),
-                func=lambda x, tool_def=tool_def: f"Mock response for {tool_def.get('name')}: {x}"
+                func=tool_metrics.instrument(
+                    tool_def.get("name", ""),
+                    lambda x, tool_def=tool_def: f"Mock response for {tool_def.get('name')}: {x}"
+                )
             )
             tools.append(tool)
         return tools
     
-    def run_agent_with_tools(
+    async def run_agent_with_tools(
         self, 
         query: str, 
         model_id: str,
         temperature: float, 
         max_tokens: int,
         system_instruction: str,
-        tools: List[Dict[str, Any]]
+        tools: List[Dict[str, Any]],
+        chat_history: str = "",
+        db: Optional[Session] = None
     ) -> Dict[str, Any]:
-        """Runs a LangChain agent with the given tools."""
+        """
+        Runs a LangChain agent with the given tools.
+        
+        chat_history is the agent's bounded conversation memory (see
+        ConversationMemoryService); it is passed in rather than accumulated here.
+        db is needed to load CUSTOM tools. The agent runs with ainvoke, so custom tools
+        are awaited through their coroutines and a slow tool doesn't block the event loop.
+        """
         # Create model
         llm = self.create_chat_model(model_id, temperature, max_tokens)
         
         # Create tools
-        tool_objects = self.create_tools(tools)
+        tool_objects = self.create_tools(tools, db)
         
         # Create agent with proper system instruction formatting
         prompt = PromptTemplate.from_template(
             system_instruction + "\n\n{chat_history}\n\nHuman: {input}\nAI:"
         )
         
-        memory = ConversationBufferMemory(memory_key="chat_history")
-        
         # Create agent
         agent = create_react_agent(llm, tool_objects, prompt)
         agent_executor = AgentExecutor(
             agent=agent,
             tools=tool_objects,
-            memory=memory,
             verbose=True
         )
         
         # Run agent
         try:
-            result = agent_executor.invoke({"input": query})
+            result = await agent_executor.ainvoke({"input": query, "chat_history": chat_history})
             return {
                 "output": result.get("output", ""),
                 "messages": [{"content": result.get("output", "")}],
                 "actions": [
-                    {"name": action.get("tool"), "output": action.get("tool_output")}
-                    for action in result.get("intermediate_steps", [])
+                    {"name": action.tool, "output": str(observation)}
+                    for action, observation in result.get("intermediate_steps", [])
                 ]
             }
         except Exception as e:
@@ -81,39 +102,3 @@ class LangChainService:
                 "output": f"Error: {str(e)}",
                 "messages": [{"content": f"Error: {str(e)}"}]
             }
-
-def create_tools(self, tool_definitions: List[Dict[str, Any]], db: Session) -> List[Tool]:
-    """Creates LangChain tools from definitions, including custom tools."""
-    tools = []
-    
-    for tool_def in tool_definitions:
-        tool_id = tool_def.get("id")
-        tool_name = tool_def.get("name")
-        tool_type = tool_def.get("type", "PREDEFINED")
-        
-        if tool_type == "CUSTOM":
-            # Handle custom tool
-            custom_tool = CustomToolService.get_tool(db, tool_id)
-            if custom_tool:
-                # Create a function that calls the custom tool executor
-                def custom_tool_func(*args, tool_id=tool_id, **kwargs):
-                    return CustomToolService.execute_tool(db, tool_id, kwargs)
-                
-                tool = Tool(
-                    name=custom_tool.name,
-                    description=custom_tool.description,
-                    func=custom_tool_func
-                )
-                tools.append(tool)
-        else:
-            # Handle predefined tool
-            registered_tool = ToolRegistry.get_tool(tool_name)
-            if registered_tool:
-                tool = Tool(
-                    name=tool_name,
-                    description=registered_tool["description"],
-                    func=registered_tool["function"]
-                )
-                tools.append(tool)
-    
-    return tools
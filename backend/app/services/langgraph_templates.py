@@ -0,0 +1,316 @@
+# backend/app/services/langgraph_templates.py
+import asyncio
+import contextvars
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import END, MessagesState, StateGraph
+
+# Model, tools and system instruction of the request running a graph. Graphs are
+# compiled once and shared, so per-agent objects are looked up here rather than
+# baked into the graph; node tasks inherit the caller's context.
+_runtime: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar(
+    "langgraph_runtime", default=None
+)
+
+# Specialized instructions of the branching graph, keyed by query type
+BRANCH_INSTRUCTIONS = {
+    "factual": "Answer factually and concisely. Say so if you are unsure.",
+    "creative": "Answer creatively, with original ideas and vivid language.",
+    "analytical": "Reason step by step, compare options and justify your conclusion."
+}
+
+class AgentState(MessagesState):
+    route: str
+
+class LRUMemorySaver(MemorySaver):
+    """In-memory checkpointer that keeps the most recently used threads and evicts the rest."""
+    
+    def __init__(self, max_threads: int):
+        super().__init__()
+        self.max_threads = max_threads
+        self._threads: "OrderedDict[str, None]" = OrderedDict()
+        self._lru_lock = threading.Lock()
+        
+    def _touch(self, config: Dict[str, Any]) -> None:
+        thread_id = config.get("configurable", {}).get("thread_id")
+        if thread_id is None:
+            return
+        evicted = []
+        with self._lru_lock:
+            self._threads[thread_id] = None
+            self._threads.move_to_end(thread_id)
+            while len(self._threads) > self.max_threads:
+                evicted.append(self._threads.popitem(last=False)[0])
+        for evicted_id in evicted:
+            self.delete_thread(evicted_id)
+            
+    # The async methods of MemorySaver delegate to these
+    def get_tuple(self, config):
+        self._touch(config)
+        return super().get_tuple(config)
+        
+    def put(self, config, checkpoint, metadata, new_versions):
+        self._touch(config)
+        return super().put(config, checkpoint, metadata, new_versions)
+        
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lru_lock:
+            self._threads.pop(thread_id, None)
+        super().delete_thread(thread_id)
+        
+    def thread_count(self) -> int:
+        with self._lru_lock:
+            return len(self._threads)
+
+def create_checkpointer(kind: str) -> Any:
+    """
+    Creates the checkpointer selected by LANGGRAPH_CHECKPOINTER ("memory", "sqlite" or "none").
+    
+    Must be called from the event loop when kind is "sqlite".
+    """
+    if kind == "none":
+        return None
+    if kind == "memory":
+        return LRUMemorySaver(int(os.getenv("LANGGRAPH_CHECKPOINT_MAX_THREADS", "1000")))
+    if kind == "sqlite":
+        try:
+            import aiosqlite
+            from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+        except ImportError:
+            raise ValueError("LANGGRAPH_CHECKPOINTER=sqlite requires the langgraph-checkpoint-sqlite package")
+        path = os.getenv(
+            "LANGGRAPH_CHECKPOINT_PATH",
+            os.path.join(os.getenv("UPLOAD_DIR", "uploads"), ".checkpoints", "langgraph.sqlite")
+        )
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        return AsyncSqliteSaver(aiosqlite.connect(path))
+    raise ValueError(f"Unknown LANGGRAPH_CHECKPOINTER: {kind}")
+
+def _recent_messages(messages: List[Any], limit: int) -> List[Any]:
+    """Returns the last messages of a thread, starting at a human message so no tool result is orphaned."""
+    recent = messages[-limit:] if limit > 0 else list(messages)
+    for index, message in enumerate(recent):
+        if isinstance(message, HumanMessage):
+            return recent[index:]
+    return recent
+
+async def _call_model(state: AgentState, instruction: str = "", use_tools: bool = True) -> Dict[str, Any]:
+    runtime = _runtime.get()
+    model = runtime["model"]
+    if use_tools and runtime["tools"]:
+        model = model.bind_tools(runtime["tools"])
+        
+    messages = _recent_messages(state["messages"], runtime["history_messages"])
+    system = "\n\n".join(part for part in (runtime["system_instruction"], instruction) if part)
+    if system:
+        messages = [SystemMessage(system), *messages]
+    return {"messages": [await model.ainvoke(messages)]}
+
+async def _call_tools(state: AgentState) -> Dict[str, Any]:
+    """Runs every tool call of the last model message concurrently."""
+    tools = {tool.name: tool for tool in _runtime.get()["tools"]}
+    
+    async def call(tool_call: Dict[str, Any]) -> ToolMessage:
+        tool = tools.get(tool_call["name"])
+        try:
+            if tool is None:
+                raise ValueError(f"Unknown tool: {tool_call['name']}")
+            content = str(await tool.ainvoke(tool_call["args"]))
+        except Exception as e:
+            content = f"Error: {str(e)}"
+        return ToolMessage(content=content, name=tool_call["name"], tool_call_id=tool_call["id"])
+        
+    return {"messages": list(await asyncio.gather(*(call(tool_call) for tool_call in state["messages"][-1].tool_calls)))}
+
+def _has_tool_calls(state: AgentState) -> bool:
+    last_message = state["messages"][-1]
+    return bool(getattr(last_message, "tool_calls", None))
+
+async def _agent(state: AgentState) -> Dict[str, Any]:
+    return await _call_model(state)
+
+async def _respond(state: AgentState) -> Dict[str, Any]:
+    return await _call_model(state, use_tools=False)
+
+async def _classify(state: AgentState) -> Dict[str, Any]:
+    """Routes the latest query to one of the branches with a one-word model call."""
+    runtime = _runtime.get()
+    query = next((message.content for message in reversed(state["messages"]) if isinstance(message, HumanMessage)), "")
+    reply = await runtime["model"].ainvoke([HumanMessage(
+        f"Classify this request as one of: {', '.join(BRANCH_INSTRUCTIONS)}. "
+        f"Reply with the single word only.\n\nRequest: {query}"
+    )])
+    words = str(reply.content).strip().lower().split()
+    route = words[0].strip(".,:;\"'") if words else ""
+    return {"route": route if route in BRANCH_INSTRUCTIONS else "factual"}
+
+def _branch_node(route: str):
+    async def node(state: AgentState) -> Dict[str, Any]:
+        return await _call_model(state, instruction=BRANCH_INSTRUCTIONS[route])
+    return node
+
+def build_sequential() -> StateGraph:
+    """agent -> tools (if called) -> respond: one round of tool calls, then a final answer."""
+    builder = StateGraph(AgentState)
+    builder.add_node("agent", _agent)
+    builder.add_node("tools", _call_tools)
+    builder.add_node("respond", _respond)
+    builder.set_entry_point("agent")
+    builder.add_conditional_edges("agent", lambda state: "tools" if _has_tool_calls(state) else END)
+    builder.add_edge("tools", "respond")
+    builder.add_edge("respond", END)
+    return builder
+
+def build_conditional() -> StateGraph:
+    """agent <-> tools until the model stops calling tools (bounded by the recursion limit)."""
+    builder = StateGraph(AgentState)
+    builder.add_node("agent", _agent)
+    builder.add_node("tools", _call_tools)
+    builder.set_entry_point("agent")
+    builder.add_conditional_edges("agent", lambda state: "tools" if _has_tool_calls(state) else END)
+    builder.add_edge("tools", "agent")
+    return builder
+
+def build_branching() -> StateGraph:
+    """classify -> factual | creative | analytical, each looping with the tools until done."""
+    builder = StateGraph(AgentState)
+    builder.add_node("classify", _classify)
+    builder.add_node("tools", _call_tools)
+    builder.set_entry_point("classify")
+    for route in BRANCH_INSTRUCTIONS:
+        builder.add_node(route, _branch_node(route))
+        builder.add_conditional_edges(route, lambda state: "tools" if _has_tool_calls(state) else END)
+    builder.add_conditional_edges("classify", lambda state: state["route"])
+    builder.add_conditional_edges("tools", lambda state: state["route"])
+    return builder
+
+GRAPH_BUILDERS = {
+    "sequential": build_sequential,
+    "conditional": build_conditional,
+    "branching": build_branching
+}
+
+class GraphTemplates:
+    """
+    Library of LangGraph graphs, one per graphType, compiled once and shared by all agents.
+    
+    Thread state is saved by the configured checkpointer, so a follow-up message on
+    the same thread resumes the graph instead of replaying the conversation.
+    """
+    
+    # Thread namespace of playground agents that aren't saved
+    ADHOC_OWNER = "adhoc"
+    
+    def __init__(self):
+        self.checkpointer_kind = os.getenv("LANGGRAPH_CHECKPOINTER", "memory").lower()
+        self.history_messages = int(os.getenv("LANGGRAPH_HISTORY_MESSAGES", "20"))
+        self.recursion_limit = int(os.getenv("LANGGRAPH_RECURSION_LIMIT", "12"))
+        self.checkpointer = None
+        self._graphs: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        
+    @property
+    def checkpointing(self) -> bool:
+        return self.checkpointer_kind != "none"
+        
+    @staticmethod
+    def thread_id(agent_id: str, graph_type: str, conversation_id: str) -> str:
+        """Checkpoint thread of a conversation, separate per agent and graph type so they never replay each other's state."""
+        return f"{agent_id}:{graph_type}:{conversation_id}"
+        
+    async def delete_threads(self, agent_id: str, conversation_id: str) -> None:
+        """Deletes an agent's checkpointed threads of a conversation, for every graph type."""
+        if self.checkpointer is None:
+            return
+        for graph_type in GRAPH_BUILDERS:
+            await self.checkpointer.adelete_thread(self.thread_id(agent_id, graph_type, conversation_id))
+        
+    def get(self, graph_type: str) -> Any:
+        """Returns the compiled graph of a graphType, compiling it on first use."""
+        graph = self._graphs.get(graph_type)
+        if graph is not None:
+            return graph
+        if graph_type not in GRAPH_BUILDERS:
+            raise ValueError(f"Unknown graphType: {graph_type} (expected one of {', '.join(GRAPH_BUILDERS)})")
+            
+        with self._lock:
+            if graph_type not in self._graphs:
+                if self.checkpointer is None and self.checkpointing:
+                    self.checkpointer = create_checkpointer(self.checkpointer_kind)
+                self._graphs[graph_type] = GRAPH_BUILDERS[graph_type]().compile(checkpointer=self.checkpointer)
+            return self._graphs[graph_type]
+            
+    async def run(self, graph_type: str, query: str, model: Any, tools: List[Any],
+                  system_instruction: Optional[str] = None, thread_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Runs one turn of a graph.
+        
+        Args:
+            graph_type: Key of GRAPH_BUILDERS
+            query: The user's message
+            model: Chat model for the agent nodes
+            tools: LangChain tools the model may call
+            system_instruction: The agent's system instruction
+            thread_id: Thread to resume or start; the turn is not saved if None
+            
+        Returns:
+            Output, the messages added in this turn and the tool calls made
+        """
+        graph = self.get(graph_type)
+        message = HumanMessage(query, id=str(uuid.uuid4()))
+        # A checkpointed graph needs a thread; a one-off turn gets a throwaway one
+        transient = not thread_id
+        config = {
+            "configurable": {"thread_id": thread_id or str(uuid.uuid4())},
+            "recursion_limit": self.recursion_limit
+        }
+        
+        token = _runtime.set({
+            "model": model,
+            "tools": tools,
+            "system_instruction": system_instruction or "",
+            "history_messages": self.history_messages
+        })
+        try:
+            result = await graph.ainvoke({"messages": [message]}, config)
+        finally:
+            _runtime.reset(token)
+            if transient and self.checkpointer is not None:
+                await self.checkpointer.adelete_thread(config["configurable"]["thread_id"])
+                
+        # Only report what this turn added to the thread
+        messages = result["messages"]
+        start = next((index for index, item in enumerate(messages) if item.id == message.id), 0)
+        turn_messages = messages[start + 1:]
+        
+        final = next((item for item in reversed(turn_messages) if isinstance(item, AIMessage)), None)
+        return {
+            "output": final.content if final else "",
+            "messages": [{"content": item.content} for item in turn_messages],
+            "actions": [
+                {"name": item.name, "output": item.content}
+                for item in turn_messages if isinstance(item, ToolMessage)
+            ],
+            "route": result.get("route")
+        }
+        
+    async def close(self) -> None:
+        """Closes the checkpointer's database connection, if it has one."""
+        connection = getattr(self.checkpointer, "conn", None)
+        if connection is not None:
+            await connection.close()
+            
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "compiled": sorted(self._graphs),
+            "checkpointer": self.checkpointer_kind,
+            "threads": self.checkpointer.thread_count() if isinstance(self.checkpointer, LRUMemorySaver) else None
+        }
+
+graph_templates = GraphTemplates()
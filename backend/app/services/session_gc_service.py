@@ -0,0 +1,181 @@
+# backend/app/services/session_gc_service.py
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal, UploadedFile, UploadIntent
+from app.services.content_store import ContentStore
+from app.services.file_context_service import FileContextService
+from app.services.storage_service import StorageService
+
+class SessionGCService:
+    """Service for deleting upload sessions, including abandoned ones past their TTL."""
+    
+    def __init__(self, storage_service: StorageService, content_store: ContentStore,
+                 file_context_service: Optional[FileContextService] = None):
+        self.storage = storage_service
+        self.content_store = content_store
+        self.file_context = file_context_service
+        self.ttl_hours = float(os.getenv("SESSION_TTL_HOURS", "24"))
+        self.batch_size = int(os.getenv("SESSION_GC_BATCH_SIZE", "50"))
+        self.pause_seconds = float(os.getenv("SESSION_GC_PAUSE_SECONDS", "0.5"))
+        
+    def delete_sessions(self, db: Session, session_ids: List[str], cutoff: Optional[datetime] = None) -> Dict[str, int]:
+        """
+        Deletes the files, pending uploads and blobs of several sessions in one transaction.
+        
+        Shared content-addressed blobs are only deleted once their last reference is gone.
+        
+        Args:
+            db: Database session
+            session_ids: Sessions to delete
+            cutoff: When set, only rows idle since before it are deleted, so a file uploaded
+                or used after the sessions were found idle survives
+            
+        Returns:
+            Counts of deleted files, blobs and reclaimed storage bytes
+        """
+        try:
+            # The selected rows are locked and deleted by ID, so they are exactly the rows released below
+            file_query = db.query(
+                UploadedFile.id, UploadedFile.content_hash, UploadedFile.stored_filename,
+                UploadedFile.file_path, UploadedFile.file_size
+            ).filter(UploadedFile.session_id.in_(session_ids))
+            intent_query = db.query(
+                UploadIntent.id, UploadIntent.blob_name, UploadIntent.expected_size, UploadIntent.status
+            ).filter(UploadIntent.session_id.in_(session_ids))
+            if cutoff is not None:
+                file_query = file_query.filter(func.coalesce(UploadedFile.last_used_at, UploadedFile.created_at) < cutoff)
+                intent_query = intent_query.filter(UploadIntent.created_at < cutoff)
+            files = file_query.with_for_update().all()
+            intents = intent_query.with_for_update().all()
+            
+            if not files and not intents:
+                db.rollback()
+                return {"files": 0, "blobs": 0, "bytes": 0}
+                
+            # Release shared content and collect blobs owned by these sessions alone
+            blob_sizes = {}
+            for blob_name in self.content_store.release(db, [file.content_hash for file in files]):
+                blob_sizes[blob_name] = 0
+            for file in files:
+                if not file.content_hash or file.stored_filename in blob_sizes:
+                    blob_sizes[file.stored_filename] = file.file_size or 0
+                    
+            # Uploads that were announced but never completed may have left objects behind
+            for intent in intents:
+                if intent.status == "PENDING":
+                    blob_sizes.setdefault(intent.blob_name, intent.expected_size or 0)
+                
+            deleted_blobs = self.storage.delete_blobs(list(blob_sizes)) if blob_sizes else []
+            
+            # Delete records from database in single statements
+            if files:
+                db.query(UploadedFile).filter(
+                    UploadedFile.id.in_([file.id for file in files])
+                ).delete(synchronize_session=False)
+            if intents:
+                db.query(UploadIntent).filter(
+                    UploadIntent.id.in_([intent.id for intent in intents])
+                ).delete(synchronize_session=False)
+            
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+            
+        if self.file_context:
+            for session_id in session_ids:
+                self.file_context.drop_session(session_id)
+            # Extracted text must not outlive the blobs it came from
+            self.file_context.forget_content(list({
+                file.content_hash or file.file_path for file in files if file.stored_filename in blob_sizes
+            }))
+                
+        return {
+            "files": len(files),
+            "blobs": len(deleted_blobs),
+            "bytes": sum(blob_sizes[blob_name] for blob_name in deleted_blobs)
+        }
+        
+    def find_idle_sessions(self, db: Session, cutoff: datetime, limit: int) -> List[str]:
+        """Returns sessions whose files were last uploaded or used, and whose intents were created, before the cutoff."""
+        last_upload = db.query(
+            UploadedFile.session_id.label("session_id"),
+            func.max(func.coalesce(UploadedFile.last_used_at, UploadedFile.created_at)).label("last_activity")
+        ).group_by(UploadedFile.session_id)
+        last_intent = db.query(
+            UploadIntent.session_id.label("session_id"),
+            func.max(UploadIntent.created_at).label("last_activity")
+        ).group_by(UploadIntent.session_id)
+        activity = last_upload.union_all(last_intent).subquery()
+        
+        return [
+            session_id for (session_id,) in db.query(activity.c.session_id).group_by(
+                activity.c.session_id
+            ).having(func.max(activity.c.last_activity) < cutoff).limit(limit).all()
+        ]
+        
+    def collect(self, db: Session, ttl_hours: Optional[float] = None, max_batches: int = 1000,
+                pause_seconds: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Deletes sessions that have been idle for longer than the TTL.
+        
+        Works in batches of SESSION_GC_BATCH_SIZE sessions, pausing between
+        batches so storage and database load stays low.
+        
+        Args:
+            db: Database session
+            ttl_hours: Override for the configured TTL
+            max_batches: Upper bound on batches processed in this run
+            pause_seconds: Override for the pause between batches
+            
+        Returns:
+            Report of deleted sessions, files, blobs and reclaimed bytes
+        """
+        ttl_hours = self.ttl_hours if ttl_hours is None else ttl_hours
+        pause_seconds = self.pause_seconds if pause_seconds is None else pause_seconds
+        cutoff = datetime.utcnow() - timedelta(hours=ttl_hours)
+        started = time.monotonic()
+        
+        report = {
+            "cutoff": cutoff.isoformat(),
+            "sessions": 0,
+            "files": 0,
+            "blobs": 0,
+            "reclaimed_bytes": 0,
+            "batches": 0
+        }
+        
+        while report["batches"] < max_batches:
+            session_ids = self.find_idle_sessions(db, cutoff, self.batch_size)
+            if not session_ids:
+                break
+                
+            deleted = self.delete_sessions(db, session_ids, cutoff)
+            report["sessions"] += len(session_ids)
+            report["files"] += deleted["files"]
+            report["blobs"] += deleted["blobs"]
+            report["reclaimed_bytes"] += deleted["bytes"]
+            report["batches"] += 1
+            print(f"Session GC batch {report['batches']}: {report['sessions']} sessions, {report['reclaimed_bytes']} bytes reclaimed so far")
+            
+            if pause_seconds:
+                time.sleep(pause_seconds)
+                
+        report["duration_ms"] = (time.monotonic() - started) * 1000
+        return report
+        
+    def run_scheduled(self) -> Dict[str, Any]:
+        """Runs a GC pass with its own session, for use by the scheduler."""
+        db = SessionLocal()
+        try:
+            report = self.collect(db)
+            print(f"Session GC removed {report['sessions']} sessions, {report['files']} files, {report['reclaimed_bytes']} bytes")
+            return report
+        finally:
+            db.close()
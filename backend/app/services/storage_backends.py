@@ -0,0 +1,358 @@
+# backend/app/services/storage_backends.py
+import os
+import hmac
+import time
+import asyncio
+import hashlib
+import secrets
+import shutil
+import httpx
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional, List, BinaryIO
+from urllib.parse import quote, urlencode
+
+class GCSResumableUploadStream:
+    """Streams bytes into a GCS resumable upload session with a bounded buffer."""
+    
+    # Non-final chunks must be a multiple of 256 KiB
+    CHUNK_SIZE = 8 * 256 * 1024
+    
+    def __init__(self, session_url: str, chunk_size: int = CHUNK_SIZE):
+        self.session_url = session_url
+        self.chunk_size = chunk_size
+        self.buffer = bytearray()
+        self.offset = 0
+        self.client = httpx.AsyncClient(timeout=60.0)
+        
+    async def write(self, data: bytes) -> None:
+        """Buffers data and sends every full chunk to the session."""
+        self.buffer += data
+        while len(self.buffer) >= self.chunk_size:
+            chunk = bytes(self.buffer[:self.chunk_size])
+            del self.buffer[:self.chunk_size]
+            await self._send(chunk, final=False)
+            
+    async def _send(self, chunk: bytes, final: bool) -> None:
+        """Uploads one chunk; the final chunk declares the total size."""
+        total = str(self.offset + len(chunk)) if final else "*"
+        if chunk:
+            content_range = f"bytes {self.offset}-{self.offset + len(chunk) - 1}/{total}"
+        else:
+            content_range = f"bytes */{total}"
+            
+        response = await self.client.put(self.session_url, content=chunk, headers={"Content-Range": content_range})
+        
+        expected = (200, 201) if final else (308,)
+        if response.status_code not in expected:
+            raise RuntimeError(f"Resumable upload failed with status {response.status_code}: {response.text}")
+            
+        self.offset += len(chunk)
+        
+    async def close(self) -> int:
+        """Sends the remaining bytes, finalizes the object and returns its size."""
+        try:
+            await self._send(bytes(self.buffer), final=True)
+            self.buffer = bytearray()
+            return self.offset
+        finally:
+            await self.client.aclose()
+            
+    async def abort(self) -> None:
+        """Cancels the session so no object is created."""
+        try:
+            await self.client.delete(self.session_url)
+        except Exception as e:
+            print(f"Error cancelling resumable upload: {str(e)}")
+        finally:
+            await self.client.aclose()
+
+class LocalUploadStream:
+    """Writes an upload to a temporary file that is renamed into place on close."""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.partial_path = f"{path}.part"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.file = open(self.partial_path, "wb")
+        self.size = 0
+        
+    async def write(self, data: bytes) -> None:
+        """Appends data to the partial file from a worker thread, so slow disks don't block the event loop."""
+        await asyncio.to_thread(self.file.write, data)
+        self.size += len(data)
+        
+    async def close(self) -> int:
+        """Moves the partial file into place and returns its size."""
+        await asyncio.to_thread(self._finish)
+        return self.size
+        
+    async def abort(self) -> None:
+        """Discards the partial file."""
+        await asyncio.to_thread(self._discard)
+        
+    def _finish(self) -> None:
+        self.file.close()
+        os.replace(self.partial_path, self.path)
+        
+    def _discard(self) -> None:
+        self.file.close()
+        if os.path.exists(self.partial_path):
+            os.remove(self.partial_path)
+
+class StorageBackend(ABC):
+    """Interface implemented by the blob stores behind StorageService."""
+    
+    @abstractmethod
+    def file_uri(self, blob_name: str) -> str:
+        """Returns the URI recorded for a blob."""
+        
+    @abstractmethod
+    def upload_file(self, file_obj: BinaryIO, blob_name: str, content_type: Optional[str] = None) -> Optional[str]:
+        """Stores a file-like object; returns a public URL if the backend has one."""
+        
+    @abstractmethod
+    async def open_upload_stream(self, blob_name: str, content_type: Optional[str] = None) -> Any:
+        """Returns a stream with async write(), close() and abort() methods."""
+        
+    @abstractmethod
+    def open_blob(self, blob_name: str) -> BinaryIO:
+        """Opens a blob for streaming reads."""
+        
+    @abstractmethod
+    def rename_blob(self, blob_name: str, new_name: str) -> None:
+        """Moves a blob, replacing any blob with the new name."""
+        
+    @abstractmethod
+    def list_blobs(self, prefix: str) -> List[str]:
+        """Lists the names of blobs under a prefix."""
+        
+    @abstractmethod
+    def delete_blobs(self, blob_names: List[str]) -> List[str]:
+        """Deletes blobs, ignoring missing ones; returns the deleted names."""
+        
+    @abstractmethod
+    def get_blob_size(self, blob_name: str) -> Optional[int]:
+        """Returns the size of a blob in bytes, or None if it doesn't exist."""
+        
+    @abstractmethod
+    def generate_signed_url(self, blob_name: str, expiration_minutes: int = 15) -> str:
+        """Returns a URL granting temporary read access to a blob."""
+        
+    @abstractmethod
+    def create_upload_url(self, blob_name: str, content_type: Optional[str], size: int,
+                          expiration_minutes: int, origin: Optional[str] = None) -> Dict[str, Any]:
+        """Returns the URL, method and headers a browser uses to upload a blob directly."""
+
+class GCSStorageBackend(StorageBackend):
+    """Blob store backed by a Google Cloud Storage bucket."""
+    
+    # Maximum number of requests per GCS batch call
+    BATCH_DELETE_SIZE = 100
+    
+    def __init__(self, bucket_name: str):
+        from google.cloud import storage
+        
+        self.client = storage.Client()
+        self.bucket_name = bucket_name
+        self._bucket = None
+        
+    @property
+    def bucket(self):
+        """The configured bucket, created on first use if it doesn't exist."""
+        if self._bucket is None:
+            try:
+                # Check if bucket exists
+                self._bucket = self.client.get_bucket(self.bucket_name)
+            except Exception:
+                # Create bucket if it doesn't exist
+                self._bucket = self.client.create_bucket(self.bucket_name)
+        return self._bucket
+        
+    def file_uri(self, blob_name: str) -> str:
+        return f"gs://{self.bucket_name}/{blob_name}"
+        
+    def upload_file(self, file_obj: BinaryIO, blob_name: str, content_type: Optional[str] = None) -> Optional[str]:
+        blob = self.bucket.blob(blob_name)
+        blob.upload_from_file(file_obj, content_type=content_type, rewind=True)
+        return blob.public_url if hasattr(blob, 'public_url') else None
+        
+    async def open_upload_stream(self, blob_name: str, content_type: Optional[str] = None) -> GCSResumableUploadStream:
+        blob = self.bucket.blob(blob_name)
+        session_url = await asyncio.to_thread(blob.create_resumable_upload_session, content_type=content_type)
+        return GCSResumableUploadStream(session_url)
+        
+    def open_blob(self, blob_name: str) -> BinaryIO:
+        return self.bucket.blob(blob_name).open("rb", chunk_size=1024 * 1024)
+        
+    def rename_blob(self, blob_name: str, new_name: str) -> None:
+        self.bucket.rename_blob(self.bucket.blob(blob_name), new_name)
+        
+    def list_blobs(self, prefix: str) -> List[str]:
+        return [blob.name for blob in self.bucket.list_blobs(prefix=prefix)]
+        
+    def delete_blobs(self, blob_names: List[str]) -> List[str]:
+        deleted_blobs = []
+        
+        # Send deletes through the GCS batch API, one HTTP round-trip per chunk
+        for start in range(0, len(blob_names), self.BATCH_DELETE_SIZE):
+            chunk = blob_names[start:start + self.BATCH_DELETE_SIZE]
+            try:
+                with self.client.batch(raise_exception=False):
+                    for blob_name in chunk:
+                        self.bucket.delete_blob(blob_name)
+                deleted_blobs.extend(chunk)
+            except Exception as batch_error:
+                print(f"Batch delete failed, deleting individually: {str(batch_error)}")
+                for blob_name in chunk:
+                    try:
+                        self.bucket.delete_blob(blob_name)
+                        deleted_blobs.append(blob_name)
+                    except Exception as e:
+                        print(f"Error deleting blob {blob_name}: {str(e)}")
+                        
+        return deleted_blobs
+        
+    def get_blob_size(self, blob_name: str) -> Optional[int]:
+        blob = self.bucket.get_blob(blob_name)
+        return blob.size if blob else None
+        
+    def generate_signed_url(self, blob_name: str, expiration_minutes: int = 15) -> str:
+        blob = self.bucket.blob(blob_name)
+        return blob.generate_signed_url(
+            version="v4",
+            expiration=expiration_minutes * 60,  # Convert to seconds
+            method="GET"
+        )
+        
+    def create_upload_url(self, blob_name: str, content_type: Optional[str], size: int,
+                          expiration_minutes: int, origin: Optional[str] = None) -> Dict[str, Any]:
+        # A resumable session fixes the object's type and size; the origin enables CORS for the browser
+        blob = self.bucket.blob(blob_name)
+        session_url = blob.create_resumable_upload_session(content_type=content_type, size=size, origin=origin)
+        return {"url": session_url, "method": "PUT", "headers": {"Content-Type": content_type or "application/octet-stream"}}
+
+class LocalStorageBackend(StorageBackend):
+    """
+    Blob store on the local filesystem, for single-node, on-prem and dev deployments.
+    
+    Blobs are served by the API from HMAC-signed URLs instead of a public mount.
+    """
+    
+    def __init__(self, root_dir: str, url_prefix: str, signing_key: Optional[str] = None):
+        self.root_dir = os.path.abspath(root_dir)
+        self.url_prefix = url_prefix.rstrip("/")
+        if not signing_key or signing_key == "change-me":
+            # URLs signed with a random key only work on this process until it restarts.
+            # The placeholder from older .env.example files is public, so it is never used.
+            print("LOCAL_STORAGE_SIGNING_KEY is not set; using a random key for signed URLs")
+            signing_key = secrets.token_hex(32)
+        self.signing_key = signing_key.encode()
+        os.makedirs(self.root_dir, exist_ok=True)
+        
+    def path(self, blob_name: str) -> str:
+        """Maps a blob name to its path under the root directory."""
+        path = os.path.abspath(os.path.join(self.root_dir, blob_name))
+        if not path.startswith(self.root_dir + os.sep):
+            raise ValueError(f"Invalid blob name: {blob_name}")
+        return path
+        
+    def file_uri(self, blob_name: str) -> str:
+        return f"file://{self.path(blob_name)}"
+        
+    def upload_file(self, file_obj: BinaryIO, blob_name: str, content_type: Optional[str] = None) -> Optional[str]:
+        path = self.path(blob_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        file_obj.seek(0)
+        partial_path = f"{path}.part"
+        with open(partial_path, "wb") as out:
+            shutil.copyfileobj(file_obj, out)
+        os.replace(partial_path, path)
+        return None
+        
+    async def open_upload_stream(self, blob_name: str, content_type: Optional[str] = None) -> LocalUploadStream:
+        return await asyncio.to_thread(LocalUploadStream, self.path(blob_name))
+        
+    def open_blob(self, blob_name: str) -> BinaryIO:
+        return open(self.path(blob_name), "rb")
+        
+    def rename_blob(self, blob_name: str, new_name: str) -> None:
+        target = self.path(new_name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(self.path(blob_name), target)
+        self._prune(os.path.dirname(self.path(blob_name)))
+        
+    def list_blobs(self, prefix: str) -> List[str]:
+        # Prefixes are directory-aligned in this app ("<session_id>/", "cas/", ...)
+        directory = self.path(prefix.rstrip("/"))
+        if not os.path.isdir(directory):
+            return []
+            
+        blob_names = []
+        for dirpath, _, filenames in os.walk(directory):
+            for filename in filenames:
+                if not filename.endswith(".part"):
+                    blob_names.append(os.path.relpath(os.path.join(dirpath, filename), self.root_dir).replace(os.sep, "/"))
+        return blob_names
+        
+    def delete_blobs(self, blob_names: List[str]) -> List[str]:
+        deleted_blobs = []
+        for blob_name in blob_names:
+            try:
+                path = self.path(blob_name)
+                os.remove(path)
+                deleted_blobs.append(blob_name)
+                self._prune(os.path.dirname(path))
+            except Exception as e:
+                print(f"Error deleting blob {blob_name}: {str(e)}")
+        return deleted_blobs
+        
+    def _prune(self, directory: str) -> None:
+        """Removes a directory left empty by a delete, such as a session folder."""
+        if directory != self.root_dir:
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass
+                
+    def get_blob_size(self, blob_name: str) -> Optional[int]:
+        path = self.path(blob_name)
+        return os.path.getsize(path) if os.path.isfile(path) else None
+        
+    def _signature(self, method: str, blob_name: str, expires: int) -> str:
+        message = f"{method}\n{blob_name}\n{expires}".encode()
+        return hmac.new(self.signing_key, message, hashlib.sha256).hexdigest()
+        
+    def _signed_url(self, method: str, blob_name: str, expiration_minutes: int) -> str:
+        expires = int(time.time()) + expiration_minutes * 60
+        query = urlencode({"expires": expires, "signature": self._signature(method, blob_name, expires)})
+        return f"{self.url_prefix}/{quote(blob_name)}?{query}"
+        
+    def generate_signed_url(self, blob_name: str, expiration_minutes: int = 15) -> str:
+        return self._signed_url("GET", blob_name, expiration_minutes)
+        
+    def create_upload_url(self, blob_name: str, content_type: Optional[str], size: int,
+                          expiration_minutes: int, origin: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            "url": self._signed_url("PUT", blob_name, expiration_minutes),
+            "method": "PUT",
+            "headers": {"Content-Type": content_type or "application/octet-stream"}
+        }
+        
+    def verify_signature(self, blob_name: str, expires: int, signature: str, method: str = "GET") -> bool:
+        """Checks that a signed URL is authentic, not expired and used with the method it was signed for."""
+        if expires < time.time():
+            return False
+        return hmac.compare_digest(self._signature(method, blob_name, expires), signature)
+
+def create_storage_backend(bucket_name: str) -> StorageBackend:
+    """Creates the backend selected by STORAGE_BACKEND ("gcs" or "local")."""
+    backend = os.getenv("STORAGE_BACKEND", "gcs").lower()
+    if backend == "gcs":
+        return GCSStorageBackend(bucket_name)
+    if backend == "local":
+        return LocalStorageBackend(
+            root_dir=os.getenv("UPLOAD_DIR", "uploads"),
+            url_prefix=os.getenv("LOCAL_STORAGE_URL_PREFIX", "/api/files/blobs"),
+            signing_key=os.getenv("LOCAL_STORAGE_SIGNING_KEY")
+        )
+    raise ValueError(f"Unsupported storage backend: {backend}")
@@ -1,62 +1,132 @@
 # backend/app/services/storage_service.py
 import os
 import uuid
-from google.cloud import storage
-from typing import Dict, Optional, List, BinaryIO
+import fnmatch
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Optional, List, BinaryIO
 
-class StorageService:
-    """Service for interacting with Google Cloud Storage."""
+from app.services.storage_backends import StorageBackend, LocalStorageBackend, create_storage_backend
+
+class UploadRejected(Exception):
+    """Raised when an upload violates the configured size or type limits."""
+    
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+class UploadLimits:
+    """Upload size and type limits read from MAX_FILE_SIZE_MB and ALLOWED_FILE_TYPES."""
     
     def __init__(self):
-        self.client = storage.Client()
-        self.bucket_name = os.getenv("GCS_BUCKET_NAME", "vertexagent-uploads")
-        self.initialized = False
+        self.max_bytes = int(float(os.getenv("MAX_FILE_SIZE_MB", "20")) * 1024 * 1024)
+        allowed = os.getenv("ALLOWED_FILE_TYPES", "image/*,text/*,application/pdf,application/json,application/xml")
+        self.allowed_types = [pattern.strip().lower() for pattern in allowed.split(",") if pattern.strip()]
         
-    def _ensure_bucket_exists(self):
-        """Ensure the configured bucket exists, creating it if necessary."""
-        if self.initialized:
-            return
+    def check_type(self, content_type: Optional[str]) -> None:
+        """Rejects content types that don't match any allowed pattern."""
+        mime_type = (content_type or "").split(";")[0].strip().lower()
+        if not any(fnmatch.fnmatch(mime_type, pattern) for pattern in self.allowed_types):
+            raise UploadRejected(415, f"File type '{mime_type or 'unknown'}' is not allowed")
             
-        try:
-            # Check if bucket exists
-            self.bucket = self.client.get_bucket(self.bucket_name)
-        except Exception:
-            # Create bucket if it doesn't exist
-            self.bucket = self.client.create_bucket(self.bucket_name)
+    def check_size(self, size: Optional[int]) -> None:
+        """Rejects sizes above the configured maximum."""
+        if size is not None and size > self.max_bytes:
+            raise UploadRejected(413, f"File exceeds the maximum size of {self.max_bytes // (1024 * 1024)}MB")
+
+class StorageService:
+    """Service for storing uploaded files in the configured storage backend."""
+    
+    def __init__(self, backend: Optional[StorageBackend] = None):
+        self.bucket_name = os.getenv("GCS_BUCKET_NAME", "vertexagent-uploads")
+        
+        # STORAGE_BACKEND=local stores files under UPLOAD_DIR instead of GCS
+        self.backend = backend or create_storage_backend(self.bucket_name)
+        self.limits = UploadLimits()
+        
+        # Signed URLs are reused until SIGNED_URL_REUSE_MARGIN_SECONDS before they expire
+        self.signed_url_expiration_minutes = int(os.getenv("GCS_SIGNED_URL_EXPIRATION_MINUTES", "15"))
+        self.signed_url_margin_seconds = min(
+            int(os.getenv("SIGNED_URL_REUSE_MARGIN_SECONDS", "120")),
+            self.signed_url_expiration_minutes * 60 // 2
+        )
+        self.signed_url_cache_size = int(os.getenv("SIGNED_URL_CACHE_SIZE", "10000"))
+        self._signed_urls: "OrderedDict[str, tuple]" = OrderedDict()
+        self._signed_urls_lock = threading.Lock()
+        self._signing_pool = ThreadPoolExecutor(max_workers=int(os.getenv("SIGNED_URL_CONCURRENCY", "8")))
+        
+    @property
+    def is_local(self) -> bool:
+        return isinstance(self.backend, LocalStorageBackend)
+        
+    def _new_blob_name(self, filename: str, session_id: Optional[str] = None) -> Dict[str, str]:
+        """Generates a file ID and the blob name it is stored under."""
+        file_id = str(uuid.uuid4())
+        file_extension = os.path.splitext(filename)[1]
+        
+        # Use session_id in the path if provided
+        if session_id:
+            blob_name = f"{session_id}/{file_id}{file_extension}"
+        else:
+            blob_name = f"{file_id}{file_extension}"
             
-        self.initialized = True
+        return {"file_id": file_id, "blob_name": blob_name}
+        
+    def file_uri(self, blob_name: str) -> str:
+        """Returns the storage URI (gs:// or file://) recorded for a blob."""
+        return self.backend.file_uri(blob_name)
+        
+    @staticmethod
+    def content_blob_name(content_hash: str) -> str:
+        """Returns the content-addressed blob name for a SHA-256 digest."""
+        return f"cas/{content_hash}"
+        
+    @staticmethod
+    def hash_file(file_obj: BinaryIO, chunk_size: int = 1024 * 1024) -> Dict[str, Any]:
+        """
+        Compute the SHA-256 digest and size of a file-like object.
+        
+        Args:
+            file_obj: Seekable file-like object
+            chunk_size: Bytes read per iteration
             
-    def upload_file(self, file_obj: BinaryIO, filename: str, content_type: Optional[str] = None, session_id: Optional[str] = None) -> Dict:
+        Returns:
+            Dict with the hex digest ("sha256") and size in bytes
+        """
+        digest = hashlib.sha256()
+        size = 0
+        file_obj.seek(0)
+        for chunk in iter(lambda: file_obj.read(chunk_size), b""):
+            digest.update(chunk)
+            size += len(chunk)
+        file_obj.seek(0)
+        return {"sha256": digest.hexdigest(), "size": size}
+        
+    def upload_file(self, file_obj: BinaryIO, filename: str, content_type: Optional[str] = None,
+                    session_id: Optional[str] = None, blob_name: Optional[str] = None) -> Dict:
         """
-        Upload a file to Google Cloud Storage.
+        Upload a file to the storage backend.
         
         Args:
             file_obj: File-like object to upload
             filename: Original filename
             content_type: MIME type of the file
             session_id: Optional session ID to group files
+            blob_name: Explicit blob name (e.g. a content-addressed name) instead of a generated one
             
         Returns:
             Dict with file metadata
         """
-        self._ensure_bucket_exists()
+        names = self._new_blob_name(filename, session_id)
+        file_id = names["file_id"]
+        blob_name = blob_name or names["blob_name"]
         
-        # Generate a unique ID for the file
-        file_id = str(uuid.uuid4())
-        file_extension = os.path.splitext(filename)[1]
-        
-        # Use session_id in the path if provided
-        if session_id:
-            blob_name = f"{session_id}/{file_id}{file_extension}"
-        else:
-            blob_name = f"{file_id}{file_extension}"
-            
-        # Create a new blob and upload the file
-        blob = self.bucket.blob(blob_name)
-        blob.upload_from_file(file_obj, content_type=content_type, rewind=True)
-        
-        # Make the blob publicly readable (optional, may want to use signed URLs instead)
-        # blob.make_public()
+        public_url = self.backend.upload_file(file_obj, blob_name, content_type)
         
         # Get the size of the uploaded file
         file_obj.seek(0, os.SEEK_END)
@@ -71,10 +141,133 @@ class StorageService:
             "filename": filename,
             "content_type": content_type,
             "size": file_size,
-            "public_url": blob.public_url if hasattr(blob, 'public_url') else None,
-            "gs_uri": f"gs://{self.bucket_name}/{blob_name}"
+            "public_url": public_url,
+            "gs_uri": self.file_uri(blob_name)
         }
         
+    async def upload_stream(self, chunks, filename: str, content_type: Optional[str] = None,
+                            session_id: Optional[str] = None, declared_size: Optional[int] = None,
+                            blob_name: Optional[str] = None) -> Dict:
+        """
+        Stream a file into storage without buffering it locally, enforcing limits as bytes arrive.
+        
+        Args:
+            chunks: Async iterator of byte chunks (e.g. request.stream())
+            filename: Original filename
+            content_type: MIME type of the file
+            session_id: Optional session ID to group files
+            declared_size: Size announced by the client (Content-Length), checked before reading
+            blob_name: Explicit blob name instead of a generated one
+            
+        Returns:
+            Dict with file metadata, including the SHA-256 digest computed while streaming
+            
+        Raises:
+            UploadRejected: If the type or size limits are violated; the partial upload is aborted
+        """
+        # Reject before any bytes are read or any upload session is opened
+        self.limits.check_type(content_type)
+        self.limits.check_size(declared_size)
+        
+        names = self._new_blob_name(filename, session_id)
+        file_id = names["file_id"]
+        blob_name = blob_name or names["blob_name"]
+        
+        stream = await self.backend.open_upload_stream(blob_name, content_type)
+        
+        received = 0
+        digest = hashlib.sha256()
+        try:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                received += len(chunk)
+                self.limits.check_size(received)
+                digest.update(chunk)
+                await stream.write(chunk)
+            file_size = await stream.close()
+        except BaseException:
+            await stream.abort()
+            raise
+            
+        return {
+            "file_id": file_id,
+            "bucket_name": self.bucket_name,
+            "blob_name": blob_name,
+            "filename": filename,
+            "content_type": content_type,
+            "size": file_size,
+            "public_url": None,
+            "gs_uri": self.file_uri(blob_name),
+            "sha256": digest.hexdigest()
+        }
+        
+    def create_upload_intent(self, filename: str, content_type: Optional[str], size: Optional[int],
+                             session_id: str, expiration_minutes: int, origin: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Prepare a direct upload from the browser to the storage backend.
+        
+        Args:
+            filename: Original filename
+            content_type: MIME type of the file
+            size: Exact size of the file in bytes
+            session_id: Session ID to group files
+            expiration_minutes: How long the upload URL should be valid for
+            origin: Browser origin allowed to upload (for CORS)
+            
+        Returns:
+            Dict with the file ID, blob name and the upload URL, method and headers
+            
+        Raises:
+            UploadRejected: If the type or size limits are violated
+        """
+        self.limits.check_type(content_type)
+        if size is None or size < 0:
+            raise UploadRejected(411, "File size is required")
+        self.limits.check_size(size)
+        
+        names = self._new_blob_name(filename, session_id)
+        upload = self.backend.create_upload_url(names["blob_name"], content_type, size, expiration_minutes, origin)
+        
+        return {
+            "file_id": names["file_id"],
+            "blob_name": names["blob_name"],
+            "upload_url": upload["url"],
+            "method": upload["method"],
+            "headers": upload["headers"]
+        }
+        
+    def get_blob_size(self, blob_name: str) -> Optional[int]:
+        """Returns the size of a blob in bytes, or None if it doesn't exist."""
+        return self.backend.get_blob_size(blob_name)
+        
+    def open_blob(self, blob_name: str) -> BinaryIO:
+        """
+        Open a blob for streaming reads without downloading it first.
+        
+        Args:
+            blob_name: Name of the blob in storage
+            
+        Returns:
+            Seekable, readable file-like object; the caller must close it
+        """
+        return self.backend.open_blob(blob_name)
+        
+    def rename_blob(self, blob_name: str, new_name: str) -> str:
+        """
+        Move a blob to a new name, replacing any existing blob with that name.
+        
+        Args:
+            blob_name: Current blob name
+            new_name: Target blob name
+            
+        Returns:
+            Storage URI of the renamed blob
+        """
+        self.backend.rename_blob(blob_name, new_name)
+        self._evict_signed_url(blob_name)
+        return self.file_uri(new_name)
+        
     def delete_session_files(self, session_id: str) -> List[str]:
         """
         Delete all files for a session.
@@ -85,18 +278,24 @@ class StorageService:
         Returns:
             List of deleted blob names
         """
-        self._ensure_bucket_exists()
+        return self.delete_blobs(self.backend.list_blobs(f"{session_id}/"))
         
-        deleted_blobs = []
-        blobs = list(self.bucket.list_blobs(prefix=f"{session_id}/"))
+    def delete_blobs(self, blob_names: List[str]) -> List[str]:
+        """
+        Delete specific blobs, ignoring ones that no longer exist.
         
-        if blobs:
-            for blob in blobs:
-                blob.delete()
-                deleted_blobs.append(blob.name)
+        Args:
+            blob_names: Names of the blobs to delete
+            
+        Returns:
+            List of deleted blob names
+        """
+        try:
+            return self.backend.delete_blobs(blob_names)
+        finally:
+            for blob_name in blob_names:
+                self._evict_signed_url(blob_name)
                 
-        return deleted_blobs
-        
     def generate_signed_url(self, blob_name: str, expiration_minutes: int = 15) -> str:
         """
         Generate a signed URL for temporary access to a file.
@@ -108,13 +307,61 @@ class StorageService:
         Returns:
             Signed URL with temporary access
         """
-        self._ensure_bucket_exists()
+        return self.backend.generate_signed_url(blob_name, expiration_minutes)
         
-        blob = self.bucket.blob(blob_name)
-        url = blob.generate_signed_url(
-            version="v4",
-            expiration=expiration_minutes * 60,  # Convert to seconds
-            method="GET"
-        )
+    def _evict_signed_url(self, blob_name: str) -> None:
+        """Drops a cached signed URL, e.g. after its blob was deleted."""
+        with self._signed_urls_lock:
+            self._signed_urls.pop(blob_name, None)
+            
+    def get_signed_url(self, blob_name: str) -> Dict[str, Any]:
+        """
+        Get a signed URL for a blob, reusing a cached one while it is comfortably valid.
         
-        return url
+        Args:
+            blob_name: Name of the blob in storage
+            
+        Returns:
+            Dict with the URL, its expiry time (ISO 8601, UTC) and remaining lifetime in seconds
+        """
+        now = time.time()
+        
+        with self._signed_urls_lock:
+            entry = self._signed_urls.get(blob_name)
+            if entry and entry[1] - self.signed_url_margin_seconds > now:
+                self._signed_urls.move_to_end(blob_name)
+                url, expires_at = entry
+            else:
+                entry = None
+                
+        if entry is None:
+            expires_at = now + self.signed_url_expiration_minutes * 60
+            url = self.generate_signed_url(blob_name, self.signed_url_expiration_minutes)
+            
+            with self._signed_urls_lock:
+                self._signed_urls[blob_name] = (url, expires_at)
+                self._signed_urls.move_to_end(blob_name)
+                while len(self._signed_urls) > self.signed_url_cache_size:
+                    self._signed_urls.popitem(last=False)
+                    
+        return {
+            "url": url,
+            "expires_at": datetime.utcfromtimestamp(expires_at).isoformat() + "Z",
+            "expires_in": int(expires_at - now)
+        }
+        
+    def get_signed_urls(self, blob_names: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Get signed URLs for many blobs, signing cache misses concurrently.
+        
+        Args:
+            blob_names: Names of the blobs in storage
+            
+        Returns:
+            Dict mapping each blob name to the result of get_signed_url
+        """
+        unique_names = list(dict.fromkeys(blob_names))
+        return dict(zip(unique_names, self._signing_pool.map(self.get_signed_url, unique_names)))
+
+# Shared by the file endpoints and services (GCS or local disk, selected by STORAGE_BACKEND)
+storage_service = StorageService()
@@ -0,0 +1,180 @@
+# backend/app/services/tool_metrics.py
+import contextvars
+import functools
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional
+
+# Upper bounds of the latency histogram buckets in milliseconds; the last bucket is unbounded
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Tool calls made in the current request, if it is capturing them
+_captured_calls: contextvars.ContextVar[Optional[List[Dict[str, Any]]]] = contextvars.ContextVar(
+    "captured_tool_calls", default=None
+)
+
+class _ToolStats:
+    def __init__(self, tool_type: str, name: str):
+        self.tool_type = tool_type
+        self.name = name
+        self.calls = 0
+        self.errors = 0
+        self.cache_hits = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.output_bytes = 0
+        self.max_output_bytes = 0
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimates a latency quantile as the upper bound of the bucket it falls in."""
+        if not self.calls:
+            return None
+        target = q * self.calls
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= target:
+                return LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "type": self.tool_type,
+            "name": self.name,
+            "calls": self.calls,
+            "errors": self.errors,
+            "errorRate": self.errors / self.calls if self.calls else 0.0,
+            "cacheHits": self.cache_hits,
+            "latency": {
+                "totalMs": self.total_ms,
+                "meanMs": self.total_ms / self.calls if self.calls else 0.0,
+                "maxMs": self.max_ms,
+                "p50Ms": self.quantile(0.5),
+                "p95Ms": self.quantile(0.95),
+                "buckets": [
+                    {"leMs": bound, "count": count}
+                    for bound, count in zip(list(LATENCY_BUCKETS_MS) + [None], self.buckets)
+                ]
+            },
+            "outputBytes": {
+                "total": self.output_bytes,
+                "mean": self.output_bytes / self.calls if self.calls else 0.0,
+                "max": self.max_output_bytes
+            }
+        }
+
+class ToolMetrics:
+    """
+    In-process telemetry for tool calls: count, errors, latency histogram and output size per tool.
+
+    Calls are also appended to the current request's capture list, if capture() was called,
+    so they can be reported alongside the agent's actions.
+    """
+
+    def __init__(self):
+        self._stats: Dict[str, _ToolStats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, tool_type: str, tool_key: str, name: str, duration_ms: float, error: Optional[str] = None,
+               output: Optional[str] = None, cached: bool = False) -> None:
+        """
+        Records one tool call.
+
+        Args:
+            tool_type: "custom" or "predefined"
+            tool_key: Stable identifier of the tool (tool ID for custom tools, name otherwise)
+            name: Display name of the tool
+            duration_ms: Wall-clock duration of the call
+            error: Error message if the call failed
+            output: The tool's output, used for its size
+            cached: True if the result was served from a cache
+        """
+        output_bytes = len(output.encode("utf-8", errors="replace")) if output else 0
+
+        with self._lock:
+            stats = self._stats.get(f"{tool_type}:{tool_key}")
+            if stats is None:
+                stats = self._stats[f"{tool_type}:{tool_key}"] = _ToolStats(tool_type, name)
+            stats.name = name
+            stats.calls += 1
+            stats.errors += 1 if error else 0
+            stats.cache_hits += 1 if cached else 0
+            stats.total_ms += duration_ms
+            stats.max_ms = max(stats.max_ms, duration_ms)
+            stats.buckets[bisect_left(LATENCY_BUCKETS_MS, duration_ms)] += 1
+            stats.output_bytes += output_bytes
+            stats.max_output_bytes = max(stats.max_output_bytes, output_bytes)
+
+        captured = _captured_calls.get()
+        if captured is not None:
+            captured.append({
+                "name": name,
+                "type": tool_type,
+                "toolId": tool_key if tool_type == "custom" else None,
+                "durationMs": duration_ms,
+                "error": error,
+                "outputBytes": output_bytes,
+                "cached": cached
+            })
+
+    def instrument(self, name: str, function: Callable, tool_type: str = "predefined") -> Callable:
+        """Wraps a tool function so that its calls are recorded."""
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            except Exception as e:
+                self.record(tool_type, name, name, (time.perf_counter() - started) * 1000, error=str(e))
+                raise
+            self.record(tool_type, name, name, (time.perf_counter() - started) * 1000, output=str(result))
+            return result
+
+        return wrapper
+
+    def capture(self) -> List[Dict[str, Any]]:
+        """
+        Starts collecting the tool calls made in the current context and returns the list they go into.
+
+        Each request runs in its own context, so this only sees calls made by the
+        current request, including those made from asyncio.to_thread.
+        """
+        calls: List[Dict[str, Any]] = []
+        _captured_calls.set(calls)
+        return calls
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Returns the metrics of every tool called since startup, slowest in total first."""
+        with self._lock:
+            tools = [stats.to_dict() for stats in self._stats.values()]
+        tools.sort(key=lambda tool: tool["latency"]["totalMs"], reverse=True)
+        return {
+            "bucketsMs": list(LATENCY_BUCKETS_MS),
+            "tools": tools
+        }
+
+    def reset(self) -> None:
+        """Drops all recorded metrics."""
+        with self._lock:
+            self._stats.clear()
+
+def attach_tool_calls(actions: List[Dict[str, Any]], calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Adds the timing of captured tool calls to an agent's reported actions.
+
+    Actions and calls are matched in order by name; anything left unmatched is
+    kept as an action of its own.
+    """
+    merged = []
+    for index in range(max(len(actions), len(calls))):
+        action = actions[index] if index < len(actions) else None
+        call = calls[index] if index < len(calls) else None
+        if action is not None and call is not None and action.get("name") in (None, call["name"]):
+            merged.append({**action, **call})
+        else:
+            merged.extend(item for item in (action, call) if item is not None)
+    return merged
+
+tool_metrics = ToolMetrics()
@@ -0,0 +1,788 @@
+# backend/app/services/tool_sandbox.py
+# Kept free of app imports so sandbox workers start without loading the database layer.
+import ast
+import asyncio
+import importlib.util
+import ipaddress
+import json
+import marshal
+import math
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import types
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# Modules custom tool code may import. string is deliberately absent: string.Formatter.get_field
+# resolves dunder attributes from a format string, which the static check cannot see.
+ALLOWED_IMPORTS = frozenset(
+    name.strip() for name in os.getenv(
+        "TOOL_ALLOWED_IMPORTS",
+        "collections,datetime,decimal,fractions,functools,itertools,json,math,re,statistics"
+    ).split(",") if name.strip()
+)
+
+# Builtins and globals tool code may not name
+DISALLOWED_NAMES = frozenset({
+    "__builtins__", "__import__", "breakpoint", "compile", "delattr", "eval", "exec",
+    "getattr", "globals", "locals", "open", "setattr", "vars"
+})
+
+# Attributes that turn strings into attribute lookups, or reach the frames (and globals)
+# of the code calling the tool through generators, coroutines and tracebacks
+DISALLOWED_ATTRIBUTES = frozenset({
+    "Formatter", "get_field",
+    "ag_frame", "cr_frame", "gi_frame", "tb_frame", "f_back", "f_builtins", "f_globals", "f_locals",
+    "ag_code", "cr_code", "gi_code", "f_code",
+    "ag_await", "cr_await", "gi_yieldfrom"
+})
+
+# Outbound HTTP for async tools. With TOOL_HTTP_ALLOWED_HOSTS unset any public host may be
+# called; set it in production, since a public name can still resolve to a private address.
+HTTP_ALLOWED_HOSTS = frozenset(
+    host.strip().lower() for host in os.getenv("TOOL_HTTP_ALLOWED_HOSTS", "").split(",") if host.strip()
+)
+HTTP_TIMEOUT_SECONDS = float(os.getenv("TOOL_HTTP_TIMEOUT_SECONDS", "10"))
+HTTP_MAX_BYTES = int(os.getenv("TOOL_HTTP_MAX_BYTES", str(1024 * 1024)))
+_BLOCKED_HOSTS = frozenset({"localhost", "metadata", "metadata.google.internal"})
+
+def _module_proxy(module: types.ModuleType) -> types.SimpleNamespace:
+    """
+    Exposes a module's public attributes to tool code, minus the modules it imported.
+    
+    Without this, json.codecs.builtins.open or datetime.sys.modules reach anything.
+    Submodules of the same package (collections.abc) are exposed as proxies too.
+    """
+    attributes = {}
+    for attribute, value in vars(module).items():
+        if attribute.startswith("_"):
+            continue
+        if isinstance(value, types.ModuleType):
+            if not value.__name__.startswith(module.__name__ + "."):
+                continue
+            value = _module_proxy(value)
+        attributes[attribute] = value
+    return types.SimpleNamespace(**attributes)
+
+def _restricted_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if level != 0 or name.split(".")[0] not in ALLOWED_IMPORTS:
+        raise ImportError(f"Import of {name} is not allowed")
+    module = __import__(name, globals, locals, fromlist, level)
+    # "from a.b import c" reads c from a.b; "import a.b" binds a
+    return _module_proxy(importlib.import_module(name) if fromlist else module)
+
+class ToolHTTPError(Exception):
+    """A request made by tool code was refused or failed."""
+
+class ToolHTTPResponse:
+    """The parts of an HTTP response tool code gets to see."""
+    
+    def __init__(self, status_code: int, headers: Dict[str, str], content: bytes, encoding: str):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.encoding = encoding
+        
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+        
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding, errors="replace")
+        
+    def json(self) -> Any:
+        return json.loads(self.text)
+
+class ToolHTTP:
+    """
+    Async HTTP client for tool code: http(s) only, no redirects, bounded time and size.
+    
+    Loopback, private and link-local addresses are refused, as is any host outside
+    TOOL_HTTP_ALLOWED_HOSTS when it is set. Connections are pooled per event loop, so
+    the calls of a batch on a sandbox worker share them.
+    """
+    
+    def __init__(self):
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = weakref.WeakKeyDictionary()
+        
+    def _client(self) -> Any:
+        if httpx is None:
+            raise ToolHTTPError("HTTP requests require the httpx package")
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(timeout=HTTP_TIMEOUT_SECONDS, follow_redirects=False, trust_env=False)
+            self._clients[loop] = client
+        return client
+        
+    @staticmethod
+    def _check_url(url: str) -> None:
+        try:
+            parsed = httpx.URL(url)
+        except Exception:
+            raise ToolHTTPError(f"Invalid URL: {url}") from None
+        host = (parsed.host or "").lower().rstrip(".")
+        if parsed.scheme not in ("http", "https") or not host:
+            raise ToolHTTPError(f"Only http and https URLs may be requested: {url}")
+        if HTTP_ALLOWED_HOSTS:
+            if host not in HTTP_ALLOWED_HOSTS:
+                raise ToolHTTPError(f"Host {host} is not in TOOL_HTTP_ALLOWED_HOSTS")
+            return
+        if host in _BLOCKED_HOSTS or host.endswith(".localhost") or host.endswith(".internal"):
+            raise ToolHTTPError(f"Host {host} may not be requested")
+        try:
+            address = ipaddress.ip_address(host)
+        except ValueError:
+            return
+        if not address.is_global:
+            raise ToolHTTPError(f"Address {host} may not be requested")
+            
+    async def request(self, method: str, url: str, params: Optional[Dict[str, Any]] = None,
+                      headers: Optional[Dict[str, str]] = None, json: Any = None,
+                      data: Optional[Dict[str, Any]] = None) -> ToolHTTPResponse:
+        """Sends a request and reads at most TOOL_HTTP_MAX_BYTES of the response."""
+        self._check_url(url)
+        try:
+            async with self._client().stream(
+                method.upper(), url, params=params, headers=headers, json=json, data=data
+            ) as response:
+                content = bytearray()
+                async for chunk in response.aiter_bytes():
+                    content += chunk
+                    if len(content) > HTTP_MAX_BYTES:
+                        raise ToolHTTPError(f"Response is larger than {HTTP_MAX_BYTES} bytes")
+                return ToolHTTPResponse(
+                    response.status_code, dict(response.headers), bytes(content), response.encoding or "utf-8"
+                )
+        except ToolHTTPError:
+            raise
+        except Exception as e:
+            # Library exceptions carry the client and request objects; tool code gets the message only
+            raise ToolHTTPError(f"{type(e).__name__}: {str(e)}") from None
+            
+    async def get(self, url: str, params: Optional[Dict[str, Any]] = None,
+                  headers: Optional[Dict[str, str]] = None) -> ToolHTTPResponse:
+        return await self.request("GET", url, params=params, headers=headers)
+        
+    async def post(self, url: str, json: Any = None, data: Optional[Dict[str, Any]] = None,
+                   params: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None) -> ToolHTTPResponse:
+        return await self.request("POST", url, params=params, headers=headers, json=json, data=data)
+
+async def _gather(*awaitables: Any) -> List[Any]:
+    """asyncio.gather for tool code, so an async tool can make its requests concurrently."""
+    return list(await asyncio.gather(*awaitables))
+
+_http = ToolHTTP()
+
+# Builtins available to custom tool code. http only exposes bound methods, so tool code
+# cannot reach the client (and its event loop) through attributes.
+SAFE_BUILTINS = {
+    "__import__": _restricted_import,
+    "abs": abs,
+    "all": all,
+    "any": any,
+    "bool": bool,
+    "dict": dict,
+    "enumerate": enumerate,
+    "filter": filter,
+    "float": float,
+    "gather": _gather,
+    "http": types.SimpleNamespace(get=_http.get, post=_http.post, request=_http.request),
+    "HTTPError": ToolHTTPError,
+    "int": int,
+    "isinstance": isinstance,
+    "len": len,
+    "list": list,
+    "map": map,
+    "max": max,
+    "min": min,
+    "range": range,
+    "round": round,
+    "set": set,
+    "sorted": sorted,
+    "str": str,
+    "sum": sum,
+    "tuple": tuple,
+    "zip": zip
+}
+
+def run_blocking(coroutine: Any) -> Any:
+    """
+    Runs a coroutine to completion from sync code.
+    
+    asyncio.run can't be used on a thread whose event loop is running (sync code called
+    from a coroutine), so the coroutine then runs on a private loop in a short-lived thread.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+class CompiledTool:
+    """A custom tool's compiled code and resolved entry function."""
+    
+    def __init__(self, code: Any, function: Callable, signature: Dict[str, Any]):
+        self.code = code
+        self.function = function
+        self.signature = signature
+        self.parameters = tuple(
+            parameter["name"] for parameter in signature["parameters"]
+            if parameter["kind"] in ("positional", "keyword_only")
+        )
+        self.var_keyword = any(parameter["kind"] == "var_keyword" for parameter in signature["parameters"])
+        self.is_async = signature["is_async"]
+        
+    def _kwargs(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        if self.var_keyword:
+            return dict(params)
+        return {name: params[name] for name in self.parameters if name in params}
+        
+    def call(self, params: Dict[str, Any], timeout: Optional[float] = None) -> Any:
+        """Calls the entry function with the parameters it accepts; async tools run on a private event loop."""
+        if self.is_async:
+            return run_blocking(asyncio.wait_for(self.function(**self._kwargs(params)), timeout))
+        return self.function(**self._kwargs(params))
+        
+    async def call_async(self, params: Dict[str, Any], timeout: Optional[float] = None) -> Any:
+        """Awaits an async tool on the running event loop, or runs a sync tool in a thread."""
+        if self.is_async:
+            return await asyncio.wait_for(self.function(**self._kwargs(params)), timeout)
+        return await asyncio.to_thread(self.function, **self._kwargs(params))
+
+def _signature_parameters(arguments: ast.arguments) -> List[Dict[str, Any]]:
+    positional = arguments.posonlyargs + arguments.args
+    first_default = len(positional) - len(arguments.defaults)
+    
+    parameters = [
+        {"name": arg.arg, "kind": "positional", "required": index < first_default}
+        for index, arg in enumerate(positional)
+    ]
+    if arguments.vararg:
+        parameters.append({"name": arguments.vararg.arg, "kind": "var_positional", "required": False})
+    parameters.extend(
+        {"name": arg.arg, "kind": "keyword_only", "required": default is None}
+        for arg, default in zip(arguments.kwonlyargs, arguments.kw_defaults)
+    )
+    if arguments.kwarg:
+        parameters.append({"name": arguments.kwarg.arg, "kind": "var_keyword", "required": False})
+    return parameters
+
+def analyze_tool_code(code: str) -> Dict[str, Any]:
+    """
+    Validates tool code by inspecting its AST, without executing it.
+    
+    Rejects imports outside ALLOWED_IMPORTS, references to DISALLOWED_NAMES,
+    DISALLOWED_ATTRIBUTES and dunder attribute access, and requires at least one
+    top-level function. This catches mistakes when a tool is saved; it is not a
+    security boundary. Neither are the restricted builtins, and the sandbox
+    workers only bound CPU, memory and time, so only run tools from trusted authors.
+    
+    Args:
+        code: Tool source code
+        
+    Returns:
+        Signature of the entry point (the first top-level function): {"entry_point",
+        "is_async", "parameters": [{"name", "kind", "required"}], "functions"}
+        
+    Raises:
+        ValueError: Describing every problem found
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        raise ValueError(f"Syntax error on line {e.lineno}: {e.msg}")
+        
+    problems = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            modules = [node.module or ""] if node.level == 0 else ["." * node.level + (node.module or "")]
+        else:
+            modules = []
+            
+        for module in modules:
+            if module.split(".")[0] not in ALLOWED_IMPORTS:
+                problems.append(f"line {node.lineno}: import of {module} is not allowed")
+        if isinstance(node, ast.ImportFrom):
+            for alias in node.names:
+                if alias.name.startswith("_") or alias.name in DISALLOWED_ATTRIBUTES:
+                    problems.append(f"line {node.lineno}: import of {alias.name} is not allowed")
+        if isinstance(node, ast.Name) and node.id in DISALLOWED_NAMES:
+            problems.append(f"line {node.lineno}: use of {node.id} is not allowed")
+        elif isinstance(node, ast.Attribute) and (node.attr.startswith("__") or node.attr in DISALLOWED_ATTRIBUTES):
+            problems.append(f"line {node.lineno}: access to {node.attr} is not allowed")
+            
+    functions = [node for node in tree.body if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))]
+    if not functions:
+        problems.append("Tool code must define at least one function")
+    if problems:
+        raise ValueError("; ".join(problems))
+        
+    entry = functions[0]
+    return {
+        "entry_point": entry.name,
+        "is_async": isinstance(entry, ast.AsyncFunctionDef),
+        "parameters": _signature_parameters(entry.args),
+        "functions": [function.name for function in functions]
+    }
+
+def build_bytecode(tool_id: str, code: str) -> bytes:
+    """Compiles tool code into a marshalled code object, prefixed with this interpreter's magic number."""
+    return importlib.util.MAGIC_NUMBER + marshal.dumps(compile(code, f"<custom_tool_{tool_id}>", "exec"))
+
+def _load_bytecode(bytecode: Optional[bytes]) -> Any:
+    # Bytecode from another Python version is ignored and the source recompiled
+    magic = importlib.util.MAGIC_NUMBER
+    if not bytecode or bytes(bytecode[:len(magic)]) != magic:
+        return None
+    try:
+        return marshal.loads(bytes(bytecode[len(magic):]))
+    except (EOFError, ValueError, TypeError):
+        return None
+
+def compile_tool_code(tool_id: str, code: str, signature: Optional[Dict[str, Any]] = None,
+                      bytecode: Optional[bytes] = None) -> CompiledTool:
+    """
+    Loads a tool's entry function without registering a module.
+    
+    With the stored signature and bytecode this is a single exec of the module body;
+    tools saved without them are analyzed and compiled from source.
+    
+    Args:
+        tool_id: ID of the tool, used in tracebacks
+        code: Tool source code
+        signature: Stored result of analyze_tool_code
+        bytecode: Stored result of build_bytecode
+        
+    Returns:
+        CompiledTool with the code object, entry function and its signature
+    """
+    signature = signature or analyze_tool_code(code)
+    compiled_code = _load_bytecode(bytecode) or compile(code, f"<custom_tool_{tool_id}>", "exec")
+    
+    # Execute the tool code in a sandbox to define the function
+    restricted_globals = {"__builtins__": SAFE_BUILTINS}
+    exec(compiled_code, restricted_globals)
+    
+    function = restricted_globals.get(signature["entry_point"])
+    if not callable(function):
+        raise ValueError(f"Entry point {signature['entry_point']} not found in tool code")
+        
+    return CompiledTool(compiled_code, function, signature)
+
+class ToolLimits:
+    """Per-call resource limits for a sandboxed tool."""
+    
+    def __init__(self, timeout_seconds: float = 10.0, cpu_seconds: float = 5.0, memory_mb: int = 256):
+        self.timeout_seconds = timeout_seconds
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        
+    @classmethod
+    def from_env(cls) -> "ToolLimits":
+        return cls(
+            timeout_seconds=float(os.getenv("TOOL_TIMEOUT_SECONDS", "10")),
+            cpu_seconds=float(os.getenv("TOOL_CPU_SECONDS", "5")),
+            memory_mb=int(os.getenv("TOOL_MEMORY_MB", "256"))
+        )
+
+class ToolCPUTimeExceeded(BaseException):
+    # Not an Exception, so a tool's own "except Exception" can't swallow it
+    pass
+
+def _on_cpu_limit(signum, frame):
+    raise ToolCPUTimeExceeded()
+
+def _address_space_bytes() -> int:
+    """Current virtual memory size of this process, or 0 if unknown."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+def _set_call_limits(cpu_seconds: float, memory_mb: int) -> None:
+    """Caps CPU time and memory for the next call, relative to what the worker already uses."""
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    cpu_limit = math.ceil(usage.ru_utime + usage.ru_stime + cpu_seconds)
+    _set_soft_limit(resource.RLIMIT_CPU, cpu_limit)
+    if memory_mb > 0:
+        _set_soft_limit(resource.RLIMIT_AS, _address_space_bytes() + memory_mb * 1024 * 1024)
+
+def _set_soft_limit(limit: int, value: Optional[int]) -> None:
+    """Sets a soft rlimit, capped at the hard limit; None lifts it to the hard limit."""
+    hard = resource.getrlimit(limit)[1]
+    if value is None or (hard != resource.RLIM_INFINITY and value > hard):
+        value = hard
+    resource.setrlimit(limit, (value, hard))
+
+def _clear_call_limits() -> None:
+    _set_soft_limit(resource.RLIMIT_CPU, None)
+    _set_soft_limit(resource.RLIMIT_AS, None)
+
+def _error_reply(error: BaseException, cpu_seconds: float, memory_mb: int, timeout_seconds: float) -> Tuple[str, str]:
+    if isinstance(error, ToolCPUTimeExceeded):
+        return ("error", f"CPU time limit of {cpu_seconds}s exceeded")
+    if isinstance(error, MemoryError):
+        # The heap may be fragmented or the tool's globals bloated; start fresh
+        return ("fatal", f"Memory limit of {memory_mb} MB exceeded")
+    if isinstance(error, asyncio.TimeoutError):
+        return ("error", f"Timed out after {timeout_seconds}s")
+    return ("error", str(error))
+
+async def run_async_calls(compiled: CompiledTool, batch: List[Dict[str, Any]], timeout_seconds: float,
+                           cpu_seconds: float, memory_mb: int) -> List[Tuple[str, str, float]]:
+    """Runs the calls of an async tool concurrently, each with its own timeout."""
+    async def run(params: Dict[str, Any]) -> Tuple[str, str, float]:
+        started = time.perf_counter()
+        try:
+            reply = ("ok", str(await compiled.call_async(params, timeout_seconds)))
+        except BaseException as e:
+            reply = _error_reply(e, cpu_seconds, memory_mb, timeout_seconds)
+        return reply + ((time.perf_counter() - started) * 1000,)
+        
+    return await asyncio.gather(*(run(params) for params in batch))
+
+def _worker_main(conn, cache_size: int) -> None:
+    """
+    Sandbox worker loop: receives batches of calls, runs them under rlimits and sends back their results.
+    
+    Compiled tools are kept in a per-worker LRU so repeat calls skip compilation.
+    Calls to sync tools run one after another; calls to async tools run concurrently on
+    the worker's event loop, sharing a CPU budget of cpu_seconds per call.
+    Each call gets a (status, value, duration_ms) reply where status is "ok", "error" or
+    "fatal" (the worker exits after it). A batch gets a single ("missing", None, 0) reply
+    instead when the tool isn't loaded and no artifact (code, signature, bytecode) was sent.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGXCPU, _on_cpu_limit)
+    tools: "OrderedDict[Tuple[str, str], CompiledTool]" = OrderedDict()
+    loop = asyncio.new_event_loop()
+    
+    def send(reply: Tuple[str, str, float]) -> bool:
+        try:
+            conn.send(reply)
+        except (OSError, ValueError):
+            return False
+        return reply[0] != "fatal"
+        
+    while True:
+        try:
+            key, artifact, batch, cpu_seconds, memory_mb, timeout_seconds = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+            
+        compiled = tools.get(key)
+        if compiled is None and artifact is None:
+            conn.send(("missing", None, 0.0))
+            continue
+        if compiled is not None:
+            tools.move_to_end(key)
+        else:
+            started = time.perf_counter()
+            try:
+                _set_call_limits(cpu_seconds, memory_mb)
+                try:
+                    compiled = compile_tool_code(key[0], **artifact)
+                finally:
+                    _clear_call_limits()
+            except BaseException as e:
+                # Every call fails the same way when the code doesn't load
+                reply = _error_reply(e, cpu_seconds, memory_mb, timeout_seconds) + ((time.perf_counter() - started) * 1000,)
+                if not all(send(reply) for _ in batch):
+                    return
+                continue
+                
+            tools[key] = compiled
+            while len(tools) > cache_size:
+                tools.popitem(last=False)
+                
+        if compiled.is_async:
+            try:
+                _set_call_limits(cpu_seconds * len(batch), memory_mb)
+                try:
+                    replies = loop.run_until_complete(
+                        run_async_calls(compiled, batch, timeout_seconds, cpu_seconds, memory_mb)
+                    )
+                finally:
+                    _clear_call_limits()
+            except BaseException as e:
+                # A limit hit outside of any call may have left the loop in a bad state
+                replies = [_error_reply(e, cpu_seconds, memory_mb, timeout_seconds) + (0.0,)] * len(batch)
+                loop.close()
+                loop = asyncio.new_event_loop()
+                
+            for reply in replies:
+                if not send(reply):
+                    return
+            continue
+            
+        for params in batch:
+            started = time.perf_counter()
+            try:
+                _set_call_limits(cpu_seconds, memory_mb)
+                try:
+                    reply = ("ok", str(compiled.call(params)))
+                finally:
+                    _clear_call_limits()
+            except BaseException as e:
+                reply = _error_reply(e, cpu_seconds, memory_mb, timeout_seconds)
+                
+            if not send(reply + ((time.perf_counter() - started) * 1000,)):
+                return
+
+# Extra time the parent waits for a result beyond the call's timeout
+RESULT_GRACE_SECONDS = 1.0
+
+class ToolSandboxError(Exception):
+    """Raised when a tool could not be run to completion in the sandbox."""
+    pass
+
+class _Worker:
+    def __init__(self, context, cache_size: int):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, cache_size), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.loaded = set()
+        
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=1)
+        self.conn.close()
+
+class ToolSandboxPool:
+    """
+    Pool of pre-started worker processes that run custom tool code.
+    
+    Each call runs under RLIMIT_CPU and RLIMIT_AS in the worker and a wall-clock
+    timeout in the parent. Workers that time out or die are killed and replaced.
+    Calls for a tool prefer an idle worker that already has it compiled.
+    """
+    
+    def __init__(self, workers: int = 4, limits: Optional[ToolLimits] = None, cache_size: int = 256):
+        self.size = workers
+        self.limits = limits or ToolLimits()
+        self.cache_size = cache_size
+        self._context = None
+        self._idle: List[_Worker] = []
+        self._all: List[_Worker] = []
+        self._condition = threading.Condition()
+        self.started = False
+        self.recycled = 0
+        
+    @staticmethod
+    def supported() -> bool:
+        return resource is not None and "forkserver" in multiprocessing.get_all_start_methods()
+        
+    def start(self) -> None:
+        """Starts the worker processes; called lazily on first use."""
+        with self._condition:
+            if self.started:
+                return
+            # forkserver keeps workers from inheriting the API server's threads and sockets
+            self._context = multiprocessing.get_context("forkserver")
+            self._context.set_forkserver_preload([__name__])
+            for _ in range(self.size):
+                worker = _Worker(self._context, self.cache_size)
+                self._all.append(worker)
+                self._idle.append(worker)
+            self.started = True
+            
+    def stop(self) -> None:
+        """Kills all workers."""
+        with self._condition:
+            for worker in self._all:
+                worker.kill()
+            self._all = []
+            self._idle = []
+            self.started = False
+            self._condition.notify_all()
+            
+    def _acquire(self, key: Tuple[str, str], timeout: float) -> _Worker:
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while not self._idle:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._condition.wait(remaining):
+                    raise ToolSandboxError("No sandbox worker became available")
+                    
+            worker = next((w for w in self._idle if key in w.loaded), self._idle[-1])
+            self._idle.remove(worker)
+            
+        if not worker.process.is_alive():
+            worker = self._replace(worker, idle=False)
+        return worker
+        
+    def _release(self, worker: _Worker) -> None:
+        with self._condition:
+            if worker in self._all:
+                self._idle.append(worker)
+                self._condition.notify()
+                
+    def _replace(self, worker: _Worker, idle: bool = True) -> _Worker:
+        """Kills a worker and starts a new one in its place."""
+        worker.kill()
+        replacement = _Worker(self._context, self.cache_size)
+        with self._condition:
+            if worker in self._all:
+                self._all[self._all.index(worker)] = replacement
+            else:
+                self._all.append(replacement)
+            self.recycled += 1
+            if idle:
+                self._idle.append(replacement)
+                self._condition.notify()
+        print(f"Recycled tool sandbox worker (exit code {worker.process.exitcode})")
+        return replacement
+        
+    def _run_chunk(self, key: Tuple[str, str], load_artifact: Callable[[], Dict[str, Any]], chunk: List[Dict[str, Any]],
+                   limits: ToolLimits) -> List[Tuple[bool, str, float]]:
+        """
+        Runs a chunk of calls on one worker, each with its own limits and timeout.
+        
+        If a call kills or hangs its worker, that call fails and the rest of the
+        chunk continues on the replacement worker.
+        """
+        results = []
+        while len(results) < len(chunk):
+            pending = chunk[len(results):]
+            waited = time.monotonic()
+            try:
+                worker = self._acquire(key, limits.timeout_seconds)
+            except ToolSandboxError as e:
+                # Every worker stayed busy; fail the rest of the chunk, not the whole batch
+                results.extend([(False, str(e), (time.monotonic() - waited) * 1000)] * len(pending))
+                break
+            healthy = True
+            
+            try:
+                artifact = None if key in worker.loaded else load_artifact()
+                worker.conn.send((key, artifact, pending, limits.cpu_seconds, limits.memory_mb, limits.timeout_seconds))
+                
+                received = 0
+                while received < len(pending):
+                    started = time.monotonic()
+                    # Async tools time out in the worker; the grace period lets that error arrive first
+                    if not worker.conn.poll(limits.timeout_seconds + RESULT_GRACE_SECONDS):
+                        healthy = False
+                        results.append((False, f"Timed out after {limits.timeout_seconds}s", (time.monotonic() - started) * 1000))
+                        break
+                        
+                    status, value, duration_ms = worker.conn.recv()
+                    if status == "missing":
+                        # The worker evicted this tool; send the code and retry
+                        worker.conn.send((key, load_artifact(), pending, limits.cpu_seconds, limits.memory_mb, limits.timeout_seconds))
+                        continue
+                        
+                    worker.loaded.add(key)
+                    results.append((status == "ok", value, duration_ms))
+                    received += 1
+                    if status == "fatal":
+                        healthy = False
+                        break
+            except (EOFError, OSError):
+                healthy = False
+                results.append((False, "Sandbox worker exited (memory or CPU limit exceeded)", 0.0))
+            finally:
+                if healthy:
+                    self._release(worker)
+                else:
+                    self._replace(worker)
+                    
+        return results
+        
+    def run(self, tool_id: str, version: str, load_artifact: Callable[[], Dict[str, Any]], params: Dict[str, Any],
+            limits: Optional[ToolLimits] = None) -> str:
+        """
+        Runs a custom tool in a sandbox worker.
+        
+        Args:
+            tool_id: ID of the tool
+            version: Version of the tool code (e.g. its update time); workers recompile when it changes
+            load_artifact: Returns the tool's code, signature and bytecode; only called if the chosen worker lacks it
+            params: Keyword arguments for the tool's entry function
+            limits: Override for the pool's default limits
+            
+        Returns:
+            The tool's result converted to a string
+            
+        Raises:
+            ToolSandboxError: If the tool failed, hit a limit or killed its worker
+        """
+        if not self.started:
+            self.start()
+            
+        ok, value, _ = self._run_chunk((tool_id, version), load_artifact, [params], limits or self.limits)[0]
+        if not ok:
+            raise ToolSandboxError(value)
+        return value
+        
+    async def run_async(self, tool_id: str, version: str, load_artifact: Callable[[], Dict[str, Any]], params: Dict[str, Any],
+                        limits: Optional[ToolLimits] = None) -> str:
+        """Awaitable run(); the wait for the worker happens in a thread so the event loop stays free."""
+        return await asyncio.to_thread(self.run, tool_id, version, load_artifact, params, limits)
+        
+    def run_batch(self, tool_id: str, version: str, load_artifact: Callable[[], Dict[str, Any]], params_list: List[Dict[str, Any]],
+                  chunk_size: int = 50, limits: Optional[ToolLimits] = None) -> List[Tuple[bool, str, float]]:
+        """
+        Runs a custom tool over many parameter sets, spreading chunks across the pool's workers.
+        
+        Each worker compiles the tool at most once for the whole batch.
+        
+        Args:
+            tool_id: ID of the tool
+            version: Version of the tool code
+            load_artifact: Returns the tool's code, signature and bytecode; called at most once
+            params_list: Parameter sets, one per call
+            chunk_size: Calls sent to a worker at a time
+            limits: Per-call limits overriding the pool's defaults
+            
+        Returns:
+            (succeeded, result or error message, duration_ms) for each parameter set, in order
+        """
+        if not self.started:
+            self.start()
+            
+        limits = limits or self.limits
+        key = (tool_id, version)
+        chunks = [params_list[start:start + chunk_size] for start in range(0, len(params_list), chunk_size)]
+        
+        # Chunks run on separate threads; load the artifact (e.g. from the database) only once
+        artifact_lock = threading.Lock()
+        artifact = []
+        
+        def load_artifact_once() -> Dict[str, Any]:
+            with artifact_lock:
+                if not artifact:
+                    artifact.append(load_artifact())
+                return artifact[0]
+                
+        with ThreadPoolExecutor(max_workers=max(min(self.size, len(chunks)), 1)) as executor:
+            chunk_results = executor.map(lambda chunk: self._run_chunk(key, load_artifact_once, chunk, limits), chunks)
+            return [result for results in chunk_results for result in results]
+            
+    def stats(self) -> Dict[str, Any]:
+        """Returns pool size, idle workers and how many workers were replaced."""
+        with self._condition:
+            return {"workers": len(self._all), "idle": len(self._idle), "recycled": self.recycled}
@@ -0,0 +1,304 @@
+# backend/app/services/vector_index.py
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalizes rows so that dot products are cosine similarities."""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+class HashingEmbedder:
+    """
+    Deterministic local embedder based on signed feature hashing of words and word pairs.
+    
+    Needs no model or network access, so it works offline and gives stable results in tests.
+    """
+    
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+        
+    def _feature(self, term: str) -> Tuple[int, float]:
+        digest = int.from_bytes(hashlib.blake2b(term.encode(), digest_size=8).digest(), "little")
+        return digest % self.dim, (1.0 if digest >> 63 else -1.0)
+        
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = _WORD_PATTERN.findall(text.lower())
+            for term in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                column, sign = self._feature(term)
+                vectors[row, column] += sign
+        return _normalize(vectors)
+
+class VertexEmbedder:
+    """Embedder backed by a Vertex AI text embedding model."""
+    
+    BATCH_SIZE = 100
+    
+    def __init__(self, model_name: str = "text-embedding-004"):
+        self.model_name = model_name
+        self.name = f"vertex-{model_name}"
+        self._model = None
+        
+    def embed(self, texts: List[str]) -> np.ndarray:
+        if self._model is None:
+            from vertexai.language_models import TextEmbeddingModel
+            self._model = TextEmbeddingModel.from_pretrained(self.model_name)
+            
+        vectors = []
+        for start in range(0, len(texts), self.BATCH_SIZE):
+            embeddings = self._model.get_embeddings(texts[start:start + self.BATCH_SIZE])
+            vectors.extend(embedding.values for embedding in embeddings)
+        return _normalize(np.array(vectors, dtype=np.float32).reshape(len(texts), -1))
+
+def get_embedder() -> Any:
+    """Creates the embedder selected by EMBEDDING_BACKEND ("local" or "vertex")."""
+    backend = os.getenv("EMBEDDING_BACKEND", "local").lower()
+    if backend == "vertex":
+        return VertexEmbedder(os.getenv("EMBEDDING_MODEL", "text-embedding-004"))
+    if backend == "local":
+        return HashingEmbedder(int(os.getenv("EMBEDDING_DIM", "256")))
+    raise ValueError(f"Unsupported embedding backend: {backend}")
+
+def top_k_search(vectors: np.ndarray, queries: np.ndarray, k: int, allowed: Optional[np.ndarray] = None,
+                 block_rows: int = 65536) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Exact top-k search by inner product for a batch of queries.
+    
+    Rows are scored block by block, so a memory-mapped matrix is never loaded in full.
+    
+    Args:
+        vectors: (N, dim) matrix of normalized embeddings
+        queries: (Q, dim) matrix of normalized query embeddings
+        k: Number of results per query
+        allowed: Optional boolean mask of rows that may be returned
+        block_rows: Rows scored per block
+        
+    Returns:
+        (indices, scores), each of shape (Q, min(k, N)), best match first
+    """
+    count = vectors.shape[0]
+    k = min(k, count)
+    if k <= 0:
+        empty = np.zeros((queries.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+        
+    best_scores = np.full((queries.shape[0], k), -np.inf, dtype=np.float32)
+    best_indices = np.full((queries.shape[0], k), -1, dtype=np.int64)
+    
+    for start in range(0, count, block_rows):
+        block = np.asarray(vectors[start:start + block_rows])
+        scores = queries @ block.T
+        if allowed is not None:
+            scores[:, ~allowed[start:start + block.shape[0]]] = -np.inf
+            
+        # Merge the block's scores with the best results so far and keep the top k
+        merged_scores = np.concatenate([best_scores, scores], axis=1)
+        merged_indices = np.concatenate([
+            best_indices,
+            np.broadcast_to(np.arange(start, start + block.shape[0]), scores.shape)
+        ], axis=1)
+        top = np.argpartition(-merged_scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(merged_scores, top, axis=1)
+        best_indices = np.take_along_axis(merged_indices, top, axis=1)
+        
+    order = np.argsort(-best_scores, axis=1)
+    return np.take_along_axis(best_indices, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+class SessionVectorIndex:
+    """
+    Per-session retrieval index over file chunk embeddings.
+    
+    Embeddings are computed once per file (keyed by content hash) and cached as .npy
+    files; each session's index concatenates them into a single memory-mapped matrix.
+    Builds of one session are serialized; different sessions build in parallel.
+    """
+    
+    def __init__(self, embedder: Any, index_dir: str):
+        self.embedder = embedder
+        self.index_dir = index_dir
+        # Lock and number of users per session; an entry is removed when its last user leaves
+        self._session_locks: Dict[str, List[Any]] = {}
+        self._lock = threading.Lock()
+        
+    @contextmanager
+    def _session_lock(self, session_id: str) -> Iterator[None]:
+        with self._lock:
+            entry = self._session_locks.setdefault(session_id, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._session_locks[session_id]
+                    
+
+    def _session_dir(self, session_id: str) -> str:
+        path = os.path.abspath(os.path.join(self.index_dir, "sessions", session_id))
+        if not path.startswith(os.path.abspath(self.index_dir) + os.sep):
+            raise ValueError(f"Invalid session ID: {session_id}")
+        return path
+        
+    def _embedding_path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.index_dir, "embeddings", self.embedder.name, f"{digest}.npy")
+        
+    @staticmethod
+    def _save_array(path: str, array: np.ndarray) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial_path = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+        with open(partial_path, "wb") as f:
+            np.save(f, array)
+        os.replace(partial_path, path)
+        
+    def embed_chunks(self, key: str, chunks: List[str]) -> np.ndarray:
+        """Returns the embeddings of a file's chunks, computing them only on a cache miss."""
+        if not chunks:
+            return np.zeros((0, 0), dtype=np.float32)
+            
+        path = self._embedding_path(key)
+        if os.path.exists(path):
+            embeddings = np.load(path, mmap_mode="r")
+            if embeddings.shape[0] == len(chunks):
+                return embeddings
+                
+        embeddings = self.embedder.embed(chunks)
+        self._save_array(path, embeddings)
+        return embeddings
+        
+    @staticmethod
+    def _load_vectors(session_dir: str, entries: List[Dict[str, Any]]) -> np.ndarray:
+        # Empty arrays can't be memory-mapped
+        mmap_mode = "r" if any(entry["count"] for entry in entries) else None
+        return np.load(os.path.join(session_dir, "vectors.npy"), mmap_mode=mmap_mode)
+        
+    def _load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        session_dir = self._session_dir(session_id)
+        try:
+            with open(os.path.join(session_dir, "meta.json")) as f:
+                meta = json.load(f)
+            if meta.get("embedder") != self.embedder.name:
+                return None
+            meta["vectors"] = self._load_vectors(session_dir, meta["entries"])
+            return meta
+        except (OSError, ValueError):
+            return None
+            
+    def build(self, session_id: str, files: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Loads the session index, rebuilding it if any of the given files are missing.
+        
+        Args:
+            session_id: Upload session ID
+            files: Dicts with "file_id", "key" (cache key) and "chunks" (callable returning the chunk texts)
+            
+        Returns:
+            Index metadata with "entries" and the memory-mapped "vectors" matrix
+        """
+        with self._session_lock(session_id):
+            index = self._load(session_id)
+            indexed = {entry["file_id"]: entry for entry in index["entries"]} if index else {}
+            if index and all(
+                file["file_id"] in indexed and indexed[file["file_id"]]["key"] == file["key"] for file in files
+            ):
+                return index
+                
+            # Keep previously indexed files; their embeddings come from the cache
+            pending = {file["file_id"]: file for file in files}
+            for file_id, entry in indexed.items():
+                pending.setdefault(file_id, {"file_id": file_id, "key": entry["key"], "chunks": None, "count": entry["count"]})
+                
+            entries = []
+            blocks = []
+            start = 0
+            for file in pending.values():
+                if file["chunks"] is None:
+                    path = self._embedding_path(file["key"])
+                    if not file["count"]:
+                        embeddings = np.zeros((0, 0), dtype=np.float32)
+                    elif os.path.exists(path):
+                        embeddings = np.load(path, mmap_mode="r")
+                    else:
+                        continue
+                else:
+                    embeddings = self.embed_chunks(file["key"], file["chunks"]())
+                    
+                # Files without text stay in the index so they don't trigger a rebuild
+                entries.append({"file_id": file["file_id"], "key": file["key"], "start": start, "count": embeddings.shape[0]})
+                if embeddings.shape[0]:
+                    blocks.append(embeddings)
+                start += embeddings.shape[0]
+                
+            dim = blocks[0].shape[1] if blocks else 0
+            vectors = np.concatenate(blocks).astype(np.float32) if blocks else np.zeros((0, dim), dtype=np.float32)
+            
+            session_dir = self._session_dir(session_id)
+            self._save_array(os.path.join(session_dir, "vectors.npy"), vectors)
+            meta = {"embedder": self.embedder.name, "dim": dim, "entries": entries}
+            partial_path = os.path.join(session_dir, f"meta.json.{os.getpid()}.part")
+            with open(partial_path, "w") as f:
+                json.dump(meta, f)
+            os.replace(partial_path, os.path.join(session_dir, "meta.json"))
+            
+            meta["vectors"] = self._load_vectors(session_dir, entries)
+            return meta
+            
+    def search(self, index: Dict[str, Any], queries: List[str], top_k: int,
+               file_ids: Optional[List[str]] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Finds the chunks most similar to each query.
+        
+        Args:
+            index: Index returned by build()
+            queries: Query texts, embedded in one batch
+            top_k: Number of chunks per query
+            file_ids: Restrict results to these files
+            
+        Returns:
+            For each query, a list of {"file_id", "index", "score"} dicts, best match first
+        """
+        vectors = index["vectors"]
+        if not queries or vectors.shape[0] == 0:
+            return [[] for _ in queries]
+            
+        allowed = None
+        if file_ids is not None:
+            wanted = set(file_ids)
+            allowed = np.zeros(vectors.shape[0], dtype=bool)
+            for entry in index["entries"]:
+                if entry["file_id"] in wanted:
+                    allowed[entry["start"]:entry["start"] + entry["count"]] = True
+                    
+        indices, scores = top_k_search(vectors, self.embedder.embed(queries), top_k, allowed)
+        
+        starts = np.array([entry["start"] for entry in index["entries"]])
+        results = []
+        for row_indices, row_scores in zip(indices, scores):
+            matches = []
+            for row, score in zip(row_indices, row_scores):
+                if row < 0 or not np.isfinite(score):
+                    continue
+                entry = index["entries"][int(np.searchsorted(starts, row, side="right")) - 1]
+                matches.append({"file_id": entry["file_id"], "index": int(row - entry["start"]), "score": float(score)})
+            results.append(matches)
+        return results
+        
+    def drop(self, session_id: str) -> None:
+        """Removes a session's index; cached per-file embeddings are kept for reuse."""
+        with self._session_lock(session_id):
+            shutil.rmtree(self._session_dir(session_id), ignore_errors=True)
@@ -0,0 +1,85 @@
+# backend/benchmarks/custom_tool_cache.py
+"""
+Microbenchmark for CustomToolService.execute_tool per-call overhead.
+
+Compares the previous behaviour (fetch the row, register a module, compile and exec
+on every call) with the compiled tool cache. Uses a throwaway SQLite database.
+
+Run from the backend directory:
+    python -m benchmarks.custom_tool_cache [calls]
+"""
+import importlib.util
+import inspect
+import os
+import sys
+import tempfile
+import time
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'benchmark.db')}"
+os.environ.setdefault("TOOL_SANDBOX", "inline")
+
+from app.database import SessionLocal
+from app.services import custom_tool_service
+from app.services.custom_tool_service import CustomToolService, compiled_tool_cache, tool_sandbox_pool
+from app.services.tool_sandbox import SAFE_BUILTINS
+
+TOOL_CODE = '''
+RATES = {"USD": 1.0, "EUR": 0.92, "GBP": 0.79, "JPY": 151.3}
+
+def convert(amount, source="USD", target="EUR"):
+    """Converts an amount between currencies."""
+    usd = amount / RATES[source]
+    return round(usd * RATES[target], 2)
+'''
+
+def execute_uncached(db, tool_id, params):
+    """The execute_tool implementation before the compiled tool cache."""
+    tool = CustomToolService.get_tool(db, tool_id)
+    module_name = f"custom_tool_{tool_id}"
+    spec = importlib.util.spec_from_loader(module_name, loader=None)
+    sys.modules[module_name] = importlib.util.module_from_spec(spec)
+    
+    restricted_globals = {"__builtins__": dict(SAFE_BUILTINS)}
+    exec(tool.code, restricted_globals)
+    function = next(obj for name, obj in restricted_globals.items() if callable(obj) and name != "__builtins__")
+    signature = inspect.signature(function)
+    return str(function(**{name: params[name] for name in signature.parameters if name in params}))
+
+def measure(label, function, calls):
+    started = time.perf_counter()
+    for _ in range(calls):
+        function()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<12} {elapsed * 1e6 / calls:10.1f} us/call")
+    return elapsed
+
+def main(calls=5000):
+    db = SessionLocal()
+    tool = CustomToolService.create_tool(db, "convert", "Converts currencies", TOOL_CODE)
+    params = {"amount": 125.0, "source": "GBP", "target": "JPY"}
+    
+    before = measure("before", lambda: execute_uncached(db, tool.id, params), calls)
+    compiled_tool_cache.clear()
+    after = measure("after", lambda: CustomToolService.execute_tool(db, tool.id, params), calls)
+    
+    print(f"speedup      {before / after:10.1f}x")
+    
+    # What remains is mostly the updated_at lookup; the call itself is this cheap
+    compiled = CustomToolService.get_compiled_tool(db, tool.id)
+    measure("call only", lambda: compiled.call(params), calls)
+    print(f"cache        {compiled_tool_cache.stats()}")
+    
+    if tool_sandbox_pool.supported():
+        custom_tool_service.TOOL_SANDBOX = "process"
+        tool_sandbox_pool.start()
+        measure("sandboxed", lambda: CustomToolService.execute_tool(db, tool.id, params), calls)
+        
+        # Pure tools skip the worker round trip after the first call
+        pure_tool = CustomToolService.create_tool(db, "convert_pure", "Converts currencies", TOOL_CODE, is_pure=True)
+        measure("pure", lambda: CustomToolService.execute_tool(db, pure_tool.id, params), calls)
+        print(f"pool         {tool_sandbox_pool.stats()}")
+        tool_sandbox_pool.stop()
+    db.close()
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -2,7 +2,7 @@
 import React, { useState, useRef } from 'react';
 import { Upload, X, FileText, Image, Table } from 'lucide-react';
 
-const FileUpload = ({ onFileUpload, maxSize = 5 }) => {
+const FileUpload = ({ onFileUpload, maxSize = 5, progress = {} }) => {
   const [dragActive, setDragActive] = useState(false);
   const [files, setFiles] = useState([]);
   const [error, setError] = useState('');
@@ -141,6 +141,11 @@ const FileUpload = ({ onFileUpload, maxSize = 5 }) => {
                   <span className="ml-2 text-xs text-gray-500">
                     ({formatFileSize(file.size)})
                   </span>
+                  {progress[file.name] !== undefined && (
+                    <span className="ml-2 text-xs text-blue-600">
+                      {progress[file.name] < 100 ? `${progress[file.name]}%` : 'Uploaded'}
+                    </span>
+                  )}
                 </div>
                 <button
                   type="button"
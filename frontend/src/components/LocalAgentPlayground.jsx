@@ -2,7 +2,7 @@
 import React, { useState, useEffect, useRef } from 'react';
 import { useNavigate, useParams } from 'react-router-dom';
 import { testAgentLocally, createAgent, deployAgent, getAgent } from '../services/agentEngineService';
-import { uploadFiles, deleteSessionFiles } from '../services/fileService';
+import { uploadFilesDirect, deleteSessionFiles } from '../services/fileService';
 import { MessageCircle, Send, Bot, Save, PaperclipIcon, FileUp } from 'lucide-react';
 import LoadingSpinner from './LoadingSpinner';
 import FileUpload from './FileUpload';
@@ -18,7 +18,9 @@ const LocalAgentPlayground = ({ projectId, region }) => {
   const [isDeploying, setIsDeploying] = useState(false);
   const [error, setError] = useState('');
   const [showFileUpload, setShowFileUpload] = useState(false);
+  const [uploadProgress, setUploadProgress] = useState({});
   const [sessionId, setSessionId] = useState(null);
+  const [conversationId, setConversationId] = useState(null);
   const [uploadedFiles, setUploadedFiles] = useState([]);  
   const messagesEndRef = useRef(null);
 
@@ -67,8 +69,13 @@ const LocalAgentPlayground = ({ projectId, region }) => {
     try {
       setError('');
       
+      setUploadProgress({});
+      
+      // Files go straight to storage; the API only records their metadata
       // If we already have a session ID, use it, otherwise let the API create one
-      const uploadResult = await uploadFiles(files, sessionId);
+      const uploadResult = await uploadFilesDirect(files, sessionId, (filename, percent) => {
+        setUploadProgress(prev => ({ ...prev, [filename]: percent }));
+      });
       
       // Store the session ID for future uploads
       setSessionId(uploadResult.session_id);
@@ -79,9 +86,13 @@ const LocalAgentPlayground = ({ projectId, region }) => {
       // Notify the user
       setMessages(prev => [...prev, { 
         role: 'system', 
-        content: `Uploaded ${files.length} file(s). You can now ask questions about the content.`
+        content: `Uploaded ${uploadResult.files.length} file(s). You can now ask questions about the content.`
       }]);
       
+      if (uploadResult.failed && uploadResult.failed.length > 0) {
+        setError(`Failed to upload: ${uploadResult.failed.map(failure => failure.filename || failure.intent_id).join(', ')}`);
+      }
+      
     } catch (error) {
       console.error('Error uploading files:', error);
       setError('Failed to upload files: ' + (error.response?.data?.detail || error.message));
@@ -115,9 +126,15 @@ const LocalAgentPlayground = ({ projectId, region }) => {
         ...agent,
         query: query,
         sessionId: sessionId,
+        conversationId: conversationId,
         files: uploadedFiles
       });
       
+      // Keep the conversation the backend assigned so memory carries over to the next query
+      if (response.conversationId) {
+        setConversationId(response.conversationId);
+      }
+      
       // Add agent response
       setMessages(prev => [...prev, { 
         role: 'assistant', 
@@ -305,7 +322,7 @@ const LocalAgentPlayground = ({ projectId, region }) => {
                   Hide
                 </button>
               </div>
-              <FileUpload onFileUpload={handleFileUpload} />
+              <FileUpload onFileUpload={handleFileUpload} progress={uploadProgress} />
             </div>
           )}
           
@@ -741,6 +741,7 @@ const CreateAgent = ({ projectId, region }) => {
                       className="w-full px-3 py-2 border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-blue-500 focus:border-blue-500"
                     >
                       <option value="sequential">Sequential</option>
+                      <option value="parallel">Parallel</option>
                       <option value="hierarchical">Hierarchical</option>
                     </select>
                   </div>
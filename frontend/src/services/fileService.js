@@ -37,6 +37,72 @@ export const uploadFiles = async (files, sessionId = null) => {
   }
 };
 
+// Local storage returns upload URLs relative to the API host
+const resolveUploadUrl = (url) => (url.startsWith('/') ? new URL(url, API_URL).toString() : url);
+
+/**
+ * Upload files straight to storage, bypassing the API for the file bytes
+ * @param {FileList|Array} files - Array of File objects
+ * @param {string} sessionId - Optional session ID to group files
+ * @param {Function} onProgress - Optional callback (filename, percent) for upload progress
+ * @returns {Promise<Object>} - Upload result with session ID, file info and failures
+ */
+export const uploadFilesDirect = async (files, sessionId = null, onProgress = null) => {
+  try {
+    const fileList = Array.from(files);
+    
+    // Ask the API for one upload URL per file
+    const { data: intentResult } = await axios.post(`${API_URL}/files/upload/intents`, {
+      session_id: sessionId,
+      files: fileList.map(file => ({
+        filename: file.name,
+        content_type: file.type || 'application/octet-stream',
+        size: file.size
+      }))
+    });
+    
+    // Send the bytes directly to storage
+    const uploads = await Promise.allSettled(intentResult.intents.map(intent => {
+      const file = fileList[intent.index];
+      return axios({
+        method: intent.method,
+        url: resolveUploadUrl(intent.upload_url),
+        data: file,
+        headers: intent.headers,
+        onUploadProgress: (event) => {
+          if (onProgress) {
+            onProgress(file.name, Math.round((event.loaded * 100) / (event.total || file.size || 1)));
+          }
+        }
+      });
+    }));
+    
+    const uploaded = intentResult.intents.filter((intent, i) => uploads[i].status === 'fulfilled');
+    const uploadFailures = intentResult.intents
+      .filter((intent, i) => uploads[i].status === 'rejected')
+      .map(intent => ({ filename: intent.filename, error: 'Upload to storage failed' }));
+    
+    if (uploaded.length === 0) {
+      throw new Error('No files were uploaded');
+    }
+    
+    // Record the uploaded files once storage has them
+    const { data: result } = await axios.post(`${API_URL}/files/upload/complete`, {
+      session_id: intentResult.session_id,
+      intent_ids: uploaded.map(intent => intent.intent_id)
+    });
+    
+    return {
+      ...result,
+      session_id: result.session_id || intentResult.session_id,
+      failed: [...intentResult.failed, ...uploadFailures, ...result.failed]
+    };
+  } catch (error) {
+    console.error('Error uploading files directly:', error);
+    throw error;
+  }
+};
+
 /**
  * Get list of files for a session
  * @param {string} sessionId - Session ID